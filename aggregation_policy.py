@@ -0,0 +1,191 @@
+# aggregation_policy.py
+from config import Config
+
+# Stages that write data or run server-side JavaScript are never allowed
+FORBIDDEN_STAGES = {'$out', '$merge'}
+FORBIDDEN_OPERATORS = {'$function', '$accumulator', '$where'}
+
+# Stages that carry nested pipelines which must pass the same checks
+NESTED_PIPELINE_STAGES = {'$facet', '$lookup', '$unionWith'}
+
+
+class PipelineRejected(ValueError):
+    """Raised when a pipeline violates the aggregation policy"""
+
+
+def lookup_requirements(pipeline):
+    """(collection, field) pairs that must be indexed for the pipeline's joins"""
+    requirements = []
+    for stage in _iter_stages(pipeline):
+        if not isinstance(stage, dict):
+            continue
+        if '$lookup' in stage:
+            spec = stage['$lookup']
+            if isinstance(spec, dict) and spec.get('from') and spec.get('foreignField'):
+                requirements.append((spec['from'], spec['foreignField']))
+        elif '$graphLookup' in stage:
+            spec = stage['$graphLookup']
+            if isinstance(spec, dict) and spec.get('from') and spec.get('connectToField'):
+                requirements.append((spec['from'], spec['connectToField']))
+    return requirements
+
+
+def leading_index_fields(index_information):
+    """Fields that lead at least one index, from Collection.index_information()"""
+    fields = set()
+    for info in index_information.values():
+        keys = info.get('key') or []
+        if keys:
+            fields.add(keys[0][0])
+    return fields
+
+
+def apply_policy(pipeline, indexed_fields, limit=None, max_time_ms=None, allow_disk_use=None, cap_output=True):
+    """Validate a pipeline and return (pipeline, aggregate options, policy summary).
+
+    indexed_fields maps each joined collection to its leading index fields
+    (see lookup_requirements / leading_index_fields).
+    """
+    if not isinstance(pipeline, list):
+        raise PipelineRejected("Pipeline must be a list of aggregation stages")
+
+    for stage in _iter_stages(pipeline):
+        if not isinstance(stage, dict) or len(stage) != 1:
+            raise PipelineRejected("Each pipeline stage must be an object with exactly one operator")
+        name = next(iter(stage))
+        if name in FORBIDDEN_STAGES:
+            raise PipelineRejected(f"{name} is not allowed: this endpoint is read-only")
+        forbidden = find_operator(stage, FORBIDDEN_OPERATORS)
+        if forbidden:
+            raise PipelineRejected(f"{forbidden} is not allowed: server-side JavaScript is disabled")
+
+    # Joins without an index on the foreign side scan the foreign collection per input document
+    if not Config.AGGREGATE_ALLOW_UNINDEXED_LOOKUP:
+        for foreign, field in lookup_requirements(pipeline):
+            if field not in indexed_fields.get(foreign, set()):
+                raise PipelineRejected(
+                    f"Join on {foreign}.{field} is not supported by an index; "
+                    f"create one or set AGGREGATE_ALLOW_UNINDEXED_LOOKUP=true"
+                )
+
+    requested_limit = _positive_int(limit, "limit")
+    requested_time = _positive_int(max_time_ms, "max_time_ms")
+
+    guarded = list(pipeline)
+    limit_applied = None
+    if cap_output:
+        # Cap the result size server-side instead of trimming after the fact
+        limit_applied = min(requested_limit or Config.MAX_LIMIT, Config.MAX_LIMIT)
+        last = guarded[-1] if guarded else {}
+        if isinstance(last.get('$limit'), int) and last['$limit'] <= limit_applied:
+            limit_applied = last['$limit']
+        else:
+            guarded.append({'$limit': limit_applied})
+
+    # Clients may tighten the time budget and disk use, never loosen them
+    time_budget = Config.AGGREGATE_MAX_TIME_MS
+    if requested_time:
+        time_budget = min(requested_time, time_budget) if time_budget else requested_time
+    disk_use = Config.AGGREGATE_ALLOW_DISK_USE and (allow_disk_use is None or bool(allow_disk_use))
+
+    options = {'allowDiskUse': disk_use}
+    if time_budget:
+        options['maxTimeMS'] = time_budget
+
+    policy = {
+        "limit": limit_applied,
+        "max_time_ms": time_budget or None,
+        "allow_disk_use": disk_use,
+        "stages": len(guarded)
+    }
+    return guarded, options, policy
+
+
+def _positive_int(value, name):
+    """A client-supplied count as a positive integer; None when not given"""
+    if value is None or value == '':
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = None
+    # Booleans and fractions are not counts
+    if number is None or number < 1 or isinstance(value, bool) or (isinstance(value, float) and value != number):
+        raise PipelineRejected(f"{name} must be a positive integer")
+    return number
+
+
+def summarize_explain(explain):
+    """Reduce an executionStats explain() result to the chosen plan and what it examined"""
+    stages = []
+    index_names = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'stage' in node:
+                stages.append(node['stage'])
+                if node.get('indexName'):
+                    index_names.add(node['indexName'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    # The planner output and execution stats sit at the top level or inside the first $cursor stage
+    planner = explain.get('queryPlanner')
+    execution = explain.get('executionStats')
+    if planner is None:
+        for stage in explain.get('stages', []):
+            if '$cursor' in stage:
+                planner = stage['$cursor'].get('queryPlanner')
+                execution = stage['$cursor'].get('executionStats')
+                break
+    walk((planner or {}).get('winningPlan', explain.get('stages', [])))
+    execution = execution or {}
+
+    return {
+        "winning_plan_stages": stages,
+        "indexes_used": sorted(index_names),
+        "collection_scan": 'COLLSCAN' in stages,
+        "in_memory_sort": 'SORT' in stages,
+        # Measured by running the query part of the pipeline; stages after it are not counted
+        "documents_examined": execution.get('totalDocsExamined'),
+        "keys_examined": execution.get('totalKeysExamined'),
+        "documents_returned": execution.get('nReturned'),
+        "execution_time_ms": execution.get('executionTimeMillis'),
+        "pipeline_stages": [next(iter(stage)) for stage in explain.get('stages', []) if isinstance(stage, dict)]
+    }
+
+
+def _iter_stages(pipeline):
+    """Yield every stage, descending into $facet/$lookup/$unionWith sub-pipelines"""
+    for stage in pipeline:
+        yield stage
+        if not isinstance(stage, dict):
+            continue
+        for name in NESTED_PIPELINE_STAGES & stage.keys():
+            spec = stage[name]
+            if name == '$facet' and isinstance(spec, dict):
+                for sub_pipeline in spec.values():
+                    if isinstance(sub_pipeline, list):
+                        yield from _iter_stages(sub_pipeline)
+            elif isinstance(spec, dict) and isinstance(spec.get('pipeline'), list):
+                yield from _iter_stages(spec['pipeline'])
+
+
+def find_operator(node, operators):
+    """Return the first of the given operators used anywhere in an expression"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in operators:
+                return key
+            found = find_operator(value, operators)
+            if found:
+                return found
+    elif isinstance(node, list):
+        for item in node:
+            found = find_operator(item, operators)
+            if found:
+                return found
+    return None
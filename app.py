@@ -1,18 +1,60 @@
 import requests
 import atexit
-import re
+import base64
 import os
+import random
+import re
+import threading
+import time
 from datetime import datetime
-from bson import ObjectId
-from flask import Flask, request, jsonify, render_template
+from functools import wraps
+from urllib.parse import urlencode
+from bson import Binary, Decimal128, ObjectId, Regex, Timestamp, json_util
+from flask import Flask, Response, g, has_request_context, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
 from database import db_instance
+from cache import DATABASE_SCOPE, result_cache
+from catalog import collection_catalog
+from schema_profiler import schema_profiler
+from index_advisor import describe_filter_shape, index_advisor, normalize_filter
+from search import TEXT_SCORE, search_engine
+from query_compiler import query_compiler
+from bulk_writer import bulk_writer, iter_ndjson_lines, write_concern_from_args
+from partitioned_scan import partitioned_scanner
+from views import ViewBusy, ViewNotFound, view_manager, view_target
+from coalesce import single_flight
+from read_routing import overrides_from, read_router
+from negotiation import (
+    NDJSON_MIMETYPE, binary_encodings_offered, body_tag, compress, compress_chunks, compressible,
+    etag_matches, negotiate_encoding, negotiate_mimetype, prefers_ndjson, representation_tag, validators
+)
+from summarizer import build_prompt, summarize_collection
+from llm_client import ModelClientBusy, analysis_jobs, model_client
+from metrics import MetricsMiddleware, current_request, metrics, note_query, phase
 from config import Config
+from aggregation_policy import (
+    PipelineRejected, apply_policy, leading_index_fields, lookup_requirements, summarize_explain
+)
 from flask_swagger_ui import get_swaggerui_blueprint
+from serialization import BSON_MIMETYPE, JSON_MIMETYPE, MSGPACK_MIMETYPE, BSONJSONProvider, dumps as json_dumps
 
 import json
 
+class InstrumentedJSONProvider(BSONJSONProvider):
+    """Encodes responses as the client's Accept asks, timing it and counting returned documents"""
+
+    def response(self, *args, **kwargs):
+        mimetype = response_mimetype() if has_request_context() else JSON_MIMETYPE
+        stats = current_request()
+        if stats is None:
+            return self.response_as(mimetype, *args, **kwargs)
+        if len(args) == 1 and isinstance(args[0], dict) and isinstance(args[0].get('data'), list):
+            stats.add_documents(len(args[0]['data']))
+        with phase('serialize'):
+            return self.response_as(mimetype, *args, **kwargs)
+
 app = Flask(__name__)
+app.json = InstrumentedJSONProvider(app)  # Encode BSON types in the same pass as the JSON
 CORS(app)  # Enable CORS for frontend integration
 
 SWAGGER_URL = '/docs'
@@ -24,168 +66,299 @@ app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
 # Register cleanup function
 atexit.register(lambda: db_instance.close_connection())
 
+def on_collection_change(collection_name):
+    """Drop cached results and catalog metadata for a changed collection"""
+    result_cache.invalidate(collection_name)
+    collection_catalog.invalidate(collection_name)
+    validators.changed(collection_name)
+
+# Drop cached results for a collection as soon as it changes
+if Config.CACHE_INVALIDATE_ON_CHANGE and db_instance.connected:
+    db_instance.watch_changes(on_collection_change)
+
+# Keep materialized views refreshed; reads of a refreshed view must not hit stale cache entries
+view_manager.on_refresh = on_collection_change
+if Config.VIEWS_ENABLED and db_instance.connected:
+    view_manager.start_scheduler()
+
+
+def log_slow_request(stats):
+    """Print a slow request's phase breakdown and query shape, sometimes with a fresh plan"""
+    phases = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in stats.phases.items() if seconds)
+    line = (f"🐢 Slow request: {stats.method} {stats.path} -> {stats.status} in {stats.duration * 1000:.1f}ms "
+            f"({phases or 'no phases recorded'}); {stats.documents} docs, {stats.bytes_sent} bytes, "
+            f"{stats.commands} MongoDB commands")
+    if stats.query:
+        collection_name, filter_dict, sort_fields = stats.query
+        line += f"; shape {describe_filter_shape(normalize_filter(filter_dict))}"
+        if sort_fields:
+            line += f" sort {[[field, direction] for field, direction in sort_fields]}"
+    print(line)
+
+    if stats.query and random.random() < Config.SLOW_REQUEST_EXPLAIN_RATE:
+        def print_plan(plan):
+            print(f"🔎 Plan for slow {stats.method} {stats.path}: stages {plan['winning_plan_stages']}, "
+                  f"indexes {plan['indexes_used'] or 'none'}, collection scan {plan['collection_scan']}, "
+                  f"in-memory sort {plan['in_memory_sort']}")
+        index_advisor.explain_later(collection_name, filter_dict, sort_fields, print_plan)
+
+def finish_request_metrics(stats):
+    """Export a finished request's metrics and log it when it was slow"""
+    metrics.record_request(stats)
+    if Config.SLOW_REQUEST_MS and stats.duration * 1000 >= Config.SLOW_REQUEST_MS:
+        metrics.slow_requests.inc(stats.route or 'unmatched', metrics.collection_label(stats.collection))
+        log_slow_request(stats)
+
+# Time every request from the first byte in to the last byte out
+if Config.METRICS_ENABLED:
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, finish_request_metrics)
+
+@app.before_request
+def label_request_metrics():
+    """Label the request's metrics with its route pattern and collection"""
+    stats = current_request()
+    if stats is not None and request.url_rule is not None:
+        stats.route = request.url_rule.rule
+        stats.collection = (request.view_args or {}).get('collection_name')
+
+
+def gemini_url():
+    """Gemini generateContent endpoint for the configured model and API key"""
+    GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'your_default_key')
+    return f"{Config.GEMINI_API_BASE}/models/{Config.GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+
+def build_analysis_payload(summary, analysis_goals):
+    """Build the Gemini request body describing a collection summary"""
+    # Prompt is kept under ANALYZE_TOKEN_BUDGET by the summarizer
+    prompt = build_prompt(summary, analysis_goals)
+
+    # Prepare payload for Gemini
+    return {
+        "contents": [
+            {
+                "parts": [
+                    {"text": prompt}
+                ]
+            }
+        ]
+    }
+
+def get_collection_summary(collection_name, collection):
+    """Cached bounded-memory summary of a collection; returns (summary, cached)"""
+    cache_key = result_cache.make_key('summary', collection_name)
+    summary = result_cache.get('summary', cache_key)
+    if summary is not None:
+        return summary, True
+    summary = summarize_collection(collection)
+    if summary is not None:
+        result_cache.set('summary', cache_key, summary)
+    return summary, False
+
+def build_analysis_response(collection_name, summary, summary_cached, analysis, analysis_cached):
+    """Response body shared by the synchronous and job modes of /gemini/analyze"""
+    return {
+        "success": True,
+        "analysis": analysis,
+        "data_used": summary["sampled"],
+        "total_records": summary["estimated_count"],
+        "summary_cached": summary_cached,
+        "analysis_cached": analysis_cached,
+        "collection": collection_name
+    }
+
+def run_analysis(collection_name, analysis_goals):
+    """Summarize a collection and ask Gemini about it; None when the collection is empty"""
+    collection = db_instance.get_collection(collection_name, read_router.route('analyze'))
+    summary, summary_cached = get_collection_summary(collection_name, collection)
+    if not summary:
+        return None
+
+    payload = build_analysis_payload(summary, analysis_goals)
+    analysis, analysis_cached = model_client.generate(gemini_url(), Config.GEMINI_MODEL, payload)
+    return build_analysis_response(collection_name, summary, summary_cached, analysis, analysis_cached)
+
+def run_analysis_job(collection_name, analysis_goals):
+    """Background job body; failures are recorded on the job"""
+    result = run_analysis(collection_name, analysis_goals)
+    if result is None:
+        raise LookupError("No data found in the specified collection")
+    return result
+
+def submit_analysis_job(collection_name, analysis_goals):
+    """Queue an analysis and return the 202 response body"""
+    job_id = analysis_jobs.submit(run_analysis_job, collection_name, analysis_goals)
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": "pending",
+        "status_url": f"/gemini/analyze/{job_id}",
+        "collection": collection_name
+    }
+
+def wants_async_job(body, args):
+    """Job mode is requested with {"async": true} or ?mode=async"""
+    return str(body.get('async', '')).lower() == 'true' or args.get('mode') == 'async'
 
 @app.route('/gemini/analyze', methods=['POST'])
 def analyze_data_with_gemini():
     """
     Analyze all data in a specified MongoDB collection with context provided dynamically.
     """
-    GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', 'your_default_key')
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-    headers = {'Content-Type': 'application/json'}
-
     try:
         # Get collection name from request
-        collection_name = request.json.get('collection_name')
-        analysis_goals = request.json.get(
+        body = request.json or {}
+        collection_name = body.get('collection_name')
+        analysis_goals = body.get(
             'analysis_goals', "Find trends, patterns, or anomalies.")
 
         if not collection_name:
             return jsonify({"error": "Collection name is required"}), 400
 
-        # Fetch all data from the specified MongoDB collection
-        collection = db_instance.get_collection(collection_name)
-        data_cursor = collection.find()
-        data_list = list(data_cursor)
+        # Long analyses can run in the background and be polled by job id
+        if wants_async_job(body, request.args):
+            return jsonify(submit_analysis_job(collection_name, analysis_goals)), 202
 
-        if not data_list:
+        result = run_analysis(collection_name, analysis_goals)
+        if result is None:
             return jsonify({"error": "No data found in the specified collection"}), 404
 
-        # Derive metadata from the data
-        example_data = data_list[:5]  # Use first 5 documents as examples
-        fields = list(data_list[0].keys()) if data_list else []
-        total_records = len(data_list)
-
-        # Construct a detailed prompt
-        prompt = (
-            f"The data contains {total_records} records with the following fields: {', '.join(fields)}. "
-            f"Here are a few example rows: {json.dumps(example_data, default=str)}. "
-            f"{analysis_goals} Please provide insights based on this data."
-        )
-
-        # Limit prompt size for Gemini
-        prompt = prompt[:10000]
-
-        # Prepare payload for Gemini
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": prompt}
-                    ]
-                }
-            ]
-        }
-
-        # Call Gemini API
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        gemini_response = response.json()
-
-        return jsonify({
-            "success": True,
-            "analysis": gemini_response,
-            "data_used": total_records,
-            "collection": collection_name
-        }), 200
+        return jsonify(result), 200
 
+    except ModelClientBusy as e:
+        return jsonify({"error": str(e)}), 503
     except requests.exceptions.RequestException as e:
         return jsonify({"error": f"Gemini API Error: {str(e)}"}), 500
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/gemini/analyze/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """Status, and once finished the result, of a background analysis"""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown or expired job id", "job_id": job_id}), 404
+    return jsonify({"success": job["status"] != "failed", **job}), 200
 
-def build_filter_from_params(args):
-    """Build MongoDB filter from query parameters with advanced operators"""
-    filter_dict = {}
-    excluded_params = ['limit', 'skip', 'sort', 'fields', 'search']
-    
-    for key, value in args.items():
-        if key not in excluded_params:
-            # Handle operators in field names (e.g., age__gte=25)
-            if '__' in key:
-                field, operator = key.split('__', 1)
-                parsed_value = parse_value(value)
-                
-                if operator == 'gte':
-                    filter_dict[field] = {'$gte': parsed_value}
-                elif operator == 'lte':
-                    filter_dict[field] = {'$lte': parsed_value}
-                elif operator == 'gt':
-                    filter_dict[field] = {'$gt': parsed_value}
-                elif operator == 'lt':
-                    filter_dict[field] = {'$lt': parsed_value}
-                elif operator == 'ne':
-                    filter_dict[field] = {'$ne': parsed_value}
-                elif operator == 'in':
-                    # Handle comma-separated values
-                    values = [parse_value(v.strip()) for v in value.split(',')]
-                    filter_dict[field] = {'$in': values}
-                elif operator == 'nin':
-                    values = [parse_value(v.strip()) for v in value.split(',')]
-                    filter_dict[field] = {'$nin': values}
-                elif operator == 'regex':
-                    filter_dict[field] = {'$regex': value, '$options': 'i'}
-                elif operator == 'exists':
-                    filter_dict[field] = {'$exists': value.lower() == 'true'}
-                else:
-                    # Unknown operator, treat as regular field
-                    filter_dict[key] = parse_value(value)
-            else:
-                # Regular field matching
-                filter_dict[key] = parse_value(value)
-    
-    return filter_dict
-
-def parse_value(value):
-    """Parse string value to appropriate type"""
-    if not isinstance(value, str):
-        return value
-        
-    # Try to parse as ObjectId
-    if len(value) == 24 and re.match(r'^[0-9a-fA-F]{24}$', value):
-        try:
-            return ObjectId(value)
-        except:
-            pass
-    
-    # Try to parse as integer
-    if value.isdigit() or (value.startswith('-') and value[1:].isdigit()):
-        return int(value)
-    
-    # Try to parse as float
-    try:
-        if '.' in value:
-            return float(value)
-    except ValueError:
-        pass
-    
-    # Try to parse as boolean
-    if value.lower() in ['true', 'false']:
-        return value.lower() == 'true'
-    
-    # Try to parse as datetime (ISO format)
-    try:
-        return datetime.fromisoformat(value.replace('Z', '+00:00'))
-    except ValueError:
-        pass
-    
-    # Return as string
-    return value
 
-def apply_sorting(cursor, sort_param):
-    """Apply sorting to MongoDB cursor with multiple field support"""
+def parse_sort_fields(sort_param):
+    """Parse sort parameter into a list of (field, direction) tuples"""
+    sort_fields = []
     if sort_param:
-        sort_fields = []
         for field in sort_param.split(','):
             field = field.strip()
+            if not field:
+                continue
             if field.startswith('-'):
                 sort_fields.append((field[1:], -1))  # Descending
             else:
                 sort_fields.append((field, 1))  # Ascending
+    return sort_fields
+
+def apply_sorting(cursor, sort_param):
+    """Apply sorting to MongoDB cursor with multiple field support"""
+    sort_fields = parse_sort_fields(sort_param)
+    if sort_fields:
         return cursor.sort(sort_fields)
     return cursor
 
+def build_keyset_sort(sort_param):
+    """Build keyset sort fields, always ending with _id as a unique tiebreaker"""
+    sort_fields = parse_sort_fields(sort_param)
+    if not any(field == '_id' for field, _ in sort_fields):
+        sort_fields.append(('_id', 1))
+    return sort_fields
+
+def get_field_value(doc, field):
+    """Read a (possibly dotted) field from a document"""
+    value = doc
+    for part in field.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+def encode_page_token(doc, sort_fields):
+    """Encode the sort key of a document as an opaque continuation token"""
+    payload = {
+        "s": [[field, direction] for field, direction in sort_fields],
+        "v": [get_field_value(doc, field) for field, _ in sort_fields]
+    }
+    # json_util keeps ObjectId/datetime values typed across the round trip
+    raw = json_util.dumps(payload).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_page_token(token, sort_fields):
+    """Decode a continuation token and return the sort key values it holds"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json_util.loads(raw.decode('utf-8'))
+        token_sort = [(field, direction) for field, direction in payload["s"]]
+        values = payload["v"]
+    except Exception:
+        raise ValueError("Invalid pagination token")
+
+    if token_sort != sort_fields or len(values) != len(sort_fields):
+        raise ValueError("Pagination token does not match the requested sort")
+    return values
+
+# MongoDB's sort order across BSON types, as $type aliases; null also stands for a missing field
+SORT_TYPE_ORDER = ('null', 'number', 'string', 'binData', 'objectId', 'bool', 'date', 'timestamp', 'regex')
+
+def sort_type(field, value):
+    """$type alias of a sort key value; object and array keys cannot be paged by keyset"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float, Decimal128)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, (bytes, Binary)):
+        return 'binData'
+    if isinstance(value, ObjectId):
+        return 'objectId'
+    if isinstance(value, datetime):
+        return 'date'
+    if isinstance(value, Timestamp):
+        return 'timestamp'
+    if isinstance(value, (Regex, re.Pattern)):
+        return 'regex'
+    raise ValueError(f"Keyset pagination needs scalar sort values; '{field}' holds {type(value).__name__}")
+
+def seek_past(field, value, direction):
+    """Conditions matching values of field strictly after value in the given sort direction"""
+    value_type = sort_type(field, value)
+    rank = SORT_TYPE_ORDER.index(value_type)
+    # Range operators only match values of the same type, so later types need their own branches
+    later_types = SORT_TYPE_ORDER[rank + 1:] if direction == 1 else SORT_TYPE_ORDER[:rank]
+    conditions = []
+    if value_type != 'null':
+        conditions.append({field: {'$gt' if direction == 1 else '$lt': value}})
+    for type_alias in later_types:
+        # {field: None} matches null and missing, which sort together
+        conditions.append({field: None} if type_alias == 'null' else {field: {'$type': type_alias}})
+    return conditions
+
+def build_keyset_filter(sort_fields, values, reverse=False):
+    """Build a range predicate selecting documents after (or before) a sort key"""
+    conditions = []
+    for i, (field, direction) in enumerate(sort_fields):
+        if reverse:
+            direction = -direction
+        # Equality on None matches null and missing alike, which is how the sort groups them
+        prefix = {prev_field: prev_value
+                  for (prev_field, _), prev_value in zip(sort_fields[:i], values[:i])}
+        branches = seek_past(field, values[i], direction)
+        if len(branches) == 1:
+            conditions.append({**prefix, **branches[0]})
+        elif branches:
+            conditions.append({**prefix, '$or': branches})
+    if not conditions:
+        # Nothing sorts after the key
+        return {'_id': {'$exists': False}}
+    return {'$or': conditions}
+
 def build_projection(fields_param):
     """Build MongoDB projection from fields parameter"""
     if not fields_param:
@@ -201,21 +374,214 @@ def build_projection(fields_param):
     
     return projection
 
-def build_text_search_filter(search_term):
-    """Build text search filter for multiple common fields"""
+def apply_search(filter_dict, collection_name, search_term, search_mode=None):
+    """Combine a filter with the collection's search filter; returns (filter, search plan)"""
     if not search_term:
-        return {}
-    
-    # Common searchable fields - adjust based on your collections
-    search_fields = ['name', 'title', 'description', 'email', 'username', 'content']
-    
-    search_conditions = []
-    for field in search_fields:
-        search_conditions.append({
-            field: {'$regex': search_term, '$options': 'i'}
-        })
+        return filter_dict, None
     
-    return {'$or': search_conditions}
+    # Text index, indexed prefix shadows or the regex fallback, per collection
+    search = search_engine.plan(collection_name, search_term, search_mode)
+    if filter_dict:
+        return {'$and': [filter_dict, search["filter"]]}, search
+    return search["filter"], search
+
+def hide_search_shadows(projection):
+    """Keep prefix-search shadow fields out of returned documents"""
+    if projection and any(flag == 1 for flag in projection.values()):
+        return projection
+    return {**(projection or {}), Config.SEARCH_SHADOW_PREFIX: 0}
+
+COUNT_MODES = ('exact', 'estimated', 'none')
+
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+def count_cache_key(collection, filter_dict):
+    """Key identifying a filter's count in the count cache"""
+    return (collection.name, json_util.dumps(filter_dict, sort_keys=True))
+
+def lookup_cached_count(key):
+    """Return a cached count that has not expired yet, or None"""
+    with _count_cache_lock:
+        entry = _count_cache.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+    return None
+
+def store_cached_count(key, count):
+    """Remember a count for COUNT_CACHE_TTL seconds"""
+    now = time.monotonic()
+    with _count_cache_lock:
+        if len(_count_cache) >= Config.COUNT_CACHE_SIZE:
+            # Drop expired entries first, then the oldest insertion
+            for stale_key in [k for k, (_, expires) in _count_cache.items() if expires <= now]:
+                del _count_cache[stale_key]
+            if len(_count_cache) >= Config.COUNT_CACHE_SIZE:
+                del _count_cache[next(iter(_count_cache))]
+        _count_cache[key] = (count, now + Config.COUNT_CACHE_TTL)
+
+def get_cached_count(collection, filter_dict):
+    """Count documents for a filter, reusing recent counts for the same filter"""
+    key = count_cache_key(collection, filter_dict)
+    count = lookup_cached_count(key)
+    if count is None:
+        count = collection.count_documents(filter_dict)
+        store_cached_count(key, count)
+    return count
+
+def count_matching(collection, filter_dict, count_mode):
+    """Total number of matching documents for the requested count mode"""
+    if count_mode == 'none':
+        return None
+    if count_mode == 'estimated':
+        if not filter_dict:
+            # Served from collection metadata, no scan needed
+            return collection.estimated_document_count()
+        return get_cached_count(collection, filter_dict)
+    return collection.count_documents(filter_dict)
+
+def cache_allowed():
+    """Clients can bypass the result cache with Cache-Control: no-cache"""
+    return 'no-cache' not in request.headers.get('Cache-Control', '')
+
+def coalesce_key(path, params, use_cache, mimetype=JSON_MIMETYPE):
+    """Normalized request key: the path, its query parameters in sorted order and the body encoding"""
+    key = f"{path}?{urlencode(sorted(params))}"
+    if mimetype != JSON_MIMETYPE:
+        key += f" as {mimetype}"
+    return key if use_cache else key + " (no-cache)"
+
+def coalesce_identical(view):
+    """Serve identical concurrent GETs from one execution, sharing its serialized response"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not Config.COALESCE_ENABLED:
+            return view(*args, **kwargs)
+        key = coalesce_key(request.path, request.args.items(multi=True), cache_allowed(), response_mimetype())
+        
+        def work():
+            response = app.make_response(view(*args, **kwargs))
+            return response.get_data(), response.status_code, response.mimetype
+        
+        (body, status, mimetype), role = single_flight.do(key, work)
+        stats = current_request()
+        if stats is not None:
+            metrics.coalesced.inc(stats.route or 'unmatched', role)
+        return app.response_class(body, status=status, mimetype=mimetype)
+    return wrapper
+
+def response_mimetype():
+    """Body encoding the client asked for with Accept: JSON, BSON or MessagePack"""
+    return negotiate_mimetype(request.headers.get('Accept'))
+
+def revalidate(endpoint, scope=lambda collection_name=DATABASE_SCOPE: collection_name):
+    """Answer If-None-Match with 304 before running the view while the collection is unchanged.
+
+    The last ETag served for the request is trusted for the endpoint's result
+    cache TTL, unless the collection changed meanwhile; scope maps the view
+    arguments to the collection the response is read from.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            ttl = result_cache.ttls.get(endpoint) if result_cache.enabled else 0
+            if not Config.ETAG_ENABLED or not ttl or not cache_allowed():
+                return view(*args, **kwargs)
+            collection_scope = scope(**kwargs)
+            key = coalesce_key(request.path, request.args.items(multi=True), True, response_mimetype())
+            key += f" {negotiate_encoding(request.headers.get('Accept-Encoding')) or 'identity'}"
+            tag = validators.lookup(key)
+            if tag is not None and etag_matches(request.headers.get('If-None-Match'), tag):
+                validators.count('not_modified_early')
+                response = app.response_class(status=304, mimetype=response_mimetype())
+                response.set_etag(tag)
+                return response
+            # Take the marker before reading, so a change during the read invalidates the tag
+            g.validator = (key, collection_scope, validators.marker(collection_scope), ttl)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@app.after_request
+def negotiate_response(response):
+    """Tag, revalidate and compress responses for the client's Accept-Encoding"""
+    if binary_encodings_offered() and response.mimetype in (JSON_MIMETYPE, BSON_MIMETYPE, MSGPACK_MIMETYPE):
+        response.vary.add('Accept')
+    # File responses (static assets) keep their own validators and range support
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    encoding = None
+    if compressible(response.mimetype):
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+
+    if response.is_streamed:
+        if encoding:
+            response.response = compress_chunks(response.response, encoding)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    body = response.get_data()
+    if len(body) < Config.COMPRESSION_MIN_BYTES:
+        encoding = None
+    if Config.ETAG_ENABLED and request.method in ('GET', 'HEAD') and response.status_code == 200:
+        tag = representation_tag(body_tag(body), encoding)
+        response.set_etag(tag)
+        validator = g.pop('validator', None)
+        if validator is not None:
+            key, collection_scope, marker, ttl = validator
+            validators.remember(key, collection_scope, marker, tag, ttl)
+        if etag_matches(request.headers.get('If-None-Match'), tag):
+            validators.count('not_modified')
+            response.status_code = 304
+            return response
+        validators.count('tagged')
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def wants_ndjson():
+    """Check whether the client asked for a newline-delimited JSON stream"""
+    return prefers_ndjson(request.headers.get('Accept'))
+
+def ndjson_lines(documents):
+    """Encode a cursor or document stream as NDJSON lines, one document at a time"""
+    stats = current_request()
+    encoding = 0.0
+    count = 0
+    try:
+        for doc in documents:
+            started = time.perf_counter()
+            line = json_dumps(doc) + '\n'
+            encoding += time.perf_counter() - started
+            count += 1
+            yield line
+    except Exception as e:
+        # Headers are already sent, so report the failure as a final line
+        yield json.dumps({"success": False, "error": str(e)}) + '\n'
+    finally:
+        documents.close()
+        if stats is not None:
+            stats.add('serialize', encoding)
+            stats.add_documents(count)
+
+def ndjson_response(cursor):
+    """Stream a cursor (or a partitioned scan) as NDJSON"""
+    if hasattr(cursor, 'batch_size'):
+        cursor = cursor.batch_size(Config.EXPORT_BATCH_SIZE)
+    return Response(stream_with_context(ndjson_lines(cursor)), mimetype=NDJSON_MIMETYPE)
+
+def parse_parallel(value):
+    """Partition count from a parallel parameter: true, a number, or false/absent"""
+    if value is None or value is False or str(value).lower() in ('', 'false', '0'):
+        return None
+    if value is True or str(value).lower() == 'true':
+        return Config.SCAN_PARTITIONS
+    try:
+        return max(1, min(int(value), Config.SCAN_MAX_PARTITIONS))
+    except (TypeError, ValueError):
+        raise ValueError("parallel must be true, false or a number of partitions")
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -232,76 +598,322 @@ def health_check():
                 "database_name": Config.DATABASE_NAME,
                 "collections_count": len(collections),
                 "database_size_mb": round(stats.get('dataSize', 0) / (1024 * 1024), 2),
+                "connection_pool": db_instance.pool_stats.snapshot(),
+                "read_routing": read_router.describe(),
                 "timestamp": datetime.utcnow().isoformat()
             }), 200
         else:
-            return jsonify({"status": "unhealthy", "database": "disconnected"}), 500
+            return jsonify({
+                "status": "unhealthy",
+                "database": "disconnected",
+                "connection_pool": db_instance.pool_stats.snapshot()
+            }), 500
     except Exception as e:
         return jsonify({"status": "unhealthy", "error": str(e)}), 500
 
+def parse_query_params(args, collection_name):
+    """Turn /query parameters into a query spec shared by every serving mode.
+
+    Raises ValueError for parameters that should produce a 400.
+    """
+    # Get pagination parameters
+    limit = min(args.get('limit', Config.DEFAULT_LIMIT, type=int), Config.MAX_LIMIT)
+    skip = args.get('skip', 0, type=int)
+    
+    # Total count strategy: exact, estimated or none
+    count_mode = args.get('count', 'exact')
+    if count_mode not in COUNT_MODES:
+        raise ValueError(f"count must be one of: {', '.join(COUNT_MODES)}")
+    
+    # Compile filter parameters with the collection's field type hints (memoized)
+    filter_dict = query_compiler.compile(collection_name, args)
+    
+    # Add text search if provided
+    search_term = args.get('search')
+    filter_dict, search = apply_search(filter_dict, collection_name, search_term, args.get('search_mode'))
+    
+    # Build projection for field selection
+    projection = build_projection(args.get('fields'))
+    
+    sort_param = args.get('sort')
+    after = args.get('after')
+    before = args.get('before')
+    keyset_mode = bool(after or before) or args.get('paginate') == 'keyset'
+    
+    sort_fields = parse_sort_fields(sort_param)
+    ranked = bool(search and search["rank"])
+    if ranked and not sort_param and not keyset_mode:
+        # Best text matches first unless the client asked for another order
+        sort_fields = [('score', TEXT_SCORE)]
+    
+    spec = {
+        "filter": filter_dict,
+        "projection": projection,
+        "search_term": search_term,
+        "search_mode": search["mode"] if search else None,
+        "sort": sort_fields,
+        "limit": limit,
+        "skip": skip,
+        "count_mode": count_mode,
+        "keyset": keyset_mode,
+        "after": after,
+        "before": before
+    }
+    
+    if keyset_mode:
+        if after and before:
+            raise ValueError("Use either 'after' or 'before', not both")
+        
+        # Keyset pagination: seek past the last-seen sort key instead of skipping
+        sort_fields = build_keyset_sort(sort_param)
+        page_filter = filter_dict
+        if after or before:
+            values = decode_page_token(after or before, sort_fields)
+            keyset_filter = build_keyset_filter(sort_fields, values, reverse=bool(before))
+            page_filter = {'$and': [filter_dict, keyset_filter]} if filter_dict else keyset_filter
+        
+        # The sort key must survive the projection to build continuation tokens
+        fetch_projection = hide_search_shadows(projection)
+        if projection:
+            fetch_projection = dict(fetch_projection)
+            includes = any(flag == 1 for flag in projection.values())
+            for field, _ in sort_fields:
+                if fetch_projection.get(field) == 0:
+                    del fetch_projection[field]
+                elif includes:
+                    fetch_projection[field] = 1
+        
+        spec.update({
+            "keyset_sort": sort_fields,
+            "page_filter": page_filter,
+            "fetch_projection": fetch_projection,
+            # Walk backwards for 'before' and flip the page back into sort order
+            "fetch_sort": [(field, -direction) for field, direction in sort_fields] if before else sort_fields,
+            "fetch_skip": 0,
+            # Fetch one extra document to know whether another page exists
+            "fetch_limit": limit + 1
+        })
+    else:
+        spec.update({
+            "page_filter": filter_dict,
+            "fetch_projection": hide_search_shadows(projection),
+            "fetch_sort": spec["sort"],
+            "fetch_skip": skip,
+            # Without a total, fetch one extra document to detect a next page
+            "fetch_limit": limit + 1 if count_mode == 'none' and limit > 0 else limit
+        })
+    if ranked:
+        spec["fetch_projection"] = {**spec["fetch_projection"], 'score': TEXT_SCORE}
+    return spec
+
+def open_query_cursor(collection, spec):
+    """Open the page cursor for a query spec (works with sync and async drivers)"""
+    cursor = collection.find(spec["page_filter"], spec["fetch_projection"])
+    if spec["fetch_sort"]:
+        cursor = cursor.sort(spec["fetch_sort"])
+    if spec["fetch_skip"]:
+        cursor = cursor.skip(spec["fetch_skip"])
+    return cursor.limit(spec["fetch_limit"])
+
+def build_query_response(collection_name, spec, results, total_count):
+    """Assemble the /query response body from the fetched page"""
+    limit = spec["limit"]
+    count_mode = spec["count_mode"]
+    
+    if spec["keyset"]:
+        after = spec["after"]
+        before = spec["before"]
+        sort_fields = spec["keyset_sort"]
+        has_more = len(results) > limit
+        results = results[:limit]
+        if before:
+            results.reverse()
+        
+        next_cursor = None
+        prev_cursor = None
+        if results:
+            if has_more or before:
+                next_cursor = encode_page_token(results[-1], sort_fields)
+            if (has_more and before) or after:
+                prev_cursor = encode_page_token(results[0], sort_fields)
+        
+        pagination = {
+            "mode": "keyset",
+            "count_mode": count_mode,
+            "count": len(results),
+            "limit": limit,
+            "has_more": next_cursor is not None,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor
+        }
+        if total_count is not None:
+            pagination["total"] = total_count
+    else:
+        skip = spec["skip"]
+        extra_row = len(results) > limit > 0
+        results = results[:limit] if limit > 0 else results
+        
+        pagination = {
+            "mode": "skip",
+            "count_mode": count_mode,
+            "count": len(results),
+            "skip": skip,
+            "limit": limit,
+            "page": (skip // limit) + 1 if limit > 0 else 1
+        }
+        if total_count is None:
+            pagination["has_more"] = extra_row
+        else:
+            pagination["total"] = total_count
+            pagination["has_more"] = (skip + limit) < total_count
+            pagination["total_pages"] = (total_count + limit - 1) // limit if limit > 0 else 1
+    
+    response = {
+        "success": True,
+        "data": results,
+        "pagination": pagination,
+        "collection": collection_name
+    }
+    
+    # Add applied filters to response
+    if spec["filter"]:
+        response["filters_applied"] = str(spec["filter"])
+    if spec["search_term"]:
+        response["search_term"] = spec["search_term"]
+        response["search_mode"] = spec["search_mode"]
+    if spec["projection"]:
+        response["fields_selected"] = list(spec["projection"].keys())
+    return response
+
+def query_cache_key(collection_name, spec, read_route):
+    """Result cache key for a normalized query spec and the read route it runs on"""
+    # A secondary or weaker read concern may return older data than the primary,
+    # so per-request overrides must not share entries with the configured route
+    return result_cache.make_key(
+        'query', collection_name,
+        filter=spec["filter"], projection=spec["projection"], sort=spec["sort"],
+        skip=spec["skip"], limit=spec["limit"], count=spec["count_mode"],
+        keyset=spec["keyset"], after=spec["after"], before=spec["before"],
+        read=read_route.describe()
+    )
+
 @app.route('/query/<collection_name>', methods=['GET'])
+@revalidate('query')
+@coalesce_identical
 def query_collection(collection_name):
     """Query any collection with advanced filtering, pagination, and sorting"""
+    return serve_query(collection_name)
+
+def serve_query(collection_name, extra=None, route_name='query'):
+    """Run a /query request against a collection; extra is merged into a successful response"""
     try:
-        collection = db_instance.get_collection(collection_name)
-        
-        # Get pagination parameters
-        limit = min(request.args.get('limit', Config.DEFAULT_LIMIT, type=int), Config.MAX_LIMIT)
-        skip = request.args.get('skip', 0, type=int)
+        try:
+            with phase('parse'):
+                read_route = read_router.route(route_name, overrides_from(request.args))
+                spec = parse_query_params(request.args, collection_name)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "collection": collection_name
+            }), 400
+        collection = db_instance.get_collection(collection_name, read_route)
         
-        # Build filter from query parameters
-        filter_dict = build_filter_from_params(request.args)
+        note_query(collection_name, spec["page_filter"], spec["fetch_sort"])
         
-        # Add text search if provided
-        search_term = request.args.get('search')
-        if search_term:
-            search_filter = build_text_search_filter(search_term)
-            if filter_dict:
-                filter_dict = {'$and': [filter_dict, search_filter]}
-            else:
-                filter_dict = search_filter
+        # Serve identical normalized queries from the result cache
+        cache_key = query_cache_key(collection_name, spec, read_route)
+        use_cache = cache_allowed()
+        if use_cache:
+            cached = result_cache.get('query', cache_key)
+            if cached is not None:
+                return jsonify({**cached, **extra} if extra else cached), 200
         
-        # Build projection for field selection
-        projection = build_projection(request.args.get('fields'))
+        # Warn about or refuse query shapes that scan a large collection
+        warning = None
+        if Config.INDEX_ADVISOR_ENABLED:
+            warning = index_advisor.check(collection_name, spec["filter"], spec["fetch_sort"])
+            if warning and Config.QUERY_UNINDEXED_ACTION == 'reject':
+                return jsonify({
+                    "success": False,
+                    "error": warning,
+                    "collection": collection_name
+                }), 400
         
-        # Execute query with pagination and projection
-        cursor = collection.find(filter_dict, projection).skip(skip).limit(limit)
+        # Execute query with pagination, projection and sorting
+        started = time.perf_counter()
+        results = list(open_query_cursor(collection, spec))
         
-        # Apply sorting if specified
-        sort_param = request.args.get('sort')
-        cursor = apply_sorting(cursor, sort_param)
+        # Get total count for pagination info
+        total_count = count_matching(collection, spec["filter"], spec["count_mode"])
         
-        # Convert to list and serialize ObjectIds
-        results = list(cursor)
-        results = db_instance.serialize_doc(results)
+        if Config.INDEX_ADVISOR_ENABLED:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            index_advisor.record(collection_name, spec["filter"], spec["fetch_sort"], elapsed_ms, len(results))
         
-        # Get total count for pagination info
-        total_count = collection.count_documents(filter_dict)
+        response = build_query_response(collection_name, spec, results, total_count)
+        if warning:
+            response["warnings"] = [warning]
+        if use_cache:
+            result_cache.set('query', cache_key, response)
+        if extra:
+            response = {**response, **extra}
+        return jsonify(response), 200
         
-        response = {
-            "success": True,
-            "data": results,
-            "pagination": {
-                "count": len(results),
-                "total": total_count,
-                "skip": skip,
-                "limit": limit,
-                "has_more": (skip + limit) < total_count,
-                "page": (skip // limit) + 1 if limit > 0 else 1,
-                "total_pages": (total_count + limit - 1) // limit if limit > 0 else 1
-            },
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
             "collection": collection_name
-        }
+        }), 500
+
+@app.route('/export/<collection_name>', methods=['GET'])
+def export_collection(collection_name):
+    """Stream every matching document as NDJSON without buffering the result"""
+    try:
+        # Build filter, search and projection the same way as /query
+        try:
+            with phase('parse'):
+                read_route = read_router.route('export', overrides_from(request.args))
+                filter_dict = query_compiler.compile(collection_name, request.args)
+                filter_dict, _ = apply_search(
+                    filter_dict, collection_name, request.args.get('search'), request.args.get('search_mode'))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "collection": collection_name
+            }), 400
+        collection = db_instance.get_collection(collection_name, read_route)
+        projection = hide_search_shadows(build_projection(request.args.get('fields')))
+        skip = request.args.get('skip', 0, type=int)
+        limit = request.args.get('limit', 0, type=int)
+        note_query(collection_name, filter_dict, parse_sort_fields(request.args.get('sort')))
         
-        # Add applied filters to response
-        if filter_dict:
-            response["filters_applied"] = str(filter_dict)
-        if search_term:
-            response["search_term"] = search_term
-        if projection:
-            response["fields_selected"] = list(projection.keys())
-            
-        return jsonify(response), 200
+        # Whole-collection dumps can read _id ranges on several workers at once
+        try:
+            partitions = parse_parallel(request.args.get('parallel'))
+            if partitions and (request.args.get('sort') or skip or limit):
+                raise ValueError("parallel exports cannot use sort, skip or limit; use ordered=true for _id order")
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "collection": collection_name
+            }), 400
+        if partitions:
+            ordered = request.args.get('ordered', 'false').lower() == 'true'
+            return ndjson_response(partitioned_scanner.find(collection, filter_dict, projection, partitions, ordered))
+        
+        # Exports are not capped by MAX_LIMIT; limit=0 means everything
+        cursor = collection.find(filter_dict, projection)
+        cursor = apply_sorting(cursor, request.args.get('sort'))
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        
+        return ndjson_response(cursor)
         
     except Exception as e:
         return jsonify({
@@ -310,37 +922,89 @@ def query_collection(collection_name):
             "collection": collection_name
         }), 500
 
+@app.route('/collection/<collection_name>/bulk', methods=['POST'])
+def bulk_write_collection(collection_name):
+    """Apply an NDJSON stream of insert/update/upsert/replace/delete operations in batches"""
+    if not Config.BULK_WRITES_ENABLED:
+        return jsonify({
+            "success": False,
+            "error": "Bulk writes are disabled; set BULK_WRITES_ENABLED=true",
+            "collection": collection_name
+        }), 403
+    
+    try:
+        # Batch size and write concern apply to every batch of this upload
+        batch_size = request.args.get('batch_size', Config.BULK_BATCH_SIZE, type=int)
+        batch_size = max(1, min(batch_size, Config.BULK_MAX_BATCH_SIZE))
+        write_concern = write_concern_from_args(request.args)
+        errors_only = request.args.get('results') == 'errors'
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "collection": collection_name
+        }), 400
+    
+    collection = db_instance.get_collection(collection_name)
+    lines = iter_ndjson_lines(request.stream, Config.BULK_MAX_LINE_BYTES)
+    
+    def generate():
+        try:
+            for result in bulk_writer.run(collection, lines, batch_size, Config.BULK_MAX_IN_FLIGHT,
+                                          write_concern, on_batch=on_collection_change):
+                if errors_only and result.get("ok") is not False and "summary" not in result:
+                    continue
+                yield json_dumps(result) + '\n'
+        except Exception as e:
+            # Headers are already sent, so report the failure as a final line
+            yield json.dumps({"success": False, "error": str(e)}) + '\n'
+    
+    # Results stream back while the upload is still being read
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
 @app.route('/collections', methods=['GET'])
+@revalidate('collections')
+@coalesce_identical
 def list_collections():
-    """List all available collections with document counts"""
+    """List available collections with estimated document counts"""
     try:
-        collection_names = db_instance.db.list_collection_names()
-        collections_info = []
+        # Optional filtering and pagination of the collection list itself
+        name_filter = request.args.get('name')
+        skip = max(request.args.get('skip', 0, type=int), 0)
+        limit = request.args.get('limit', type=int)
         
-        for name in collection_names:
-            try:
-                count = db_instance.db[name].count_documents({})
-                # Get sample document to show structure
-                sample = db_instance.db[name].find_one()
-                sample_fields = list(sample.keys()) if sample else []
-                
-                collections_info.append({
-                    "name": name,
-                    "count": count,
-                    "sample_fields": sample_fields[:10]  # First 10 fields
-                })
-            except Exception as e:
-                collections_info.append({
-                    "name": name,
-                    "count": 0,
-                    "error": str(e)
-                })
+        cache_key = result_cache.make_key('collections', DATABASE_SCOPE,
+                                          name=name_filter, skip=skip, limit=limit)
+        use_cache = cache_allowed()
+        if use_cache:
+            cached = result_cache.get('collections', cache_key)
+            if cached is not None:
+                return jsonify(cached), 200
         
-        return jsonify({
+        collection_names = collection_catalog.list_names(name_filter)
+        page_names = collection_names[skip:skip + limit] if limit is not None else collection_names[skip:]
+        if not use_cache:
+            for name in page_names:
+                collection_catalog.invalidate(name)
+        collections_info = collection_catalog.describe(page_names)
+        
+        response = {
             "success": True,
             "collections": collections_info,
-            "total_collections": len(collections_info)
-        }), 200
+            "total_collections": len(collection_names),
+            "count_mode": "estimated",
+            "pagination": {
+                "count": len(collections_info),
+                "skip": skip,
+                "limit": limit,
+                "has_more": skip + len(collections_info) < len(collection_names)
+            }
+        }
+        if name_filter:
+            response["name_filter"] = name_filter
+        if use_cache:
+            result_cache.set('collections', cache_key, response)
+        return jsonify(response), 200
     except Exception as e:
         return jsonify({
             "success": False,
@@ -348,59 +1012,63 @@ def list_collections():
         }), 500
 
 @app.route('/collection/<collection_name>/schema', methods=['GET'])
+@revalidate('schema')
+@coalesce_identical
 def get_collection_schema(collection_name):
     """Get schema information for a collection"""
     try:
-        collection = db_instance.get_collection(collection_name)
+        collection = db_instance.get_collection(collection_name, read_router.route('schema'))
         
-        # Get sample documents to infer schema
-        sample_size = min(request.args.get('sample_size', 100, type=int), 1000)
-        samples = list(collection.find().limit(sample_size))
+        # Sample size only applies when the stored profile is (re)built
+        sample_size = request.args.get('sample_size', type=int)
+        if sample_size is not None:
+            sample_size = max(1, min(sample_size, Config.SCHEMA_MAX_SAMPLE_SIZE))
+        rebuild = request.args.get('refresh') == 'full'
         
-        if not samples:
-            return jsonify({
-                "success": True,
-                "collection": collection_name,
-                "schema": {},
-                "document_count": 0
-            }), 200
+        cache_key = result_cache.make_key('schema', collection_name, sample_size=sample_size)
+        use_cache = cache_allowed() and not rebuild
+        if use_cache:
+            cached = result_cache.get('schema', cache_key)
+            if cached is not None:
+                return jsonify(cached), 200
+        
+        # Read the persisted profile; it is refreshed incrementally from newer _ids
+        profile = schema_profiler.get_profile(collection_name, sample_size, force_rebuild=rebuild)
         
-        # Analyze field types
-        schema = {}
-        for doc in samples:
-            for field, value in doc.items():
-                if field not in schema:
-                    schema[field] = {
-                        "types": set(),
-                        "sample_values": [],
-                        "null_count": 0,
-                        "total_count": 0
-                    }
-                
-                schema[field]["total_count"] += 1
-                
-                if value is None:
-                    schema[field]["null_count"] += 1
-                    schema[field]["types"].add("null")
-                else:
-                    value_type = type(value).__name__
-                    schema[field]["types"].add(value_type)
-                    
-                    # Add sample values (limit to 5)
-                    if len(schema[field]["sample_values"]) < 5:
-                        if isinstance(value, (str, int, float, bool)):
-                            schema[field]["sample_values"].append(value)
-        
-        # Convert sets to lists for JSON serialization
-        for field_info in schema.values():
-            field_info["types"] = list(field_info["types"])
+        response = {
+            "success": True,
+            "collection": collection_name,
+            "schema": profile["schema"],
+            "document_count": collection.estimated_document_count(),
+            "sample_size": profile["sample_size"],
+            "profile_method": profile["profile_method"],
+            "profiled_at": profile["profiled_at"]
+        }
+        if use_cache:
+            result_cache.set('schema', cache_key, response)
+        return jsonify(response), 200
         
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "collection": collection_name
+        }), 500
+
+
+@app.route('/collection/<collection_name>/search-index', methods=['GET'])
+def get_search_index(collection_name):
+    """Which search backends a collection can use for ?search="""
+    try:
+        text_fields, prefix_fields = search_engine.index_status(collection_name)
         return jsonify({
             "success": True,
             "collection": collection_name,
-            "schema": schema,
-            "document_count": collection.count_documents({}),
-            "sample_size": len(samples)
+            "search_fields": search_engine.search_fields(collection_name),
+            "text_index_fields": text_fields,
+            "prefix_fields": prefix_fields,
+            "default_mode": Config.SEARCH_MODE,
+            "regex_allowed": Config.SEARCH_ALLOW_REGEX
         }), 200
         
     except Exception as e:
@@ -410,6 +1078,216 @@ def get_collection_schema(collection_name):
             "collection": collection_name
         }), 500
 
+@app.route('/collection/<collection_name>/search-index', methods=['POST'])
+def build_search_index(collection_name):
+    """Create a text index, or lowercase prefix shadow fields, for ?search="""
+    try:
+        body = request.json or {}
+        index_type = body.get('type', 'text')
+        fields = body.get('fields')
+        
+        if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+            return jsonify({
+                "success": False,
+                "error": "fields must be a list of field names",
+                "collection": collection_name
+            }), 400
+        
+        if index_type == 'text':
+            result = search_engine.build_text_index(collection_name, fields, body.get('language'))
+        elif index_type == 'prefix':
+            result = search_engine.build_prefix_shadows(collection_name, fields)
+        else:
+            return jsonify({
+                "success": False,
+                "error": "type must be 'text' or 'prefix'",
+                "collection": collection_name
+            }), 400
+        
+        # Results computed with the previous search backend are stale
+        on_collection_change(collection_name)
+        return jsonify({"success": True, "collection": collection_name, **result}), 200
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "collection": collection_name
+        }), 500
+
+def views_disabled():
+    return jsonify({
+        "success": False,
+        "error": "Materialized views are disabled; set VIEWS_ENABLED=true"
+    }), 403
+
+@app.route('/views', methods=['GET'])
+def list_views():
+    """Registered materialized views and their refresh status"""
+    if not Config.VIEWS_ENABLED:
+        return views_disabled()
+    try:
+        views = [view_manager.status(definition) for definition in view_manager.definitions()]
+        return jsonify({"success": True, "views": views, "count": len(views)}), 200
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/views', methods=['POST'])
+def register_view():
+    """Register (or replace) a named pipeline as a materialized view"""
+    if not Config.VIEWS_ENABLED:
+        return views_disabled()
+    try:
+        body = request.json or {}
+        try:
+            definition = view_manager.register(body)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e),
+                "view": body.get('name')
+            }), 400
+        
+        # Build it now when asked, otherwise the scheduler picks it up on its next tick
+        run = None
+        if str(body.get('refresh', request.args.get('refresh', ''))).lower() == 'true':
+            run = view_manager.refresh(definition["_id"], full=True)
+            definition = view_manager.get(definition["_id"])
+        return jsonify({"success": True, "view": view_manager.status(definition), "refresh": run}), 201
+        
+    except ViewBusy as e:
+        return jsonify({"success": False, "error": str(e)}), 409
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/views/<view_name>', methods=['GET'])
+@revalidate('query', scope=lambda view_name: view_target(view_name))
+@coalesce_identical
+def read_view(view_name):
+    """Precomputed view results, with the same filtering, sorting and pagination as /query"""
+    if not Config.VIEWS_ENABLED:
+        return views_disabled()
+    try:
+        definition = view_manager.get(view_name)
+    except ViewNotFound as e:
+        return jsonify({"success": False, "error": str(e), "view": view_name}), 404
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e), "view": view_name}), 500
+    
+    status = view_manager.status(definition)
+    return serve_query(definition["target"], route_name='views', extra={"view": {
+        "name": view_name,
+        "refreshed_at": status["refreshed_at"],
+        "watermark": status["watermark"],
+        "stale": status["stale"]
+    }})
+
+@app.route('/views/<view_name>', methods=['DELETE'])
+def delete_view(view_name):
+    """Unregister a view; ?drop=true also drops its materialized collection"""
+    if not Config.VIEWS_ENABLED:
+        return views_disabled()
+    try:
+        view_manager.delete(view_name, drop_target=request.args.get('drop', 'false').lower() == 'true')
+        return jsonify({"success": True, "view": view_name}), 200
+    except ViewNotFound as e:
+        return jsonify({"success": False, "error": str(e), "view": view_name}), 404
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "view": view_name
+        }), 500
+
+@app.route('/views/<view_name>/refresh', methods=['POST'])
+def refresh_view(view_name):
+    """Refresh a view now (incrementally when it has a watermark; ?full=true rebuilds it)"""
+    if not Config.VIEWS_ENABLED:
+        return views_disabled()
+    try:
+        run = view_manager.refresh(view_name, full=request.args.get('full', 'false').lower() == 'true')
+        return jsonify({"success": True, "view": view_name, "refresh": run}), 200
+    except ViewNotFound as e:
+        return jsonify({"success": False, "error": str(e), "view": view_name}), 404
+    except ViewBusy as e:
+        return jsonify({"success": False, "error": str(e), "view": view_name}), 409
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "view": view_name
+        }), 500
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Result cache, compiled query plan, request coalescing and ETag counters"""
+    try:
+        return jsonify({
+            "success": True,
+            "cache": result_cache.stats(),
+            "query_plans": query_compiler.stats(),
+            "coalescing": single_flight.stats(),
+            "conditional": validators.stats()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, MongoDB command and connection pool metrics in Prometheus text format"""
+    if not Config.METRICS_ENABLED:
+        return jsonify({
+            "success": False,
+            "error": "Metrics are disabled; set METRICS_ENABLED=true"
+        }), 404
+    
+    # Pool and cache state is read at scrape time
+    pool = db_instance.pool_stats.snapshot()
+    cache = result_cache.stats()
+    extra = [
+        ("mongodb_pool_max_size", "gauge", "Configured maximum connections per server", pool["max_pool_size"]),
+        ("mongodb_pool_connections_open", "gauge", "Open pooled connections", pool["open_connections"]),
+        ("mongodb_pool_connections_in_use", "gauge", "Connections checked out right now", pool["in_use"]),
+        ("mongodb_pool_checkouts_total", "counter", "Connection checkouts", pool["checkouts"]),
+        ("mongodb_pool_checkout_failures_total", "counter", "Failed connection checkouts", pool["checkout_failures"]),
+        ("mongodb_pool_clears_total", "counter", "Times the pool was cleared", pool["pool_clears"]),
+        ("result_cache_hits_total", "counter", "Result cache hits", cache["hits"]),
+        ("result_cache_misses_total", "counter", "Result cache misses", cache["misses"]),
+        ("result_cache_entries", "gauge", "Entries in the result cache", cache["entries"]),
+    ]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/index-advice', methods=['GET'])
+def index_advice():
+    """Query shapes that scan or sort in memory, ranked by total time, with suggested indexes"""
+    try:
+        collection_name = request.args.get('collection')
+        include_all = request.args.get('all', 'false').lower() == 'true'
+        limit = min(request.args.get('limit', 20, type=int), Config.MAX_LIMIT)
+        
+        advice = index_advisor.advice(collection_name, include_all=include_all, limit=limit)
+        return jsonify({
+            "success": True,
+            "advice": advice,
+            "count": len(advice),
+            "enabled": Config.INDEX_ADVISOR_ENABLED,
+            "unindexed_action": Config.QUERY_UNINDEXED_ACTION
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
 
 @app.route('/')
 def dashboard():
@@ -419,27 +1297,83 @@ def dashboard():
 def aggregate_collection(collection_name):
     """Execute aggregation pipeline on collection"""
     try:
-        collection = db_instance.get_collection(collection_name)
+        # Get pipeline and guardrail overrides from request body
+        body = request.json or {}
+        pipeline = body.get('pipeline', [])
+        explain = str(body.get('explain', request.args.get('explain', ''))).lower() == 'true'
+        streaming = wants_ndjson() and not explain
         
-        # Get pipeline from request body
-        pipeline = request.json.get('pipeline', [])
-        
-        if not isinstance(pipeline, list):
+        # Validate against the policy and inject limits, time budget and disk use
+        try:
+            partitions = parse_parallel(body.get('parallel'))
+            if partitions and not streaming:
+                raise PipelineRejected("parallel aggregation requires Accept: application/x-ndjson")
+            with phase('parse'):
+                read_route = read_router.route('aggregate', {**overrides_from(request.args), **overrides_from(body)})
+                joined = {name for name, _ in lookup_requirements(pipeline)} if isinstance(pipeline, list) else set()
+                indexed_fields = {
+                    name: leading_index_fields(db_instance.get_collection(name).index_information())
+                    for name in joined
+                }
+                guarded, options, policy = apply_policy(
+                    pipeline, indexed_fields,
+                    limit=body.get('limit'),
+                    max_time_ms=body.get('max_time_ms'),
+                    allow_disk_use=body.get('allow_disk_use'),
+                    cap_output=not streaming
+                )
+        except ValueError as e:
             return jsonify({
                 "success": False,
-                "error": "Pipeline must be a list of aggregation stages"
+                "error": str(e),
+                "collection": collection_name
             }), 400
+        collection = db_instance.get_collection(collection_name, read_route)
+        
+        # The leading $match is the part of the pipeline an index can serve
+        if guarded and isinstance(guarded[0], dict) and '$match' in guarded[0]:
+            note_query(collection_name, guarded[0]['$match'])
+        
+        # Return the plan and what its query stage examined, without returning results
+        if explain:
+            plan = db_instance.db.command(
+                'explain',
+                {'aggregate': collection_name, 'pipeline': guarded, 'cursor': {}},
+                verbosity='executionStats',
+                **({'maxTimeMS': options['maxTimeMS']} if 'maxTimeMS' in options else {})
+            )
+            return jsonify({
+                "success": True,
+                "collection": collection_name,
+                "explain": summarize_explain(plan),
+                "policy": policy,
+                "plan": plan.get('queryPlanner', plan.get('stages'))
+            }), 200
+        
+        # Stream the results when the client asks for NDJSON
+        if streaming and partitions:
+            try:
+                documents = partitioned_scanner.aggregate(
+                    collection, guarded, partitions, bool(body.get('ordered')), **options)
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "error": str(e),
+                    "collection": collection_name
+                }), 400
+            return ndjson_response(documents)
+        if streaming:
+            return ndjson_response(collection.aggregate(guarded, **options))
         
         # Execute aggregation
-        results = list(collection.aggregate(pipeline))
-        results = db_instance.serialize_doc(results)
+        results = list(collection.aggregate(guarded, **options))
         
         return jsonify({
             "success": True,
             "data": results,
             "count": len(results),
             "collection": collection_name,
-            "pipeline": pipeline
+            "policy": policy
         }), 200
         
     except Exception as e:
@@ -461,6 +1395,17 @@ def not_found(error):
             "/query/<collection>",
             "/collection/<collection>/schema",
             "/collection/<collection>/aggregate",
+            "/collection/<collection>/search-index",
+            "/collection/<collection>/bulk",
+            "/export/<collection>",
+            "/views",
+            "/views/<view>",
+            "/views/<view>/refresh",
+            "/gemini/analyze",
+            "/gemini/analyze/<job_id>",
+            "/cache/stats",
+            "/metrics",
+            "/admin/index-advice",
             "/docs"
         ]
     }), 404
@@ -0,0 +1,597 @@
+# asgi.py
+"""
+Async serving mode.
+
+Run with:  uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+The hot, I/O-bound routes are served natively on the event loop with the
+async MongoDB driver; every other route falls through to the Flask app,
+which runs in a bounded thread pool.
+"""
+import asyncio
+import itertools
+import json
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import wraps
+
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+
+from app import (
+    NDJSON_MIMETYPE,
+    app as flask_app,
+    build_analysis_payload,
+    build_analysis_response,
+    build_query_response,
+    coalesce_key,
+    count_cache_key,
+    finish_request_metrics,
+    gemini_url,
+    lookup_cached_count,
+    open_query_cursor,
+    parse_parallel,
+    parse_query_params,
+    query_cache_key,
+    store_cached_count,
+    submit_analysis_job,
+    wants_async_job,
+)
+from aggregation_policy import (
+    PipelineRejected, apply_policy, leading_index_fields, lookup_requirements, summarize_explain
+)
+from cache import DATABASE_SCOPE, result_cache
+from coalesce import AsyncSingleFlight, single_flight
+from config import Config
+from database import AsyncMongoDB, db_instance
+from index_advisor import index_advisor
+from query_compiler import query_compiler
+from read_routing import overrides_from, read_router
+from llm_client import AsyncModelClient, ModelClientBusy, model_client
+from metrics import begin_request, current_request, end_request, metrics, note_query, phase
+from negotiation import (
+    binary_encodings_offered, body_tag, compress, compress_chunks_async, compressible, current_mimetype,
+    etag_matches, negotiate_encoding, negotiate_mimetype, prefers_ndjson, representation_tag, reset_mimetype,
+    use_mimetype, validators
+)
+from partitioned_scan import partitioned_scanner
+from serialization import BSON_MIMETYPE, JSON_MIMETYPE, MSGPACK_MIMETYPE, dumps, dumps_as
+from summarizer import summarize_collection_async
+
+async_db = AsyncMongoDB()
+llm_client = None
+# Shares per-key counters with the Flask routes' single-flight
+async_single_flight = AsyncSingleFlight(Config.COALESCE_WAIT_SECONDS, single_flight.key_stats)
+
+
+class FlaskJSONResponse(JSONResponse):
+    """JSON response encoded exactly like Flask's jsonify, or as the BSON / MessagePack negotiated for the request"""
+
+    def render(self, content):
+        stats = current_request()
+        if stats is not None and isinstance(content, dict) and isinstance(content.get('data'), list):
+            stats.add_documents(len(content['data']))
+        with phase('serialize'):
+            body, self.media_type = dumps_as(content, current_mimetype())
+            return body
+
+
+def instrumented(route):
+    """Record request metrics for a native route under its Flask route pattern"""
+    def decorator(handler):
+        if not Config.METRICS_ENABLED:
+            return handler
+
+        @wraps(handler)
+        async def wrapper(request):
+            stats = begin_request(request.method, request.url.path)
+            stats.route = route
+            stats.collection = request.path_params.get('collection_name')
+            try:
+                response = await handler(request)
+            except BaseException:
+                stats.status = 500
+                finish(stats)
+                raise
+            stats.status = response.status_code
+            stats.responded()
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = metered_body(response.body_iterator, stats)
+            else:
+                stats.bytes_sent = len(response.body)
+                finish(stats)
+            return response
+        return wrapper
+    return decorator
+
+
+async def metered_body(chunks, stats):
+    """Count streamed bytes and finish the request once the stream ends"""
+    try:
+        async for chunk in chunks:
+            stats.bytes_sent += len(chunk)
+            yield chunk
+    finally:
+        finish(stats)
+
+
+def finish(stats):
+    stats.finish()
+    end_request()
+    finish_request_metrics(stats)
+
+
+def negotiated(endpoint=None):
+    """Encode, tag and compress a native route's responses like the Flask app's after_request.
+
+    With an endpoint, If-None-Match is also answered before the handler runs
+    while the collection is unchanged (see app.revalidate).
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def wrapper(request):
+            mimetype = negotiate_mimetype(request.headers.get('accept'))
+            encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+            validator = None
+            ttl = result_cache.ttls.get(endpoint) if endpoint and result_cache.enabled else 0
+            if Config.ETAG_ENABLED and ttl and 'no-cache' not in request.headers.get('cache-control', ''):
+                scope = request.path_params.get('collection_name', DATABASE_SCOPE)
+                key = coalesce_key(request.url.path, request.query_params.multi_items(), True, mimetype)
+                key += f" {encoding or 'identity'}"
+                tag = validators.lookup(key)
+                if tag is not None and etag_matches(request.headers.get('if-none-match'), tag):
+                    validators.count('not_modified_early')
+                    placeholder = Response(media_type=mimetype)
+                    add_vary(placeholder)
+                    return not_modified(tag, placeholder)
+                validator = (key, scope, validators.marker(scope), ttl)
+
+            token = use_mimetype(mimetype)
+            try:
+                response = await handler(request)
+            finally:
+                reset_mimetype(token)
+            return encode_response(request, response, encoding, validator)
+        return wrapper
+    return decorator
+
+
+def add_vary(response):
+    """Vary on the request headers that select the representation; returns whether it may be compressed"""
+    if binary_encodings_offered() and response.media_type in (JSON_MIMETYPE, BSON_MIMETYPE, MSGPACK_MIMETYPE):
+        response.headers.add_vary_header('Accept')
+    if 'content-encoding' in response.headers or not compressible(response.media_type):
+        return False
+    response.headers.add_vary_header('Accept-Encoding')
+    return True
+
+
+def encode_response(request, response, encoding, validator):
+    """ETag, 304 and compression for a native route's response"""
+    if not add_vary(response):
+        encoding = None
+
+    if isinstance(response, StreamingResponse):
+        if encoding:
+            response.body_iterator = compress_chunks_async(response.body_iterator, encoding)
+            response.headers['content-encoding'] = encoding
+        return response
+
+    body = response.body
+    if len(body) < Config.COMPRESSION_MIN_BYTES:
+        encoding = None
+    if Config.ETAG_ENABLED and request.method in ('GET', 'HEAD') and response.status_code == 200:
+        tag = representation_tag(body_tag(body), encoding)
+        response.headers['etag'] = f'"{tag}"'
+        if validator is not None:
+            key, scope, marker, ttl = validator
+            validators.remember(key, scope, marker, tag, ttl)
+        if etag_matches(request.headers.get('if-none-match'), tag):
+            validators.count('not_modified')
+            return not_modified(tag, response)
+        validators.count('tagged')
+    if encoding:
+        response.body = compress(body, encoding)
+        response.headers['content-length'] = str(len(response.body))
+        response.headers['content-encoding'] = encoding
+    return response
+
+
+def not_modified(tag, response):
+    """304 for a representation, keeping the headers caches need to match it"""
+    headers = {'etag': f'"{tag}"'}
+    vary = response.headers.get('vary')
+    if vary:
+        headers['vary'] = vary
+    return Response(status_code=304, headers=headers)
+
+
+def limit_concurrency(limit):
+    """Cap in-flight requests for a route; queued requests give up with a 503"""
+    def decorator(handler):
+        semaphore = asyncio.Semaphore(limit)
+
+        @wraps(handler)
+        async def wrapper(request):
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=Config.ASYNC_QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                return FlaskJSONResponse({
+                    "success": False,
+                    "error": "Server busy, try again later"
+                }, status_code=503)
+            try:
+                return await handler(request)
+            finally:
+                semaphore.release()
+        return wrapper
+    return decorator
+
+
+def coalesce_identical(handler):
+    """Serve identical concurrent requests from one execution, sharing its serialized response"""
+    if not Config.COALESCE_ENABLED:
+        return handler
+
+    @wraps(handler)
+    async def wrapper(request):
+        use_cache = 'no-cache' not in request.headers.get('cache-control', '')
+        key = coalesce_key(request.url.path, request.query_params.multi_items(), use_cache, current_mimetype())
+
+        async def work():
+            response = await handler(request)
+            return response.body, response.status_code, response.media_type
+
+        (body, status, media_type), role = await async_single_flight.do(key, work)
+        stats = current_request()
+        if stats is not None:
+            metrics.coalesced.inc(stats.route, role)
+        return Response(body, status_code=status, media_type=media_type)
+    return wrapper
+
+
+async def count_matching_async(collection, filter_dict, count_mode):
+    """Async counterpart of app.count_matching"""
+    if count_mode == 'none':
+        return None
+    if count_mode == 'estimated':
+        if not filter_dict:
+            return await collection.estimated_document_count()
+        key = count_cache_key(collection, filter_dict)
+        count = lookup_cached_count(key)
+        if count is None:
+            count = await collection.count_documents(filter_dict)
+            store_cached_count(key, count)
+        return count
+    return await collection.count_documents(filter_dict)
+
+
+@instrumented('/health')
+@negotiated()
+@limit_concurrency(Config.ASYNC_ROUTE_CONCURRENCY)
+async def health_check(request):
+    """Health check endpoint with detailed database info"""
+    try:
+        if await async_db.test_connection():
+            stats = await async_db.db.command("dbStats")
+            collections = await async_db.db.list_collection_names()
+
+            return FlaskJSONResponse({
+                "status": "healthy",
+                "database": "connected",
+                "database_name": Config.DATABASE_NAME,
+                "collections_count": len(collections),
+                "database_size_mb": round(stats.get('dataSize', 0) / (1024 * 1024), 2),
+                "connection_pool": async_db.pool_stats.snapshot(),
+                "read_routing": read_router.describe(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "serving_mode": "asgi"
+            }, status_code=200)
+        return FlaskJSONResponse({
+            "status": "unhealthy",
+            "database": "disconnected",
+            "connection_pool": async_db.pool_stats.snapshot()
+        }, status_code=500)
+    except Exception as e:
+        return FlaskJSONResponse({"status": "unhealthy", "error": str(e)}, status_code=500)
+
+
+@instrumented('/query/<collection_name>')
+@negotiated('query')
+@coalesce_identical
+@limit_concurrency(Config.ASYNC_ROUTE_CONCURRENCY)
+async def query_collection(request):
+    """Query any collection with advanced filtering, pagination, and sorting"""
+    collection_name = request.path_params['collection_name']
+    try:
+        try:
+            args = MultiDict(request.query_params.multi_items())
+            read_route = read_router.route('query', overrides_from(args))
+            if args.get('search') or not query_compiler.hints_fresh(collection_name):
+                # Search planning and type hints may read index/profile metadata with the sync driver
+                with phase('parse'):
+                    spec = await asyncio.to_thread(parse_query_params, args, collection_name)
+            else:
+                with phase('parse'):
+                    spec = parse_query_params(args, collection_name)
+        except ValueError as e:
+            return FlaskJSONResponse({
+                "success": False,
+                "error": str(e),
+                "collection": collection_name
+            }, status_code=400)
+        collection = async_db.get_collection(collection_name, read_route)
+
+        note_query(collection_name, spec["page_filter"], spec["fetch_sort"])
+
+        cache_key = query_cache_key(collection_name, spec, read_route)
+        use_cache = 'no-cache' not in request.headers.get('cache-control', '')
+        if use_cache:
+            cached = result_cache.get('query', cache_key)
+            if cached is not None:
+                return FlaskJSONResponse(cached, status_code=200)
+
+        warning = None
+        if Config.INDEX_ADVISOR_ENABLED and Config.QUERY_UNINDEXED_ACTION in ('warn', 'reject'):
+            # Plan sampling uses the sync driver, so keep it off the event loop
+            warning = await asyncio.to_thread(index_advisor.check, collection_name, spec["filter"], spec["fetch_sort"])
+            if warning and Config.QUERY_UNINDEXED_ACTION == 'reject':
+                return FlaskJSONResponse({
+                    "success": False,
+                    "error": warning,
+                    "collection": collection_name
+                }, status_code=400)
+
+        started = time.perf_counter()
+        results = await open_query_cursor(collection, spec).to_list(None)
+        total_count = await count_matching_async(collection, spec["filter"], spec["count_mode"])
+
+        if Config.INDEX_ADVISOR_ENABLED:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            index_advisor.record(collection_name, spec["filter"], spec["fetch_sort"], elapsed_ms, len(results))
+
+        response = build_query_response(collection_name, spec, results, total_count)
+        if warning:
+            response["warnings"] = [warning]
+        if use_cache:
+            result_cache.set('query', cache_key, response)
+        return FlaskJSONResponse(response, status_code=200)
+
+    except Exception as e:
+        return FlaskJSONResponse({
+            "success": False,
+            "error": str(e),
+            "collection": collection_name
+        }, status_code=500)
+
+
+@instrumented('/collection/<collection_name>/aggregate')
+@negotiated()
+@limit_concurrency(Config.ASYNC_ROUTE_CONCURRENCY)
+async def aggregate_collection(request):
+    """Execute aggregation pipeline on collection"""
+    collection_name = request.path_params['collection_name']
+    try:
+        body = await request.json() or {}
+        pipeline = body.get('pipeline', [])
+        explain = str(body.get('explain', request.query_params.get('explain', ''))).lower() == 'true'
+        streaming = prefers_ndjson(request.headers.get('accept')) and not explain
+
+        try:
+            partitions = parse_parallel(body.get('parallel'))
+            if partitions and not streaming:
+                raise PipelineRejected("parallel aggregation requires Accept: application/x-ndjson")
+            read_route = read_router.route('aggregate', {**overrides_from(request.query_params), **overrides_from(body)})
+            joined = {name for name, _ in lookup_requirements(pipeline)} if isinstance(pipeline, list) else set()
+            indexed_fields = {
+                name: leading_index_fields(await async_db.get_collection(name).index_information())
+                for name in joined
+            }
+            guarded, options, policy = apply_policy(
+                pipeline, indexed_fields,
+                limit=body.get('limit'),
+                max_time_ms=body.get('max_time_ms'),
+                allow_disk_use=body.get('allow_disk_use'),
+                cap_output=not streaming
+            )
+        except ValueError as e:
+            return FlaskJSONResponse({
+                "success": False,
+                "error": str(e),
+                "collection": collection_name
+            }, status_code=400)
+        collection = async_db.get_collection(collection_name, read_route)
+
+        # The leading $match is the part of the pipeline an index can serve
+        if guarded and isinstance(guarded[0], dict) and '$match' in guarded[0]:
+            note_query(collection_name, guarded[0]['$match'])
+
+        if explain:
+            plan = await async_db.db.command(
+                'explain',
+                {'aggregate': collection_name, 'pipeline': guarded, 'cursor': {}},
+                verbosity='executionStats',
+                **({'maxTimeMS': options['maxTimeMS']} if 'maxTimeMS' in options else {})
+            )
+            return FlaskJSONResponse({
+                "success": True,
+                "collection": collection_name,
+                "explain": summarize_explain(plan),
+                "policy": policy,
+                "plan": plan.get('queryPlanner', plan.get('stages'))
+            }, status_code=200)
+
+        # Partitioned scans run on the sync driver's worker pool; documents are pulled in batches
+        if streaming and partitions:
+            try:
+                documents = await asyncio.to_thread(
+                    partitioned_scanner.aggregate, db_instance.get_collection(collection_name, read_route),
+                    guarded, partitions, bool(body.get('ordered')), **options)
+            except ValueError as e:
+                return FlaskJSONResponse({
+                    "success": False,
+                    "error": str(e),
+                    "collection": collection_name
+                }, status_code=400)
+            return blocking_ndjson_response(documents)
+
+        cursor = await collection.aggregate(guarded, **options)
+
+        # Stream the results when the client asks for NDJSON
+        if streaming:
+            return ndjson_response(cursor)
+
+        results = await cursor.to_list(None)
+
+        return FlaskJSONResponse({
+            "success": True,
+            "data": results,
+            "count": len(results),
+            "collection": collection_name,
+            "policy": policy
+        }, status_code=200)
+
+    except Exception as e:
+        return FlaskJSONResponse({
+            "success": False,
+            "error": str(e),
+            "collection": collection_name
+        }, status_code=500)
+
+
+@instrumented('/gemini/analyze')
+@negotiated()
+@limit_concurrency(Config.ASYNC_GEMINI_CONCURRENCY)
+async def analyze_data_with_gemini(request):
+    """Analyze a collection with Gemini without holding a thread during the outbound call"""
+    try:
+        body = await request.json() or {}
+        collection_name = body.get('collection_name')
+        analysis_goals = body.get('analysis_goals', "Find trends, patterns, or anomalies.")
+
+        if not collection_name:
+            return FlaskJSONResponse({"error": "Collection name is required"}, status_code=400)
+
+        # Long analyses can run in the background and be polled by job id
+        if wants_async_job(body, request.query_params):
+            return FlaskJSONResponse(submit_analysis_job(collection_name, analysis_goals), status_code=202)
+
+        # Summarize the collection from metadata, samples and server-side stats
+        collection = async_db.get_collection(collection_name, read_router.route('analyze'))
+        cache_key = result_cache.make_key('summary', collection_name)
+        summary = result_cache.get('summary', cache_key)
+        summary_cached = summary is not None
+        if summary is None:
+            summary = await summarize_collection_async(collection)
+            if summary is not None:
+                result_cache.set('summary', cache_key, summary)
+
+        if not summary:
+            return FlaskJSONResponse({"error": "No data found in the specified collection"}, status_code=404)
+
+        payload = build_analysis_payload(summary, analysis_goals)
+        analysis, analysis_cached = await llm_client.generate(gemini_url(), Config.GEMINI_MODEL, payload)
+
+        return FlaskJSONResponse(
+            build_analysis_response(collection_name, summary, summary_cached, analysis, analysis_cached),
+            status_code=200
+        )
+
+    except ModelClientBusy as e:
+        return FlaskJSONResponse({"error": str(e)}, status_code=503)
+    except httpx.HTTPError as e:
+        return FlaskJSONResponse({"error": f"Gemini API Error: {str(e)}"}, status_code=500)
+    except Exception as e:
+        return FlaskJSONResponse({"error": str(e)}, status_code=500)
+
+
+def ndjson_response(cursor):
+    """Stream an async cursor as NDJSON, serializing one document at a time"""
+    async def generate():
+        stats = current_request()
+        encoding = 0.0
+        count = 0
+        try:
+            async for doc in cursor:
+                started = time.perf_counter()
+                line = dumps(doc) + '\n'
+                encoding += time.perf_counter() - started
+                count += 1
+                yield line
+        except Exception as e:
+            # Headers are already sent, so report the failure as a final line
+            yield json.dumps({"success": False, "error": str(e)}) + '\n'
+        finally:
+            await cursor.close()
+            if stats is not None:
+                stats.add('serialize', encoding)
+                stats.add_documents(count)
+
+    return StreamingResponse(generate(), media_type=NDJSON_MIMETYPE)
+
+
+def blocking_ndjson_response(documents):
+    """Stream a blocking document iterator (a partitioned scan) as NDJSON.
+
+    Documents are taken off the iterator a batch at a time in a worker
+    thread, so the event loop never waits on it and each batch costs one
+    thread hop instead of one per line.
+    """
+    async def generate():
+        stats = current_request()
+        encoding = 0.0
+        count = 0
+        iterator = iter(documents)
+        try:
+            while True:
+                batch = await asyncio.to_thread(list, itertools.islice(iterator, Config.EXPORT_BATCH_SIZE))
+                if not batch:
+                    break
+                started = time.perf_counter()
+                lines = ''.join(dumps(doc) + '\n' for doc in batch)
+                encoding += time.perf_counter() - started
+                count += len(batch)
+                yield lines
+        except Exception as e:
+            # Headers are already sent, so report the failure as a final line
+            yield json.dumps({"success": False, "error": str(e)}) + '\n'
+        finally:
+            await asyncio.to_thread(documents.close)
+            if stats is not None:
+                stats.add('serialize', encoding)
+                stats.add_documents(count)
+
+    return StreamingResponse(generate(), media_type=NDJSON_MIMETYPE)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global llm_client
+    # One pooled outbound client per process; responses share the Flask client's cache
+    llm_client = AsyncModelClient(model_client.cache)
+    try:
+        yield
+    finally:
+        await llm_client.close()
+        await async_db.close_connection()
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/query/{collection_name}', query_collection, methods=['GET']),
+        Route('/collection/{collection_name}/aggregate', aggregate_collection, methods=['POST']),
+        Route('/gemini/analyze', analyze_data_with_gemini, methods=['POST']),
+        # Everything else is served by the Flask app in a thread pool
+        Mount('/', app=WSGIMiddleware(flask_app, workers=Config.ASYNC_WSGI_WORKERS)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,108 @@
+"""
+Hot-path microbenchmarks with saved baselines: parse_value, filter building
+(build_filter_from_params, now the typed query compiler) and
+MongoDB.serialize_doc next to the single-pass encoder.
+
+Usage:  python benchmarks/bench_micro.py [--rounds 20000] [--docs 500] [--repeat 5]
+        python benchmarks/bench_micro.py --save-baseline      # benchmarks/baselines/micro.json
+        python benchmarks/bench_micro.py --compare [--tolerance 0.15]
+
+No MongoDB server is needed. Each result is the best of --repeat runs, so
+background noise inflates it less; --compare exits 1 when a benchmark lost
+more than the tolerance against the baseline.
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+from urllib.parse import parse_qsl
+
+# bench_query_parser sets up the environment and sys.path for the app modules
+from bench_query_parser import FIELD_TYPES, QUERY_STRINGS, StaticHints
+from bench_serializer import nested_document, wide_document
+import harness
+
+from werkzeug.datastructures import MultiDict
+
+import query_compiler
+import serialization
+from database import MongoDB
+from query_compiler import QueryCompiler, compile_filter_params, parse_value
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'micro.json')
+
+# Raw values as they arrive from query strings, one of each type parse_value recognises
+VALUES = ["573a1390f29313caabcd4135", "1994", "-12", "7.5", "true", "2012-03-01T00:00:00Z",
+          "Drama", "PG-13", "02134", "Ned Stark"]
+
+
+def best_of(fn, items, rounds, repeat):
+    """Operations per second over rounds calls, best of repeat"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(rounds):
+            fn(items[i % len(items)])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return rounds / best
+
+
+def best_of_batch(fn, docs, repeat, mutates=False):
+    """Documents per second for fn over the whole batch, best of repeat"""
+    best = None
+    for _ in range(repeat):
+        # serialize_doc converts in place, so it gets a fresh copy outside the timed part
+        batch = copy.deepcopy(docs) if mutates else docs
+        start = time.perf_counter()
+        fn(batch)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(docs) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20000)
+    parser.add_argument('--docs', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    harness.add_baseline_arguments(parser, DEFAULT_BASELINE)
+    args = parser.parse_args()
+
+    requests = [MultiDict(parse_qsl(query)) for query in QUERY_STRINGS]
+    query_compiler.Config.QUERY_TYPE_HINTS = True
+    compiler = QueryCompiler(StaticHints(), cache_size=1024, hints_ttl=3600)
+
+    def compile_cold(request_args):
+        params = tuple(sorted((k, v) for k, v in request_args.items() if k not in query_compiler.RESERVED_PARAMS))
+        return compile_filter_params(params, FIELD_TYPES)
+
+    wide = [wide_document(i) for i in range(args.docs)]
+    nested = [nested_document(i) for i in range(max(args.docs // 10, 1))]
+
+    benchmarks = [
+        ("parse_value", lambda: best_of(parse_value, VALUES, args.rounds, args.repeat)),
+        ("build_filter.cold", lambda: best_of(compile_cold, requests, args.rounds, args.repeat)),
+        ("build_filter.memoized", lambda: best_of(lambda a: compiler.compile("movies", a),
+                                                  requests, args.rounds, args.repeat)),
+        ("serialize_doc.wide", lambda: best_of_batch(MongoDB.serialize_doc, wide, args.repeat, mutates=True)),
+        ("serialize_doc.nested", lambda: best_of_batch(MongoDB.serialize_doc, nested, args.repeat, mutates=True)),
+        ("dumps_bytes.wide", lambda: best_of_batch(serialization.dumps_bytes, wide, args.repeat)),
+        ("dumps_bytes.nested", lambda: best_of_batch(serialization.dumps_bytes, nested, args.repeat)),
+    ]
+
+    print(f"\n{'benchmark':<24} {'ops/s':>14}  {'us/op':>8}")
+    results = {}
+    for name, run in benchmarks:
+        rate = run()
+        results[name] = {"ops_per_sec": round(rate, 1)}
+        print(f"{name:<24} {rate:>14,.0f}  {1e6 / rate:>8.2f}")
+
+    settings = {"rounds": args.rounds, "docs": args.docs, "repeat": args.repeat,
+                "orjson": serialization.orjson is not None}
+    sys.exit(harness.handle_baseline(args, results, settings))
+
+
+if __name__ == '__main__':
+    main()
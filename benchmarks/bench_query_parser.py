@@ -0,0 +1,151 @@
+"""
+Query-parser microbenchmark: /query filter strings per second for the
+legacy build_filter_from_params + parse_value path versus the typed
+compiler, cold (compiled every time) and memoized.
+
+Usage:  python benchmarks/bench_query_parser.py [--rounds 20000] [--repeat 5]
+
+No MongoDB server is needed; type hints are supplied in memory.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+# Config reads these at import time; benchmarks do not need a live server
+os.environ.setdefault('FLASK_DEBUG', 'false')
+os.environ.setdefault('FLASK_PORT', '5000')
+os.environ.setdefault('MONGO_SERVER_SELECTION_TIMEOUT_MS', '200')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from werkzeug.datastructures import MultiDict
+
+import query_compiler
+from query_compiler import QueryCompiler, compile_filter_params
+
+# Realistic /query strings, including pagination and sort noise
+QUERY_STRINGS = [
+    "year__gte=1990&year__lte=2000&genres__in=Drama,Comedy&limit=20&sort=-year",
+    "title__regex=star&rated=PG-13&imdb.rating__gt=7.5&fields=title,year",
+    "_id=573a1390f29313caabcd4135",
+    "released__gte=2001-01-01T00:00:00Z&released__lt=2002-01-01&type=movie&skip=40",
+    "num_mflix_comments__gte=5&countries__nin=USA,UK,France&awards.wins__gt=2&count=estimated",
+    "zip=02134&active=true&email__exists=true&sort=name",
+    "runtime__gt=90&runtime__lt=180&lastupdated__exists=true&paginate=keyset",
+    "name=Ned%20Stark&movie_id=573a1390f29313caabcd4323&date__gte=2012-03-01",
+]
+
+FIELD_TYPES = {
+    "year": ["int"], "genres": ["str"], "title": ["str"], "rated": ["str"],
+    "imdb.rating": ["float", "int"], "_id": ["ObjectId"], "released": ["datetime"],
+    "type": ["str"], "num_mflix_comments": ["int"], "countries": ["str"],
+    "awards.wins": ["int"], "zip": ["str"], "active": ["bool"], "email": ["str"],
+    "runtime": ["int"], "lastupdated": ["str"], "name": ["str"], "movie_id": ["ObjectId"],
+    "date": ["datetime"],
+}
+
+
+def legacy_parse_value(value):
+    if not isinstance(value, str):
+        return value
+    if len(value) == 24 and re.match(r'^[0-9a-fA-F]{24}$', value):
+        try:
+            return ObjectId(value)
+        except:
+            pass
+    if value.isdigit() or (value.startswith('-') and value[1:].isdigit()):
+        return int(value)
+    try:
+        if '.' in value:
+            return float(value)
+    except ValueError:
+        pass
+    if value.lower() in ['true', 'false']:
+        return value.lower() == 'true'
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        pass
+    return value
+
+
+def legacy_build_filter(args):
+    """The pre-compiler build_filter_from_params (operators on one field overwrite each other)"""
+    filter_dict = {}
+    excluded_params = ['limit', 'skip', 'sort', 'fields', 'search', 'after', 'before', 'paginate', 'count']
+    for key, value in args.items():
+        if key not in excluded_params:
+            if '__' in key:
+                field, operator = key.split('__', 1)
+                parsed_value = legacy_parse_value(value)
+                if operator in ('gte', 'lte', 'gt', 'lt', 'ne'):
+                    filter_dict[field] = {f'${operator}': parsed_value}
+                elif operator in ('in', 'nin'):
+                    filter_dict[field] = {f'${operator}': [legacy_parse_value(v.strip()) for v in value.split(',')]}
+                elif operator == 'regex':
+                    filter_dict[field] = {'$regex': value, '$options': 'i'}
+                elif operator == 'exists':
+                    filter_dict[field] = {'$exists': value.lower() == 'true'}
+                else:
+                    filter_dict[key] = legacy_parse_value(value)
+            else:
+                filter_dict[key] = legacy_parse_value(value)
+    return filter_dict
+
+
+class StaticHints:
+    """Stands in for the schema profiler"""
+
+    def field_types(self, collection_name):
+        return FIELD_TYPES
+
+
+def run(label, fn, requests, rounds, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(rounds):
+            fn(requests[i % len(requests)])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rate = rounds / best
+    print(f"  {label:<38} {rate:>12,.0f} queries/s  ({best * 1e6 / rounds:.2f} us/query)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    requests = [MultiDict(parse_qsl(query)) for query in QUERY_STRINGS]
+    query_compiler.Config.QUERY_TYPE_HINTS = True
+    compiler = QueryCompiler(StaticHints(), cache_size=1024, hints_ttl=3600)
+
+    def compile_cold(request_args):
+        params = tuple(sorted((k, v) for k, v in request_args.items() if k not in query_compiler.RESERVED_PARAMS))
+        return compile_filter_params(params, FIELD_TYPES)
+
+    print(f"\n{len(QUERY_STRINGS)} query strings, {args.rounds} parses per run")
+    legacy_rate = run("parse_value per request (before)", legacy_build_filter, requests, args.rounds, args.repeat)
+    run("typed compiler, no memoization", compile_cold, requests, args.rounds, args.repeat)
+    memo_rate = run("typed compiler, memoized", lambda a: compiler.compile("movies", a),
+                    requests, args.rounds, args.repeat)
+    print(f"  speedup (memoized): {memo_rate / legacy_rate:.1f}x")
+
+    # Show where the two parsers disagree
+    print("\nDifferences (legacy -> compiled):")
+    for query, request_args in zip(QUERY_STRINGS, requests):
+        legacy = legacy_build_filter(request_args)
+        compiled = compiler.compile("movies", request_args)
+        if legacy != compiled:
+            print(f"  {query}\n    {legacy}\n    {compiled}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Serializer microbenchmark: documents per second for the legacy
+MongoDB.serialize_doc + jsonify path versus the single-pass BSON encoder.
+
+Usage:  python benchmarks/bench_serializer.py [--docs 2000] [--repeat 5]
+
+No MongoDB server is needed; documents are generated in memory.
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Config reads these at import time; benchmarks do not need a live server
+os.environ.setdefault('FLASK_DEBUG', 'false')
+os.environ.setdefault('FLASK_PORT', '5000')
+os.environ.setdefault('MONGO_SERVER_SELECTION_TIMEOUT_MS', '200')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import Binary, Decimal128, ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from database import MongoDB
+import serialization
+
+
+def wide_document(i, width=200):
+    """Flat document with many mixed-type fields"""
+    doc = {"_id": ObjectId(), "seq": i}
+    for f in range(width):
+        kind = f % 6
+        if kind == 0:
+            doc[f"s{f}"] = f"value-{i}-{f}"
+        elif kind == 1:
+            doc[f"n{f}"] = i * f
+        elif kind == 2:
+            doc[f"x{f}"] = i / (f + 1)
+        elif kind == 3:
+            doc[f"o{f}"] = ObjectId()
+        elif kind == 4:
+            doc[f"d{f}"] = datetime(2024, 1, 1) + timedelta(seconds=i + f)
+        else:
+            doc[f"b{f}"] = bool((i + f) % 2)
+    return doc
+
+
+def nested_document(i, depth=8, fanout=3):
+    """Deeply nested document mixing subdocuments and arrays"""
+    def level(d):
+        node = {"id": ObjectId(), "name": f"node-{i}-{d}", "amount": Decimal128(f"{i}.{d}"),
+                "blob": Binary(b"\x00\x01\x02\x03")}
+        if d < depth:
+            node["children"] = [level(d + 1) for _ in range(fanout if d < 3 else 1)]
+            node["child"] = {"level": d, "ref": ObjectId()}
+        return node
+    return {"_id": ObjectId(), "root": level(0)}
+
+
+def legacy_default(value):
+    # Flask's encoder has no Decimal128/Binary support; str() them so the
+    # legacy path can be timed at all (in the app those raised a 500)
+    try:
+        return DefaultJSONProvider.default(value)
+    except TypeError:
+        return str(value)
+
+
+def make_legacy_encoder(app):
+    provider = DefaultJSONProvider(app)
+
+    def encode(docs):
+        # serialize_doc mutates in place, so each run works on a fresh copy
+        return provider.dumps(MongoDB.serialize_doc(docs), default=legacy_default,
+                              separators=(',', ':')).encode('utf-8')
+    return encode
+
+
+def run(label, fn, docs, repeat):
+    best = None
+    for _ in range(repeat):
+        batch = copy.deepcopy(docs)
+        start = time.perf_counter()
+        fn(batch)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    rate = len(docs) / best
+    print(f"  {label:<34} {rate:>12,.0f} docs/s  ({best * 1000:.1f} ms)")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--docs', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    legacy_encode = make_legacy_encoder(Flask(__name__))
+    orjson_module = serialization.orjson
+
+    shapes = {
+        "wide (200 fields)": [wide_document(i) for i in range(args.docs)],
+        "nested (depth 8)": [nested_document(i) for i in range(max(args.docs // 10, 1))],
+    }
+    for shape, docs in shapes.items():
+        print(f"\n{shape}: {len(docs)} documents")
+        legacy_rate = run("serialize_doc + jsonify (before)", legacy_encode, docs, args.repeat)
+        serialization.orjson = None
+        stdlib_rate = run("single-pass encoder (stdlib json)", serialization.dumps_bytes, docs, args.repeat)
+        serialization.orjson = orjson_module
+        if orjson_module is not None:
+            fast_rate = run("single-pass encoder (orjson)", serialization.dumps_bytes, docs, args.repeat)
+        else:
+            fast_rate = stdlib_rate
+            print("  (install orjson to benchmark the fast backend)")
+        print(f"  speedup: {fast_rate / legacy_rate:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Shared helpers for the benchmark scripts: latency percentiles, peak RSS
+sampling and saved baselines.
+
+A baseline is a JSON file holding one result per benchmark name plus the
+settings and environment it was measured with. compare() reports every
+metric that moved past the tolerance in the wrong direction; the scripts
+exit non-zero on regressions so they can gate CI.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+from datetime import datetime, timezone
+
+# Metrics where a higher value is better; everything else compared is a latency or size
+HIGHER_IS_BETTER = {'rps', 'ops_per_sec'}
+
+# Metrics compared against a baseline
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'ops_per_sec', 'peak_rss_mb')
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize_latencies(latencies, wall_seconds, errors=0):
+    """p50/p95/p99 in milliseconds and requests per second for one phase"""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 50) * 1000, 3) if values else None,
+        "p95_ms": round(percentile(values, 95) * 1000, 3) if values else None,
+        "p99_ms": round(percentile(values, 99) * 1000, 3) if values else None,
+        "max_ms": round(values[-1] * 1000, 3) if values else None,
+        "rps": round(len(values) / wall_seconds, 1) if wall_seconds > 0 else None
+    }
+
+
+def _rss_bytes(pid):
+    """Current resident set size of a process, or None where it cannot be read"""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+class RssSampler:
+    """Samples a process's RSS on a background thread and keeps the peak"""
+
+    def __init__(self, pid=None, interval=0.01):
+        self.pid = pid or os.getpid()
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = _rss_bytes(self.pid)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = _rss_bytes(self.pid)
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    @property
+    def peak_mb(self):
+        return round(self.peak / (1024 * 1024), 1) if self.peak is not None else None
+
+
+def environment():
+    """Where a result was measured; baselines are only comparable on similar machines"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit or None,
+        "measured_at": datetime.now(timezone.utc).isoformat(timespec='seconds')
+    }
+
+
+def save_baseline(path, results, settings):
+    """Write results to a baseline file, creating its directory"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as baseline:
+        json.dump({"settings": settings, "environment": environment(), "results": results},
+                  baseline, indent=2, sort_keys=True)
+        baseline.write('\n')
+    print(f"\n💾 Baseline saved to {path}")
+
+
+def compare(path, results, settings, tolerance):
+    """Print metrics that regressed beyond tolerance (a fraction) against a baseline; returns the regressions"""
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("settings") != settings:
+        print(f"⚠️  Baseline {path} was measured with different settings:\n"
+              f"   baseline {baseline.get('settings')}\n   current  {settings}")
+
+    regressions = []
+    print(f"\nCompared with {path} (tolerance {tolerance:.0%}):")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"  {name:<28} new, no baseline")
+            continue
+        changes = []
+        for metric in COMPARED_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change < -tolerance if metric in HIGHER_IS_BETTER else change > tolerance
+            changes.append(f"{metric} {change:+.0%}{' ❌' if worse else ''}")
+            if worse:
+                regressions.append((name, metric, old, new))
+        print(f"  {name:<28} {', '.join(changes)}")
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {tolerance:.0%}")
+    else:
+        print("\n✅ No regressions")
+    return regressions
+
+
+def add_baseline_arguments(parser, default_path):
+    parser.add_argument('--save-baseline', nargs='?', const=default_path, metavar='PATH',
+                        help=f"save the results as a baseline (default {default_path})")
+    parser.add_argument('--compare', nargs='?', const=default_path, metavar='PATH',
+                        help="compare with a saved baseline and exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="allowed relative change before a metric counts as a regression (default 0.15)")
+
+
+def handle_baseline(args, results, settings):
+    """Save and/or compare as requested on the command line; returns the process exit code"""
+    status = 0
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"\n⚠️  No baseline at {args.compare}; run with --save-baseline first")
+        elif compare(args.compare, results, settings, args.tolerance):
+            status = 1
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results, settings)
+    return status
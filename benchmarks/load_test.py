@@ -0,0 +1,356 @@
+"""
+API load test: seeds a collection, replays realistic request mixes against
+/query (filters, deep skip, regex search, sort), /collections, /schema and
+/aggregate, and reports p50/p95/p99 latency, requests per second and peak
+RSS per endpoint.
+
+Usage:
+  python benchmarks/load_test.py --in-memory                  # mongomock stand-in, app in-process
+  python benchmarks/load_test.py --docs 100000 --shape nested # seeds MONGODB_URI, app in-process
+  python benchmarks/load_test.py --url http://127.0.0.1:5000 --server-pid 4242
+  python benchmarks/load_test.py --save-baseline              # benchmarks/baselines/load_test.json
+  python benchmarks/load_test.py --compare [--tolerance 0.15]
+
+Every endpoint first runs on its own, so its latency and RSS are not mixed
+with the others', then the weighted mix runs. Requests are drawn from a
+seeded generator, so the same --seed replays the same requests. They send
+Cache-Control: no-cache unless --cache is given, so the numbers measure the
+query path rather than the result cache.
+
+The default database is mongodb://localhost:27017/api_load_test; the seed
+collection is dropped and rebuilt unless --skip-seed is given. --in-memory
+needs mongomock and times the app against an in-process fake, which is
+useful for the app's own overhead (parsing, encoding, middleware) but not
+for MongoDB's. Peak RSS is that of this process when the app runs
+in-process, or of --server-pid against a separate server.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import harness
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'load_test.json')
+
+CITIES = ["Lisbon", "Porto", "Madrid", "Berlin", "Paris", "Oslo", "Austin", "Denver", "Osaka", "Lima",
+          "Nairobi", "Quito", "Perth", "Dublin", "Seoul", "Toronto"]
+TAGS = ["new", "vip", "trial", "churned", "beta", "partner", "internal", "mobile", "web", "api"]
+SKUS = [f"SKU-{n:04d}" for n in range(200)]
+SYLLABLES = ["an", "bel", "cor", "dan", "el", "fi", "gar", "hol", "is", "jo", "ka", "lin", "mar",
+             "no", "or", "pet", "ro", "sa", "tor", "vi"]
+
+ENDPOINTS = ('query_filter', 'query_sort', 'query_deep_skip', 'query_regex_search',
+             'collections', 'schema', 'aggregate')
+
+# Share of each endpoint in the mixed phase; read-heavy, like the API's usual traffic
+DEFAULT_MIX = "query_filter=30,query_sort=20,query_deep_skip=10,query_regex_search=10,collections=10,schema=10,aggregate=10"
+
+
+def make_name(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def make_document(i, rng, shape):
+    """One seed document; wide adds many scalar fields, nested adds subdocuments and arrays"""
+    name = f"{make_name(rng)} {make_name(rng)}"
+    doc = {
+        "seq": i,
+        "name": name,
+        "email": f"{name.replace(' ', '.').lower()}{i}@example.com",
+        "age": rng.randint(18, 90),
+        "score": round(rng.uniform(0, 1000), 2),
+        "city": rng.choice(CITIES),
+        "tags": rng.sample(TAGS, rng.randint(0, 4)),
+        "active": rng.random() < 0.7,
+        "created_at": datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randint(0, 3_000_000)),
+    }
+    if shape == 'wide':
+        for f in range(60):
+            doc[f"attr_{f:02d}"] = rng.choice((rng.randint(0, 10_000), rng.random(), rng.choice(TAGS), None))
+    elif shape == 'nested':
+        doc["profile"] = {
+            "address": {"city": doc["city"], "zip": f"{rng.randint(10000, 99999)}",
+                        "geo": [rng.uniform(-90, 90), rng.uniform(-180, 180)]},
+            "preferences": {"newsletter": rng.random() < 0.5, "language": rng.choice(["en", "pt", "es", "de"])},
+        }
+        doc["orders"] = [{"sku": rng.choice(SKUS), "qty": rng.randint(1, 5), "price": round(rng.uniform(1, 300), 2),
+                          "at": doc["created_at"] + timedelta(days=rng.randint(0, 400))}
+                         for _ in range(rng.randint(0, 8))]
+    return doc
+
+
+def seed_collection(db, name, count, shape, seed, indexes=True, batch_size=1000):
+    """Drop and refill the benchmark collection; returns the time it took"""
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    collection = db[name]
+    collection.drop()
+    batch = []
+    for i in range(count):
+        batch.append(make_document(i, rng, shape))
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    if indexes:
+        collection.create_index("score")
+        collection.create_index([("city", 1), ("age", 1)])
+    return time.perf_counter() - started
+
+
+def request_factories(collection, docs):
+    """Request generators per endpoint: rng -> (method, path, json body)"""
+    def query_filter(rng):
+        return 'GET', f"/query/{collection}?city={rng.choice(CITIES)}&age__gte={rng.randint(18, 80)}&limit=20", None
+
+    def query_sort(rng):
+        return 'GET', f"/query/{collection}?active=true&sort=-score&limit=50", None
+
+    def query_deep_skip(rng):
+        # Offset pagination near the end of the collection, the slow case keyset pagination avoids
+        skip = rng.randint(docs // 2, max(docs - 20, docs // 2))
+        return 'GET', f"/query/{collection}?sort=seq&skip={skip}&limit=20", None
+
+    def query_regex_search(rng):
+        term = rng.choice(SYLLABLES) + rng.choice(SYLLABLES)
+        return 'GET', f"/query/{collection}?search={term}&search_mode=regex&limit=20", None
+
+    def collections(rng):
+        return 'GET', "/collections", None
+
+    def schema(rng):
+        return 'GET', f"/collection/{collection}/schema", None
+
+    def aggregate(rng):
+        pipeline = [
+            {"$match": {"age": {"$gte": rng.randint(18, 60)}}},
+            {"$group": {"_id": "$city", "avg_score": {"$avg": "$score"}, "people": {"$sum": 1}}},
+            {"$sort": {"people": -1}},
+        ]
+        return 'POST', f"/collection/{collection}/aggregate", {"pipeline": pipeline}
+
+    return {
+        'query_filter': query_filter, 'query_sort': query_sort, 'query_deep_skip': query_deep_skip,
+        'query_regex_search': query_regex_search, 'collections': collections, 'schema': schema,
+        'aggregate': aggregate,
+    }
+
+
+def parse_mix(spec, endpoints):
+    weights = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name} (known: {', '.join(ENDPOINTS)})")
+        if name in endpoints:
+            weights[name] = float(weight or 1)
+    return weights
+
+
+def in_process_sender(app, headers):
+    """One Flask test client per thread; the body is read and closed so streamed responses finish"""
+    local = threading.local()
+
+    def send(method, path, body):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers)
+        try:
+            response.get_data()
+            return response.status_code
+        finally:
+            response.close()
+    return send
+
+
+def http_sender(base_url, headers):
+    """One keep-alive httpx client per thread against a running server"""
+    import httpx
+    local = threading.local()
+
+    def send(method, path, body):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = httpx.Client(base_url=base_url, headers=headers, timeout=120)
+        response = client.request(method, path, json=body)
+        response.read()
+        return response.status_code
+    return send
+
+
+def run_phase(send, planned, concurrency, rss_pid):
+    """Replay planned (endpoint, method, path, body) requests on concurrency threads"""
+    latencies = {}
+    errors = {}
+    failures = []
+    next_index = iter(range(len(planned)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                return
+            name, method, path, body = planned[index]
+            started = time.perf_counter()
+            try:
+                status = send(method, path, body)
+            except Exception as e:
+                status = None
+                failures.append(f"{name}: {e}")
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status is not None and status < 400:
+                    latencies.setdefault(name, []).append(elapsed)
+                else:
+                    errors[name] = errors.get(name, 0) + 1
+                    if status is not None and len(failures) < 5:
+                        failures.append(f"{name}: HTTP {status} for {method} {path}")
+
+    with harness.RssSampler(rss_pid) as rss:
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, name=f"load-{n}") for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+    for failure in failures[:5]:
+        print(f"   ⚠️  {failure}")
+    return latencies, errors, wall, rss.peak_mb
+
+
+def plan(factories, names, weights, count, rng):
+    chosen = rng.choices(names, weights=[weights.get(name, 1) for name in names], k=count)
+    return [(name, *factories[name](rng)) for name in chosen]
+
+
+def print_row(name, result):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else '-'
+    print(f"{name:<28} {result['requests']:>8} {result['errors']:>6} {fmt(result['p50_ms'], '>9.2f')} "
+          f"{fmt(result['p95_ms'], '>9.2f')} {fmt(result['p99_ms'], '>9.2f')} {fmt(result['rps'], '>9.1f')} "
+          f"{fmt(result.get('peak_rss_mb'), '>12.1f')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--in-memory', action='store_true', help="run against mongomock instead of MongoDB")
+    target.add_argument('--url', help="load a running server instead of the app in-process")
+    parser.add_argument('--server-pid', type=int, help="with --url: process whose peak RSS is reported")
+    parser.add_argument('--mongodb-uri', default=os.getenv('MONGODB_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--database', default='api_load_test')
+    parser.add_argument('--collection', default='load_test_people')
+    parser.add_argument('--docs', type=int, default=20000, help="documents to seed (default 20000)")
+    parser.add_argument('--shape', choices=('flat', 'wide', 'nested'), default='flat')
+    parser.add_argument('--no-indexes', action='store_true', help="seed without the score and city/age indexes")
+    parser.add_argument('--skip-seed', action='store_true', help="reuse the collection from an earlier run")
+    parser.add_argument('--requests', type=int, default=200, help="requests per endpoint phase (default 200)")
+    parser.add_argument('--mix-requests', type=int, default=1000, help="requests in the mixed phase (default 1000)")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="endpoint weights for the mixed phase")
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help="comma-separated endpoints to run")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=10, help="unmeasured requests per endpoint first")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache', action='store_true', help="let requests use the result cache")
+    harness.add_baseline_arguments(parser, DEFAULT_BASELINE)
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = [name for name in endpoints if name not in ENDPOINTS]
+    if unknown:
+        raise SystemExit(f"Unknown endpoints: {', '.join(unknown)} (known: {', '.join(ENDPOINTS)})")
+    weights = parse_mix(args.mix, endpoints)
+    headers = {} if args.cache else {"Cache-Control": "no-cache"}
+
+    if args.url:
+        from pymongo import MongoClient
+        mode = 'http'
+        if not args.skip_seed:
+            db = MongoClient(args.mongodb_uri, serverSelectionTimeoutMS=5000)[args.database]
+        send = http_sender(args.url.rstrip('/'), headers)
+        rss_pid = args.server_pid
+        if rss_pid is None:
+            print("ℹ️  Pass --server-pid to report the server's peak RSS")
+    else:
+        # Config reads these at import time, so they are set before the app is imported
+        os.environ['MONGODB_URI'] = args.mongodb_uri
+        os.environ['DATABASE_NAME'] = args.database
+        os.environ.setdefault('FLASK_DEBUG', 'false')
+        os.environ.setdefault('FLASK_PORT', '5000')
+        os.environ.setdefault('SLOW_REQUEST_MS', '0')
+        mode = 'mongodb'
+        if args.in_memory:
+            try:
+                import mongomock
+            except ImportError:
+                raise SystemExit("--in-memory needs mongomock: pip install mongomock")
+            import pymongo
+            pymongo.MongoClient = mongomock.MongoClient
+            # mongomock has no explain, which the index advisor relies on
+            os.environ.setdefault('INDEX_ADVISOR_ENABLED', 'false')
+            mode = 'in-memory'
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from app import app
+        from database import db_instance
+        db = db_instance.db
+        send = in_process_sender(app, headers)
+        rss_pid = os.getpid()
+
+    if not args.skip_seed:
+        print(f"🌱 Seeding {args.docs} {args.shape} documents into {args.database}.{args.collection} ({mode})...")
+        seconds = seed_collection(db, args.collection, args.docs, args.shape, args.seed, not args.no_indexes)
+        print(f"   done in {seconds:.1f}s")
+
+    factories = request_factories(args.collection, args.docs)
+    rng = random.Random(args.seed)
+    results = {}
+
+    print(f"\n{'endpoint':<28} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'rps':>9} {'peak RSS MB':>12}")
+    for name in endpoints:
+        if args.warmup:
+            run_phase(send, plan(factories, [name], {}, args.warmup, rng), args.concurrency, None)
+        latencies, errors, wall, peak_mb = run_phase(
+            send, plan(factories, [name], {}, args.requests, rng), args.concurrency, rss_pid)
+        result = harness.summarize_latencies(latencies.get(name, []), wall, errors.get(name, 0))
+        result["peak_rss_mb"] = peak_mb
+        results[name] = result
+        print_row(name, result)
+
+    if args.mix_requests and weights:
+        mix_names = list(weights)
+        latencies, errors, wall, peak_mb = run_phase(
+            send, plan(factories, mix_names, weights, args.mix_requests, rng), args.concurrency, rss_pid)
+        total = harness.summarize_latencies([value for values in latencies.values() for value in values],
+                                            wall, sum(errors.values()))
+        total["peak_rss_mb"] = peak_mb
+        print(f"{'-' * 28} mixed phase, {args.concurrency} concurrent")
+        for name in mix_names:
+            # rps per endpoint is its share of the mixed throughput
+            result = harness.summarize_latencies(latencies.get(name, []), wall, errors.get(name, 0))
+            results[f"mix.{name}"] = result
+            print_row(f"mix.{name}", result)
+        results["mix"] = total
+        print_row("mix (all)", total)
+
+    settings = {"mode": mode, "docs": args.docs, "shape": args.shape, "indexes": not args.no_indexes,
+                "requests": args.requests, "mix_requests": args.mix_requests, "mix": args.mix,
+                "concurrency": args.concurrency, "seed": args.seed, "cache": args.cache}
+    status = harness.handle_baseline(args, results, settings)
+    if any(result["errors"] for result in results.values()):
+        print("\n⚠️  Some requests failed; their latencies are not included")
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+# bulk_writer.py
+"""
+Batched writes for /collection/<name>/bulk.
+
+The request body is NDJSON (MongoDB Extended JSON per line), one operation
+per line:
+
+  {"op": "insert",  "document": {...}}
+  {"op": "update",  "filter": {...}, "update": {...}, "multi": false}
+  {"op": "upsert",  "filter": {...}, "update": {...}}        (or "replacement")
+  {"op": "replace", "filter": {...}, "replacement": {...}, "upsert": false}
+  {"op": "delete",  "filter": {...}, "multi": false}
+
+Lines are read incrementally and grouped into unordered bulk_write batches.
+At most max_in_flight batches are queued or running at once, so reading
+the upload stalls instead of buffering it: memory stays bounded by
+batch_size * max_in_flight operations regardless of the body size.
+Results come back in input order, one per operation. With w=0 the server
+does not report back: operations are marked "unacknowledged" (ok null)
+and the write counts are null.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId, json_util
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.common import validate_ok_for_replace, validate_ok_for_update
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+from aggregation_policy import FORBIDDEN_OPERATORS, find_operator
+from config import Config
+
+BULK_OPS = ('insert', 'update', 'upsert', 'replace', 'delete')
+
+
+class OperationRejected(ValueError):
+    """Raised for an NDJSON line that is not a valid bulk operation"""
+
+
+def iter_ndjson_lines(stream, max_bytes):
+    """Yield non-blank lines from a binary stream without reading it whole.
+
+    Lines longer than max_bytes are skipped and yielded as None so the
+    caller can report them at the right index.
+    """
+    while True:
+        line = stream.readline(max_bytes + 1)
+        if not line:
+            return
+        if len(line) > max_bytes and not line.endswith(b'\n'):
+            # Discard the rest of the oversized line
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_bytes + 1)
+            yield None
+            continue
+        if line.strip():
+            yield line
+
+
+def parse_operation(line):
+    """Turn one NDJSON line into (op name, pymongo request, inserted _id)"""
+    if line is None:
+        raise OperationRejected(f"Line exceeds {Config.BULK_MAX_LINE_BYTES} bytes")
+    try:
+        spec = json_util.loads(line)
+    except Exception as e:
+        raise OperationRejected(f"Invalid JSON: {e}")
+    if not isinstance(spec, dict):
+        raise OperationRejected("Each line must be a JSON object")
+
+    op = spec.get('op')
+    if op not in BULK_OPS:
+        raise OperationRejected(f"op must be one of: {', '.join(BULK_OPS)}")
+    forbidden = find_operator(spec, FORBIDDEN_OPERATORS)
+    if forbidden:
+        raise OperationRejected(f"{forbidden} is not allowed: server-side JavaScript is disabled")
+
+    if op == 'insert':
+        document = spec.get('document')
+        if not isinstance(document, dict):
+            raise OperationRejected("insert requires a 'document' object")
+        # Assign the _id here so it can be reported per operation
+        document.setdefault('_id', ObjectId())
+        return op, InsertOne(document), document['_id']
+
+    filter_dict = spec.get('filter')
+    if not isinstance(filter_dict, dict):
+        raise OperationRejected(f"{op} requires a 'filter' object")
+    multi = bool(spec.get('multi'))
+
+    try:
+        if op == 'delete':
+            if multi and not filter_dict:
+                raise OperationRejected("delete with multi=true requires a non-empty filter")
+            return op, (DeleteMany if multi else DeleteOne)(filter_dict), None
+
+        if op == 'replace' or (op == 'upsert' and 'replacement' in spec):
+            replacement = spec.get('replacement')
+            validate_ok_for_replace(replacement)
+            return op, ReplaceOne(filter_dict, replacement, upsert=op == 'upsert' or bool(spec.get('upsert'))), None
+
+        update = spec.get('update')
+        validate_ok_for_update(update)
+        if op == 'upsert':
+            return op, UpdateOne(filter_dict, update, upsert=True), None
+        return op, (UpdateMany if multi else UpdateOne)(filter_dict, update), None
+    except (TypeError, ValueError) as e:
+        if isinstance(e, OperationRejected):
+            raise
+        raise OperationRejected(str(e))
+
+
+def write_concern_from_args(args):
+    """WriteConcern from w, j and wtimeout_ms query parameters (None keeps the default)"""
+    w = args.get('w')
+    j = args.get('j')
+    wtimeout = args.get('wtimeout_ms', type=int)
+    if w is None and j is None and wtimeout is None:
+        return None
+    if w is not None and w.isdigit():
+        w = int(w)
+    try:
+        return WriteConcern(
+            w=w,
+            j=None if j is None else j.lower() == 'true',
+            wtimeout=wtimeout
+        )
+    except Exception as e:
+        raise ValueError(f"Invalid write concern: {e}")
+
+
+class BulkWriter:
+    """Runs bulk batches on a shared pool with bounded in-flight batches per upload"""
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk-write")
+
+    def run(self, collection, lines, batch_size, max_in_flight, write_concern=None, on_batch=None):
+        """Yield one result per operation in input order, then a summary"""
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+
+        summary = {"received": 0, "succeeded": 0, "failed": 0, "unconfirmed": 0, "batches": 0,
+                   "inserted": 0, "matched": 0, "modified": 0, "deleted": 0, "upserted": 0}
+        pending = deque()
+        batch = []
+
+        def finish_oldest():
+            results, counts = pending.popleft().result()
+            if counts is not None:
+                summary["batches"] += 1
+                for key, value in counts.items():
+                    # A count the server did not report makes the total unknown
+                    summary[key] = None if value is None or summary[key] is None else summary[key] + value
+            for result in results:
+                if result["ok"] is None:
+                    summary["unconfirmed"] += 1
+                else:
+                    summary["succeeded" if result["ok"] else "failed"] += 1
+                yield result
+
+        for index, line in enumerate(lines):
+            summary["received"] += 1
+            try:
+                batch.append((index,) + parse_operation(line))
+            except OperationRejected as e:
+                batch.append((index, None, None, str(e)))
+            if len(batch) >= batch_size:
+                # Backpressure: stop reading until a batch slot frees up
+                if len(pending) >= max_in_flight:
+                    yield from finish_oldest()
+                pending.append(self._executor.submit(self._execute, collection, batch, on_batch))
+                batch = []
+
+        if batch:
+            pending.append(self._executor.submit(self._execute, collection, batch, on_batch))
+        while pending:
+            yield from finish_oldest()
+        yield {"summary": summary, "success": summary["failed"] == 0}
+
+    @staticmethod
+    def _execute(collection, batch, on_batch):
+        """Write one batch; returns (per-operation results, write counts or None if nothing was sent).
+
+        Batch entries are (index, op, request, inserted id or rejection message).
+        Counts are None when the writes were sent but their result is unknown.
+        """
+        results = [None] * len(batch)
+        requests = []
+        positions = []  # request position -> batch position
+        for position, (index, op, request, extra) in enumerate(batch):
+            if request is None:
+                results[position] = {"index": index, "ok": False, "error": extra}
+            else:
+                requests.append(request)
+                positions.append(position)
+        if not requests:
+            return results, None
+
+        errors = {}
+        upserted = {}
+        unconfirmed = None  # why the outcome of writes that were sent is unknown
+        try:
+            outcome = collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as e:
+            details = e.details
+            counts = (details.get('nInserted', 0), details.get('nMatched', 0), details.get('nModified', 0),
+                      details.get('nRemoved', 0), details.get('nUpserted', 0))
+            upserted = {entry['index']: entry['_id'] for entry in details.get('upserted', [])}
+            errors = {entry['index']: entry for entry in details.get('writeErrors', [])}
+            if details.get('writeConcernErrors'):
+                # Writes were applied but not acknowledged as requested
+                message = details['writeConcernErrors'][0].get('errmsg', 'write concern error')
+                errors.update({i: {'errmsg': message, 'code': 64} for i in range(len(requests)) if i not in errors})
+        except Exception as e:
+            counts = (0, 0, 0, 0, 0)
+            errors = {i: {'errmsg': str(e)} for i in range(len(requests))}
+        else:
+            if not outcome.acknowledged:
+                # w=0: the writes were sent, but the server reports nothing back
+                counts, unconfirmed = (None,) * 5, "unacknowledged"
+            else:
+                try:
+                    counts = (outcome.inserted_count, outcome.matched_count, outcome.modified_count,
+                              outcome.deleted_count, outcome.upserted_count)
+                    upserted = outcome.upserted_ids or {}
+                except Exception as e:
+                    # The write went through; only reading its result failed
+                    counts, unconfirmed = (None,) * 5, f"result unavailable: {e}"
+
+        for request_position, position in enumerate(positions):
+            index, op, _, inserted_id = batch[position]
+            error = errors.get(request_position)
+            if error:
+                result = {"index": index, "op": op, "ok": False, "error": error.get('errmsg')}
+                if 'code' in error:
+                    result["code"] = error['code']
+            elif unconfirmed:
+                result = {"index": index, "op": op, "ok": None, "status": unconfirmed}
+                if inserted_id is not None:
+                    result["_id"] = inserted_id
+            else:
+                result = {"index": index, "op": op, "ok": True}
+                document_id = inserted_id if inserted_id is not None else upserted.get(request_position)
+                if document_id is not None:
+                    result["_id"] = document_id
+            results[position] = result
+
+        if on_batch:
+            on_batch(collection.name)
+        return results, dict(zip(("inserted", "matched", "modified", "deleted", "upserted"), counts))
+
+
+# Create global bulk writer instance
+bulk_writer = BulkWriter(Config.BULK_WORKERS)
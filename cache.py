@@ -0,0 +1,185 @@
+# cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from bson import json_util
+from config import Config
+
+# Entries that are not tied to a single collection (e.g. the /collections catalog)
+DATABASE_SCOPE = ''
+
+
+class MemoryBackend:
+    """In-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared cache stored in Redis, so every worker sees the same entries"""
+
+    def __init__(self, url, namespace='mongo-api:'):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("CACHE_BACKEND=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+        self.evictions = None  # Redis evicts on its own and does not report it per client
+
+    def get(self, key):
+        raw = self.client.get(self.namespace + key)
+        return json_util.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.namespace + key, json_util.dumps(value), ex=ttl)
+
+    def invalidate(self, prefix):
+        pattern = self._escape_glob(self.namespace + prefix) + '*'
+        keys = list(self.client.scan_iter(match=pattern))
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.invalidate('')
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(match=self._escape_glob(self.namespace) + '*'))
+
+    @staticmethod
+    def _escape_glob(value):
+        for char in '\\*?[]':
+            value = value.replace(char, '\\' + char)
+        return value
+
+
+class ResultCache:
+    """Response cache for read endpoints, keyed per endpoint and collection"""
+
+    def __init__(self, backend, ttls, enabled=True):
+        self.backend = backend
+        self.ttls = ttls
+        self.enabled = enabled
+        self.invalidations = 0
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(endpoint, collection_name, **parts):
+        """Build a cache key from the normalized query parts"""
+        normalized = json_util.dumps(parts, sort_keys=True)
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        return f"{collection_name}\x00{endpoint}\x00{digest}"
+
+    def get(self, endpoint, key):
+        """Return a cached value or None, recording a hit or miss"""
+        if not self.enabled or not self.ttls.get(endpoint):
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"⚠️  Cache read failed: {str(e)}")
+            value = None
+        self._count(endpoint, 'hits' if value is not None else 'misses')
+        return value
+
+    def set(self, endpoint, key, value):
+        """Store a value using the endpoint's TTL"""
+        ttl = self.ttls.get(endpoint)
+        if not self.enabled or not ttl:
+            return
+        try:
+            self.backend.set(key, value, ttl)
+        except Exception as e:
+            print(f"⚠️  Cache write failed: {str(e)}")
+
+    def invalidate(self, collection_name=None):
+        """Drop entries for a collection, or everything when no name is given"""
+        try:
+            if collection_name:
+                self.backend.invalidate(f"{collection_name}\x00")
+                # Catalog entries embed per-collection counts, so they go too
+                self.backend.invalidate(f"{DATABASE_SCOPE}\x00")
+            else:
+                self.backend.clear()
+        except Exception as e:
+            print(f"⚠️  Cache invalidation failed: {str(e)}")
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        """Hit, miss and eviction counters"""
+        with self._lock:
+            endpoints = {name: dict(counters) for name, counters in self._counters.items()}
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "hits": sum(c.get('hits', 0) for c in endpoints.values()),
+            "misses": sum(c.get('misses', 0) for c in endpoints.values()),
+            "evictions": self.backend.evictions,
+            "invalidations": self.invalidations,
+            "ttls": self.ttls,
+            "endpoints": endpoints
+        }
+
+    def _count(self, endpoint, counter):
+        with self._lock:
+            counters = self._counters.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            counters[counter] += 1
+
+
+def create_cache():
+    """Build the result cache configured in Config"""
+    if Config.CACHE_BACKEND == 'redis':
+        backend = RedisBackend(Config.REDIS_URL)
+    else:
+        backend = MemoryBackend(Config.CACHE_MAX_ENTRIES)
+
+    ttls = {
+        'collections': Config.CACHE_TTL_COLLECTIONS,
+        'schema': Config.CACHE_TTL_SCHEMA,
+        'query': Config.CACHE_TTL_QUERY,
+        'summary': Config.ANALYZE_SUMMARY_TTL
+    }
+    return ResultCache(backend, ttls, enabled=Config.CACHE_ENABLED)
+
+
+# Create global result cache instance
+result_cache = create_cache()
@@ -0,0 +1,85 @@
+# catalog.py
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from database import db_instance
+from read_routing import read_router
+
+
+def is_internal_collection(name):
+    """Collections the app keeps for itself: stored schema profiles, view definitions and view targets"""
+    return name in (Config.SCHEMA_COLLECTION, Config.VIEWS_COLLECTION) or name.startswith(Config.VIEWS_TARGET_PREFIX)
+
+
+class CollectionCatalog:
+    """Collection metadata (estimated counts and sample fields) kept fresh on an interval"""
+
+    def __init__(self, mongo, refresh_interval, max_workers):
+        self.mongo = mongo
+        self.refresh_interval = refresh_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="catalog")
+        self._entries = {}  # name -> (loaded_at, info)
+        self._lock = threading.Lock()
+
+    def list_names(self, name_filter=None):
+        """Sorted user collection names, optionally filtered by a case-insensitive substring"""
+        query = {}
+        if name_filter:
+            query = {'name': {'$regex': re.compile(re.escape(name_filter), re.IGNORECASE)}}
+        names = self.mongo.db.list_collection_names(filter=query)
+        return sorted(name for name in names if not is_internal_collection(name))
+
+    def describe(self, names):
+        """Metadata for the given collections, refreshing stale entries concurrently"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [name for name in names
+                     if name not in self._entries or now - self._entries[name][0] >= self.refresh_interval]
+
+        # One bounded fan-out instead of two serial round trips per collection
+        loaded = {}
+        for name, info in zip(stale, self._executor.map(self._load, stale)):
+            loaded[name] = info
+            with self._lock:
+                self._entries[name] = (time.monotonic(), info)
+
+        # A change event may invalidate entries meanwhile; answer from what was just read
+        with self._lock:
+            cached = {name: self._entries[name][1] for name in names if name in self._entries}
+        missing = [name for name in names if name not in loaded and name not in cached]
+        loaded.update(zip(missing, self._executor.map(self._load, missing)))
+        return [loaded[name] if name in loaded else cached[name] for name in names]
+
+    def invalidate(self, name=None):
+        """Forget cached metadata for one collection, or for all of them"""
+        with self._lock:
+            if name:
+                self._entries.pop(name, None)
+            else:
+                self._entries.clear()
+
+    def _load(self, name):
+        try:
+            collection = self.mongo.get_collection(name, read_router.route('collections'))
+            # Metadata-only count, no collection scan
+            count = collection.estimated_document_count()
+            # Get sample document to show structure
+            sample = collection.find_one()
+            sample_fields = list(sample.keys()) if sample else []
+            return {
+                "name": name,
+                "count": count,
+                "sample_fields": sample_fields[:10]  # First 10 fields
+            }
+        except Exception as e:
+            return {
+                "name": name,
+                "count": 0,
+                "error": str(e)
+            }
+
+
+# Create global collection catalog instance
+collection_catalog = CollectionCatalog(db_instance, Config.CATALOG_REFRESH_SECONDS, Config.CATALOG_WORKERS)
@@ -0,0 +1,172 @@
+# coalesce.py
+"""
+Single-flight request coalescing.
+
+Concurrent calls with the same key share one execution: the first caller
+(the leader) runs it, later callers (followers) wait for its result. The
+result is whatever the caller returns, typically serialized response
+bytes, so followers skip the database work and the encoding. Nothing is
+kept once the execution finishes, so unlike the result cache there is no
+staleness beyond the requests already in flight.
+
+Followers wait at most wait_seconds; after that, or if the leader raised,
+they run the work themselves.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+
+LEADER = 'leader'
+FOLLOWER = 'follower'
+TIMEOUT = 'timeout'
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+        self.waiters = 0
+
+
+class _KeyStats:
+    """Bounded per-key counters shared by the sync and async variants"""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.totals = {LEADER: 0, FOLLOWER: 0, TIMEOUT: 0, "errors": 0}
+        self._keys = OrderedDict()  # key -> counters
+        self._lock = threading.Lock()
+
+    def record(self, key, role, waiters=0, elapsed_ms=None, failed=False):
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is None:
+                entry = self._keys[key] = {LEADER: 0, FOLLOWER: 0, TIMEOUT: 0, "errors": 0,
+                                           "max_waiters": 0, "last_ms": None}
+                while len(self._keys) > self.max_keys:
+                    self._keys.popitem(last=False)
+            self._keys.move_to_end(key)
+            entry[role] += 1
+            self.totals[role] += 1
+            if failed:
+                entry["errors"] += 1
+                self.totals["errors"] += 1
+            entry["max_waiters"] = max(entry["max_waiters"], waiters)
+            if elapsed_ms is not None:
+                entry["last_ms"] = round(elapsed_ms, 2)
+
+    def snapshot(self, top):
+        with self._lock:
+            keys = [{"key": key, "executions": entry[LEADER], "coalesced": entry[FOLLOWER],
+                     "timeouts": entry[TIMEOUT], "errors": entry["errors"],
+                     "max_waiters": entry["max_waiters"], "last_ms": entry["last_ms"]}
+                    for key, entry in self._keys.items()]
+            totals = dict(self.totals)
+        keys.sort(key=lambda item: item["coalesced"], reverse=True)
+        executions = totals[LEADER] + totals[TIMEOUT]
+        return {
+            "executions": executions,
+            "coalesced": totals[FOLLOWER],
+            "timeouts": totals[TIMEOUT],
+            "errors": totals["errors"],
+            "saved_ratio": round(totals[FOLLOWER] / (executions + totals[FOLLOWER]), 4)
+            if executions + totals[FOLLOWER] else 0.0,
+            "tracked_keys": len(keys),
+            "top_keys": keys[:top]
+        }
+
+
+class SingleFlight:
+    """Thread-based single-flight for the WSGI app"""
+
+    def __init__(self, wait_seconds, max_keys):
+        self.wait_seconds = wait_seconds
+        self.key_stats = _KeyStats(max_keys)
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, work):
+        """Return (work() result, role); concurrent callers with the same key share one call"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if call.done.wait(self.wait_seconds) and not call.failed:
+                self.key_stats.record(key, FOLLOWER)
+                return call.result, FOLLOWER
+            # The leader is too slow or failed: do the work independently
+            self.key_stats.record(key, TIMEOUT)
+            return work(), TIMEOUT
+
+        started = time.perf_counter()
+        try:
+            call.result = work()
+            return call.result, LEADER
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            self.key_stats.record(key, LEADER, call.waiters, (time.perf_counter() - started) * 1000, call.failed)
+
+    def stats(self, top=20):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"in_flight": in_flight, "wait_seconds": self.wait_seconds, **self.key_stats.snapshot(top)}
+
+
+class AsyncSingleFlight:
+    """Single-flight for coroutines on one event loop (the ASGI routes)"""
+
+    def __init__(self, wait_seconds, key_stats):
+        self.wait_seconds = wait_seconds
+        self.key_stats = key_stats
+        self._calls = {}  # key -> (future, waiter count list)
+
+    async def do(self, key, work):
+        """Return (await work() result, role)"""
+        entry = self._calls.get(key)
+        if entry is not None:
+            future, waiters = entry
+            waiters[0] += 1
+            try:
+                # shield: a timed-out follower must not cancel the leader's work
+                result = await asyncio.wait_for(asyncio.shield(future), self.wait_seconds)
+                self.key_stats.record(key, FOLLOWER)
+                return result, FOLLOWER
+            except Exception:
+                self.key_stats.record(key, TIMEOUT)
+                return await work(), TIMEOUT
+
+        future = asyncio.get_running_loop().create_future()
+        waiters = [0]
+        self._calls[key] = (future, waiters)
+        started = time.perf_counter()
+        failed = False
+        try:
+            result = await work()
+            future.set_result(result)
+            return result, LEADER
+        except BaseException as e:
+            failed = True
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("request cancelled"))
+            # Followers retry on their own; nobody may be waiting for the exception
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+            self.key_stats.record(key, LEADER, waiters[0], (time.perf_counter() - started) * 1000, failed)
+
+
+# Create global single-flight instance
+single_flight = SingleFlight(Config.COALESCE_WAIT_SECONDS, Config.COALESCE_MAX_KEYS)
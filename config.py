@@ -11,5 +11,157 @@ class Config:
     HOST = os.getenv('FLASK_HOST', '127.0.0.1')
 
     PORT = int(os.getenv("FLASK_PORT"))
+    # Connection pool sizing and timeouts (0 leaves the driver default)
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 0))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 5000))
+    MONGO_RECONNECT_MIN_DELAY = float(os.getenv("MONGO_RECONNECT_MIN_DELAY", 1))
+    MONGO_RECONNECT_MAX_DELAY = float(os.getenv("MONGO_RECONNECT_MAX_DELAY", 60))
+
     DEFAULT_LIMIT = int(os.getenv("DEFAULT_LIMIT", 10))
     MAX_LIMIT = int(os.getenv("MAX_LIMIT", 100))
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+    # Aggregation guardrails (0 disables the time budget)
+    AGGREGATE_MAX_TIME_MS = int(os.getenv("AGGREGATE_MAX_TIME_MS", 30000))
+    AGGREGATE_ALLOW_DISK_USE = os.getenv("AGGREGATE_ALLOW_DISK_USE", "true").lower() == "true"
+    AGGREGATE_ALLOW_UNINDEXED_LOOKUP = os.getenv("AGGREGATE_ALLOW_UNINDEXED_LOOKUP", "false").lower() == "true"
+    COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", 60))
+    COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", 1024))
+
+    # Result cache for read endpoints (memory or redis backend)
+    CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+    CACHE_TTL_COLLECTIONS = int(os.getenv("CACHE_TTL_COLLECTIONS", 30))
+    CACHE_TTL_SCHEMA = int(os.getenv("CACHE_TTL_SCHEMA", 300))
+    CACHE_TTL_QUERY = int(os.getenv("CACHE_TTL_QUERY", 10))
+    CACHE_INVALIDATE_ON_CHANGE = os.getenv("CACHE_INVALIDATE_ON_CHANGE", "false").lower() == "true"
+    REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    # /collections catalog: metadata refresh interval and sampling concurrency
+    CATALOG_REFRESH_SECONDS = int(os.getenv("CATALOG_REFRESH_SECONDS", 60))
+    CATALOG_WORKERS = int(os.getenv("CATALOG_WORKERS", 8))
+
+    # Persisted schema profiles: $sample size for full builds, incremental refresh cadence
+    SCHEMA_COLLECTION = os.getenv("SCHEMA_COLLECTION", "_schema_profiles")
+    SCHEMA_SAMPLE_SIZE = int(os.getenv("SCHEMA_SAMPLE_SIZE", 1000))
+    SCHEMA_MAX_SAMPLE_SIZE = int(os.getenv("SCHEMA_MAX_SAMPLE_SIZE", 100000))
+    SCHEMA_REFRESH_SECONDS = int(os.getenv("SCHEMA_REFRESH_SECONDS", 300))
+    SCHEMA_INCREMENT_LIMIT = int(os.getenv("SCHEMA_INCREMENT_LIMIT", 10000))
+
+    # /gemini/analyze summaries: sample sizes, prompt token budget and cache TTL
+    ANALYZE_DISCOVERY_SAMPLE = int(os.getenv("ANALYZE_DISCOVERY_SAMPLE", 500))
+    ANALYZE_STATS_SAMPLE = int(os.getenv("ANALYZE_STATS_SAMPLE", 10000))
+    ANALYZE_EXAMPLE_ROWS = int(os.getenv("ANALYZE_EXAMPLE_ROWS", 5))
+    ANALYZE_MAX_FIELDS = int(os.getenv("ANALYZE_MAX_FIELDS", 30))
+    ANALYZE_TOP_VALUES = int(os.getenv("ANALYZE_TOP_VALUES", 5))
+    ANALYZE_TOKEN_BUDGET = int(os.getenv("ANALYZE_TOKEN_BUDGET", 3000))
+    ANALYZE_SUMMARY_TTL = int(os.getenv("ANALYZE_SUMMARY_TTL", 900))
+
+    # /query filter compiler: schema-profile type hints and memoized compiled filters
+    QUERY_TYPE_HINTS = os.getenv("QUERY_TYPE_HINTS", "true").lower() == "true"
+    QUERY_TYPE_HINTS_TTL = int(os.getenv("QUERY_TYPE_HINTS_TTL", 60))
+    QUERY_PLAN_CACHE_SIZE = int(os.getenv("QUERY_PLAN_CACHE_SIZE", 2048))
+
+    # ?search= backends: mode (auto, text, prefix, regex), per-collection fields as JSON, text index options
+    SEARCH_MODE = os.getenv("SEARCH_MODE", "auto").lower()
+    SEARCH_FIELDS = os.getenv("SEARCH_FIELDS", "")
+    SEARCH_DEFAULT_FIELDS = [field.strip() for field in os.getenv(
+        "SEARCH_DEFAULT_FIELDS", "name,title,description,email,username,content").split(',') if field.strip()]
+    SEARCH_ALLOW_REGEX = os.getenv("SEARCH_ALLOW_REGEX", "true").lower() == "true"
+    SEARCH_AUTO_CREATE_INDEX = os.getenv("SEARCH_AUTO_CREATE_INDEX", "false").lower() == "true"
+    SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")
+    SEARCH_SHADOW_PREFIX = os.getenv("SEARCH_SHADOW_PREFIX", "_search")
+    SEARCH_INDEX_CACHE_SECONDS = int(os.getenv("SEARCH_INDEX_CACHE_SECONDS", 60))
+
+    # Read routing: default read preference and read concern, per-route settings as JSON, per-request overrides
+    READ_PREFERENCE = os.getenv("READ_PREFERENCE", "")
+    READ_MAX_STALENESS_SECONDS = int(os.getenv("READ_MAX_STALENESS_SECONDS", -1))
+    READ_CONCERN = os.getenv("READ_CONCERN", "")
+    READ_ROUTES = os.getenv("READ_ROUTES", "")
+    READ_ROUTING_OVERRIDES = os.getenv("READ_ROUTING_OVERRIDES", "true").lower() == "true"
+
+    # Single-flight coalescing of identical concurrent reads: follower wait budget and tracked keys
+    COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+    COALESCE_WAIT_SECONDS = float(os.getenv("COALESCE_WAIT_SECONDS", 10))
+    COALESCE_MAX_KEYS = int(os.getenv("COALESCE_MAX_KEYS", 1000))
+
+    # Response encoding: strong ETags and conditional GET, negotiated compression (zstd, br, gzip), binary bodies (bson, msgpack)
+    ETAG_ENABLED = os.getenv("ETAG_ENABLED", "true").lower() == "true"
+    ETAG_MAX_ENTRIES = int(os.getenv("ETAG_MAX_ENTRIES", 4096))
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_ENCODINGS = [encoding.strip().lower() for encoding in os.getenv(
+        "COMPRESSION_ENCODINGS", "zstd,br,gzip").split(',') if encoding.strip()]
+    COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+    GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+    ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+    BINARY_ENCODINGS = [encoding.strip().lower() for encoding in os.getenv(
+        "BINARY_ENCODINGS", "bson,msgpack").split(',') if encoding.strip()]
+
+    # Materialized views (opt-in): definitions collection, target prefix, refresh cadence, scheduler lease and time budget
+    VIEWS_ENABLED = os.getenv("VIEWS_ENABLED", "false").lower() == "true"
+    VIEWS_COLLECTION = os.getenv("VIEWS_COLLECTION", "_materialized_views")
+    VIEWS_TARGET_PREFIX = os.getenv("VIEWS_TARGET_PREFIX", "_view_")
+    VIEWS_REFRESH_SECONDS = int(os.getenv("VIEWS_REFRESH_SECONDS", 300))
+    VIEWS_MIN_REFRESH_SECONDS = int(os.getenv("VIEWS_MIN_REFRESH_SECONDS", 10))
+    VIEWS_SCHEDULER_TICK = float(os.getenv("VIEWS_SCHEDULER_TICK", 5))
+    VIEWS_LEASE_SECONDS = int(os.getenv("VIEWS_LEASE_SECONDS", 900))
+    VIEWS_MAX_TIME_MS = int(os.getenv("VIEWS_MAX_TIME_MS", 600000))
+
+    # Partitioned parallel scans for exports and streaming aggregations
+    SCAN_PARTITIONS = int(os.getenv("SCAN_PARTITIONS", 4))
+    SCAN_MAX_PARTITIONS = int(os.getenv("SCAN_MAX_PARTITIONS", 32))
+    SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", 8))
+    SCAN_QUEUE_BATCHES = int(os.getenv("SCAN_QUEUE_BATCHES", 4))
+    SCAN_SAMPLES_PER_PARTITION = int(os.getenv("SCAN_SAMPLES_PER_PARTITION", 20))
+    SCAN_BOUNDARY_METHOD = os.getenv("SCAN_BOUNDARY_METHOD", "sample")
+
+    # /collection/<name>/bulk: writes are opt-in; batch sizing, in-flight batches per upload, line size cap
+    BULK_WRITES_ENABLED = os.getenv("BULK_WRITES_ENABLED", "false").lower() == "true"
+    BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+    BULK_MAX_BATCH_SIZE = int(os.getenv("BULK_MAX_BATCH_SIZE", 10000))
+    BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", 2))
+    BULK_WORKERS = int(os.getenv("BULK_WORKERS", 8))
+    BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", 16 * 1024 * 1024))
+
+    # Index advisor: tracked /query shapes, plan re-sampling, and handling of unindexed shapes (off, warn, reject)
+    INDEX_ADVISOR_ENABLED = os.getenv("INDEX_ADVISOR_ENABLED", "true").lower() == "true"
+    INDEX_ADVISOR_MAX_SHAPES = int(os.getenv("INDEX_ADVISOR_MAX_SHAPES", 500))
+    INDEX_ADVISOR_REEXPLAIN_SECONDS = int(os.getenv("INDEX_ADVISOR_REEXPLAIN_SECONDS", 900))
+    QUERY_UNINDEXED_ACTION = os.getenv("QUERY_UNINDEXED_ACTION", "off").lower()
+    QUERY_UNINDEXED_MIN_DOCS = int(os.getenv("QUERY_UNINDEXED_MIN_DOCS", 100000))
+
+    # Request instrumentation: /metrics, latency buckets (seconds), slow-request log (0 disables) and sampled explains
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_BUCKETS = [float(bound) for bound in os.getenv(
+        "METRICS_BUCKETS", "0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(',') if bound.strip()]
+    METRICS_MAX_COLLECTIONS = int(os.getenv("METRICS_MAX_COLLECTIONS", 200))
+    SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", 1000))
+    SLOW_REQUEST_EXPLAIN_RATE = float(os.getenv("SLOW_REQUEST_EXPLAIN_RATE", 0))
+
+    # Outbound model client: endpoint, timeouts, retries, concurrency, response cache and async jobs
+    GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+    LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+    LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+    LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 30))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 30))
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 3600))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 256))
+    LLM_JOB_WORKERS = int(os.getenv("LLM_JOB_WORKERS", 4))
+    LLM_JOB_TTL = int(os.getenv("LLM_JOB_TTL", 3600))
+
+    # ASGI serving mode: per-route concurrency limits and queueing budget
+    ASYNC_ROUTE_CONCURRENCY = int(os.getenv("ASYNC_ROUTE_CONCURRENCY", 500))
+    ASYNC_GEMINI_CONCURRENCY = int(os.getenv("ASYNC_GEMINI_CONCURRENCY", 16))
+    ASYNC_QUEUE_TIMEOUT = float(os.getenv("ASYNC_QUEUE_TIMEOUT", 10))
+    ASYNC_WSGI_WORKERS = int(os.getenv("ASYNC_WSGI_WORKERS", 16))
@@ -1,40 +1,244 @@
 # database.py
-from pymongo import MongoClient
+from collections import deque
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
+from pymongo.monitoring import CommandListener, ConnectionPoolListener
 from bson import ObjectId
 from config import Config
+from metrics import current_request, metrics
+import os
 import sys
+import threading
+import time
+
+
+def client_options():
+    """Connection pool and timeout settings shared by the sync and async clients"""
+    options = {
+        "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": Config.MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": Config.MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": Config.MONGO_SOCKET_TIMEOUT_MS
+    }
+    if Config.MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = Config.MONGO_MAX_IDLE_TIME_MS
+    if Config.MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = Config.MONGO_WAIT_QUEUE_TIMEOUT_MS
+    return options
+
+
+class PoolStats(ConnectionPoolListener):
+    """Connection pool event listener tracking checkout waits and connections in use"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)  # recent checkout wait times in seconds
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.open_connections = 0
+            self.pool_clears = 0
+            self.last_failure = None
+            self._waits.clear()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(self.open_connections - 1, 0)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self.last_failure = event.reason
+            if event.duration is not None:
+                self._waits.append(event.duration)
+        self._record_wait(event.duration)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            if event.duration is not None:
+                self._waits.append(event.duration)
+        self._record_wait(event.duration)
+
+    @staticmethod
+    def _record_wait(duration):
+        # Checkouts run on the requesting thread/task, so the wait belongs to its request
+        if duration is None:
+            return
+        metrics.pool_wait_seconds.observe(duration)
+        stats = current_request()
+        if stats is not None:
+            stats.add('pool_wait', duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def snapshot(self):
+        """Pool usage and checkout wait-time summary in milliseconds"""
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {
+                "max_pool_size": Config.MONGO_MAX_POOL_SIZE,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "open_connections": self.open_connections,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "last_failure": self.last_failure
+            }
+        if waits:
+            stats["wait_ms"] = {
+                "avg": round(sum(waits) / len(waits) * 1000, 3),
+                "p95": round(waits[min(int(len(waits) * 0.95), len(waits) - 1)] * 1000, 3),
+                "max": round(waits[-1] * 1000, 3),
+                "samples": len(waits)
+            }
+        return stats
+
+
+class CommandStats(CommandListener):
+    """Command listener timing every MongoDB command per command name and collection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}  # (connection, request id) -> (command name, collection)
+
+    def started(self, event):
+        command = event.command
+        target = command.get(event.command_name)
+        if event.command_name == 'getMore':
+            target = command.get('collection')
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (
+                event.command_name, target if isinstance(target, str) else '')
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed):
+        with self._lock:
+            command_name, collection = self._started.pop(
+                (event.connection_id, event.request_id), (event.command_name, ''))
+        seconds = event.duration_micros / 1e6
+        metrics.record_command(command_name, collection, seconds, failed)
+        stats = current_request()
+        if stats is not None:
+            stats.add_command(seconds)
+
+
+def event_listeners(pool_stats, command_stats):
+    """Driver listeners for a client; command timing is skipped when metrics are off"""
+    if Config.METRICS_ENABLED:
+        return [pool_stats, command_stats]
+    return [pool_stats]
+
 
 class MongoDB:
     def __init__(self):
         self.client = None
-        self.db = None
+        self._db = None
+        self._pid = None
         self.connected = False
+        self.pool_stats = PoolStats()
+        self.command_stats = CommandStats()
+        self._lock = threading.Lock()
+        self._retry_delay = 0
+        self._next_retry = 0
+        # A client inherited across fork() is unusable; rebuild it in each worker
+        os.register_at_fork(after_in_child=self._after_fork)
         self.connect()
     
-    def connect(self):
-        """Connect to MongoDB with better error handling"""
-        try:
-            print(f"🔄 Attempting to connect to MongoDB...")
-            # print(f"📍 URI: {Config.MONGODB_URI}")
-            print(f"🗄️  Database: {Config.DATABASE_NAME}")
-            
-            # Set connection timeout to avoid hanging
+    @property
+    def db(self):
+        """Database handle, creating this process's client on first use"""
+        self._ensure_client()
+        return self._db
+    
+    def _ensure_client(self):
+        if self.client is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self.client is not None and self._pid == os.getpid():
+                return
             self.client = MongoClient(
                 Config.MONGODB_URI,
-                serverSelectionTimeoutMS=5000,  # 5 second timeout
-                connectTimeoutMS=5000,
-                socketTimeoutMS=5000
+                event_listeners=event_listeners(self.pool_stats, self.command_stats),
+                **client_options()
             )
+            self._db = self.client[Config.DATABASE_NAME]
+            self._pid = os.getpid()
+    
+    def _after_fork(self):
+        # Drop the parent's client without closing it; the parent still owns its sockets
+        self.client = None
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.pool_stats.reset()
+        self.command_stats = CommandStats()
+        self._next_retry = 0
+    
+    def connect(self):
+        """Connect to MongoDB with better error handling"""
+        first_attempt = self._retry_delay == 0
+        try:
+            if first_attempt:
+                print(f"🔄 Attempting to connect to MongoDB...")
+                # print(f"📍 URI: {Config.MONGODB_URI}")
+                print(f"🗄️  Database: {Config.DATABASE_NAME}")
             
-            self.db = self.client[Config.DATABASE_NAME]
-            
-            # Test connection
+            # The client is created lazily and reconnects by itself; ping to verify
+            self._ensure_client()
             self.client.admin.command('ping')
             self.connected = True
+            self._retry_delay = 0
             print(f"✅ Successfully connected to MongoDB: {Config.DATABASE_NAME}")
             
         except Exception as e:
             self.connected = False
+            # Back off exponentially between reconnect attempts
+            self._retry_delay = min(max(self._retry_delay * 2, Config.MONGO_RECONNECT_MIN_DELAY),
+                                    Config.MONGO_RECONNECT_MAX_DELAY)
+            self._next_retry = time.monotonic() + self._retry_delay
+            if not first_attempt:
+                print(f"❌ MongoDB reconnect failed, retrying in {self._retry_delay}s: {str(e)}")
+                return
             print(f"❌ MongoDB connection failed!")
             print(f"🔧 Error details: {str(e)}")
             print(f"\n💡 Troubleshooting tips:")
@@ -45,26 +249,60 @@ class MongoDB:
             print(f"\n⚠️  The app will start but database operations will fail until MongoDB is available.")
             # Don't raise the exception - let the app start
     
-    def get_collection(self, collection_name):
-        """Get a specific collection"""
-        if not self.connected:
+    def _maybe_reconnect(self):
+        """Retry a failed connection once the backoff delay has passed"""
+        if not self.connected and time.monotonic() >= self._next_retry:
+            self.connect()
+        return self.connected
+    
+    def get_collection(self, collection_name, route=None):
+        """Get a specific collection, read through a read_routing.ReadRoute when given"""
+        if not self._maybe_reconnect():
             raise Exception("MongoDB is not connected. Please check your MongoDB server.")
-        return self.db[collection_name]
+        if route is None:
+            return self.db[collection_name]
+        return self.db.get_collection(collection_name, **route.options())
     
     def test_connection(self):
         """Test if MongoDB connection is alive"""
-        if not self.connected:
+        if not self._maybe_reconnect():
             return False
         try:
-            self.client.admin.command('ping')
+            self.db.client.admin.command('ping')
             return True
         except Exception:
             self.connected = False
             return False
     
+    def watch_changes(self, on_change):
+        """Call on_change(collection_name) for every change in the database.
+
+        Runs a change stream on a daemon thread; change streams need a replica
+        set or sharded cluster. on_change(None) means "anything may have changed"
+        (database-level events, or a gap while the stream was reconnecting).
+        """
+        def run():
+            while True:
+                try:
+                    with self.db.watch() as stream:
+                        for change in stream:
+                            on_change(change.get('ns', {}).get('coll'))
+                except OperationFailure as e:
+                    # Standalone servers cannot open change streams at all
+                    print(f"⚠️  Change stream unavailable: {str(e)}")
+                    return
+                except PyMongoError as e:
+                    print(f"⚠️  Change stream interrupted, retrying: {str(e)}")
+                    time.sleep(5)
+                on_change(None)
+
+        watcher = threading.Thread(target=run, name="mongo-change-stream", daemon=True)
+        watcher.start()
+        return watcher
+    
     def close_connection(self):
         """Close MongoDB connection"""
-        if self.client:
+        if self.client and self._pid == os.getpid():
             self.client.close()
             print("🔌 MongoDB connection closed")
 
@@ -81,5 +319,51 @@ class MongoDB:
                     doc[key] = MongoDB.serialize_doc(value)
         return doc
 
+class AsyncMongoDB:
+    """Async MongoDB access for the ASGI serving mode.
+
+    The client is created lazily on first use so it binds to the running
+    event loop rather than to whatever loop exists at import time.
+    """
+    def __init__(self):
+        self.client = None
+        self.db = None
+        self.pool_stats = PoolStats()
+        self.command_stats = CommandStats()
+    
+    def connect(self):
+        """Create the async client (no I/O happens until the first command)"""
+        self.client = AsyncMongoClient(
+            Config.MONGODB_URI,
+            event_listeners=event_listeners(self.pool_stats, self.command_stats),
+            **client_options()
+        )
+        self.db = self.client[Config.DATABASE_NAME]
+    
+    def get_collection(self, collection_name, route=None):
+        """Get a specific collection, read through a read_routing.ReadRoute when given"""
+        if self.client is None:
+            self.connect()
+        if route is None:
+            return self.db[collection_name]
+        return self.db.get_collection(collection_name, **route.options())
+    
+    async def test_connection(self):
+        """Test if MongoDB connection is alive"""
+        if self.client is None:
+            self.connect()
+        try:
+            await self.client.admin.command('ping')
+            return True
+        except Exception:
+            return False
+    
+    async def close_connection(self):
+        """Close MongoDB connection"""
+        if self.client:
+            await self.client.close()
+            self.client = None
+            self.db = None
+
 # Create global database instance
 db_instance = MongoDB()
@@ -0,0 +1,284 @@
+# index_advisor.py
+"""
+Query-shape recorder and index advisor for /query.
+
+Every executed query is reduced to a shape: the filtered fields with the
+kind of predicate applied to each (equality, range, regex, ...) plus the
+sort, with all values stripped. The first time a shape is seen (and again
+every INDEX_ADVISOR_REEXPLAIN_SECONDS) its plan is sampled with a cheap
+queryPlanner explain in the background. Executions are timed per shape so
+advice can be ranked by the total time a missing index is costing.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aggregation_policy import summarize_explain
+from config import Config
+from database import db_instance
+
+# Operators grouped by how an index can serve them
+EQUALITY_OPERATORS = {'$eq', '$in'}
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte'}
+NEGATION_OPERATORS = {'$ne', '$nin', '$not', '$exists'}
+REGEX_SPECIAL = set('.^$*+?()[]{}|\\')
+
+
+def predicate_kind(condition):
+    """Classify one field condition as eq, range, prefix, regex or negation"""
+    if hasattr(condition, 'pattern'):
+        return _regex_kind(condition.pattern, getattr(condition, 'flags', 0))
+    if not isinstance(condition, dict) or not any(str(key).startswith('$') for key in condition):
+        return 'eq'
+    operators = set(condition)
+    if '$regex' in operators:
+        return _regex_kind(condition['$regex'], condition.get('$options', ''))
+    if operators & RANGE_OPERATORS:
+        return 'range'
+    if operators & EQUALITY_OPERATORS:
+        return 'eq'
+    if operators & NEGATION_OPERATORS:
+        return 'negation'
+    return 'other'
+
+
+def _regex_kind(pattern, options):
+    """Anchored, case-sensitive literal prefixes can use an index range; other regexes cannot"""
+    pattern = getattr(pattern, 'pattern', pattern)
+    case_insensitive = 'i' in options if isinstance(options, str) else bool(options & 2)
+    if isinstance(pattern, str) and pattern.startswith('^') and not case_insensitive \
+            and len(pattern) > 1 and pattern[1] not in REGEX_SPECIAL:
+        return 'prefix'
+    return 'regex'
+
+
+def normalize_filter(filter_dict):
+    """Value-free shape of a filter: sorted (field, kind) pairs and $or branch shapes"""
+    fields = {}
+    branches = []
+
+    def walk(node):
+        for key, condition in node.items():
+            if key == '$and':
+                for clause in condition:
+                    walk(clause)
+            elif key == '$or':
+                branches.append(tuple(sorted({normalize_filter(clause) for clause in condition})))
+            elif key == '$text':
+                fields[key] = 'text'
+            elif not key.startswith('$'):
+                fields[key] = predicate_kind(condition)
+
+    walk(filter_dict or {})
+    return (tuple(sorted(fields.items())), tuple(sorted(branches)))
+
+
+def query_shape(collection_name, filter_dict, sort_fields):
+    """Hashable shape key for a query on a collection"""
+    # $meta sorts (textScore) are recorded by name; they need no index key
+    sort_shape = tuple((field, direction if isinstance(direction, int) else 'textScore')
+                       for field, direction in sort_fields or [])
+    return (collection_name, normalize_filter(filter_dict), sort_shape)
+
+
+def describe_filter_shape(filter_shape):
+    """Readable rendering of a normalized filter, e.g. {age: range, $or: [...]}"""
+    fields, branches = filter_shape
+    parts = [f"{field}: {kind}" for field, kind in fields]
+    for branch in branches:
+        parts.append("$or: [" + " | ".join(describe_filter_shape(clause) for clause in branch) + "]")
+    return "{" + ", ".join(parts) + "}"
+
+
+def suggest_indexes(filter_shape, sort_fields):
+    """Compound index keys following the equality, sort, range ordering rule.
+
+    Returns (suggestions, notes). A top-level $or needs one index per branch;
+    unanchored or case-insensitive regexes cannot seek an index and are
+    reported as notes instead.
+    """
+    fields, branches = filter_shape
+    notes = []
+
+    def keys_for(field_kinds):
+        equality = [field for field, kind in field_kinds if kind == 'eq']
+        ranges = [field for field, kind in field_kinds if kind in ('range', 'prefix')]
+        trailing = [field for field, kind in field_kinds if kind in ('negation', 'other')]
+        for field, kind in field_kinds:
+            if kind == 'regex':
+                notes.append(f"{field}: unanchored or case-insensitive regex scans the whole index; "
+                             f"consider a text index or an anchored ^prefix")
+        keys = [[field, 1] for field in equality]
+        used = set(equality)
+        for field, direction in sort_fields:
+            if field not in used and isinstance(direction, int):
+                keys.append([field, direction])
+                used.add(field)
+        for field in ranges + trailing:
+            if field not in used:
+                keys.append([field, 1])
+                used.add(field)
+        return keys
+
+    if not branches:
+        keys = keys_for(fields)
+        return ([keys] if keys else []), notes
+
+    # Every $or branch must be indexed, otherwise the whole query falls back to a scan
+    suggestions = []
+    for branch in branches:
+        for clause_fields, nested in branch:
+            if nested:
+                notes.append("nested $or inside an $or branch; suggestions cover the outer level only")
+            keys = keys_for(tuple(fields) + tuple(clause_fields))
+            if keys and keys not in suggestions:
+                suggestions.append(keys)
+    return suggestions, notes
+
+
+class IndexAdvisor:
+    """Per-shape timings and sampled plans for /query, with index suggestions"""
+
+    def __init__(self, mongo, max_shapes, reexplain_seconds):
+        self.mongo = mongo
+        self.max_shapes = max_shapes
+        self.reexplain_seconds = reexplain_seconds
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-advisor")
+        self._shapes = {}  # shape -> stats dict
+        self._lock = threading.Lock()
+
+    def record(self, collection_name, filter_dict, sort_fields, elapsed_ms, returned):
+        """Account one execution of a query and sample its plan if the shape is new or stale"""
+        shape = query_shape(collection_name, filter_dict, sort_fields)
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                if len(self._shapes) >= self.max_shapes:
+                    # Forget the cheapest shape to stay bounded
+                    del self._shapes[min(self._shapes, key=lambda key: self._shapes[key]["total_ms"])]
+                stats = self._shapes[shape] = {
+                    "executions": 0, "total_ms": 0.0, "max_ms": 0.0, "documents_returned": 0,
+                    "collection_scans": 0, "in_memory_sorts": 0, "plan": None,
+                    "explained_at": None, "explain_pending": False
+                }
+            stats["executions"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["documents_returned"] += returned
+            plan = stats["plan"]
+            if plan:
+                stats["collection_scans"] += plan["collection_scan"]
+                stats["in_memory_sorts"] += plan["in_memory_sort"]
+            needs_explain = not stats["explain_pending"] and (
+                stats["explained_at"] is None or time.monotonic() - stats["explained_at"] >= self.reexplain_seconds
+            )
+            if needs_explain:
+                stats["explain_pending"] = True
+        if needs_explain:
+            self._executor.submit(self._sample_plan, shape, collection_name, filter_dict, sort_fields)
+
+    def plan_for(self, collection_name, filter_dict, sort_fields):
+        """Known plan for a query's shape, explaining synchronously when it has not been sampled"""
+        shape = query_shape(collection_name, filter_dict, sort_fields)
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats and stats["plan"]:
+                return stats["plan"]
+        return self._explain(collection_name, filter_dict, sort_fields)
+
+    def explain_later(self, collection_name, filter_dict, sort_fields, on_plan):
+        """Explain a query on the advisor's worker and pass the plan summary to on_plan"""
+        def run():
+            try:
+                plan = self._explain(collection_name, filter_dict, sort_fields)
+            except Exception as e:
+                print(f"⚠️  Index advisor could not explain a query on {collection_name}: {e}")
+                return
+            on_plan(plan)
+        self._executor.submit(run)
+
+    def check(self, collection_name, filter_dict, sort_fields):
+        """Warning for an unindexed query on a large collection, or None"""
+        if Config.QUERY_UNINDEXED_ACTION not in ('warn', 'reject') or not (filter_dict or sort_fields):
+            return None
+        plan = self.plan_for(collection_name, filter_dict, sort_fields)
+        if not (plan["collection_scan"] or plan["in_memory_sort"]):
+            return None
+        documents = self.mongo.get_collection(collection_name).estimated_document_count()
+        if documents < Config.QUERY_UNINDEXED_MIN_DOCS:
+            return None
+        problem = "a collection scan" if plan["collection_scan"] else "an in-memory sort"
+        return (f"Query shape {describe_filter_shape(normalize_filter(filter_dict))} needs {problem} "
+                f"over ~{documents} documents; see /admin/index-advice")
+
+    def advice(self, collection_name=None, include_all=False, limit=20):
+        """Shapes ranked by total time, with suggested indexes for scans and in-memory sorts"""
+        with self._lock:
+            items = [(shape, dict(stats)) for shape, stats in self._shapes.items()]
+
+        advice = []
+        for (name, filter_shape, sort_fields), stats in items:
+            if collection_name and name != collection_name:
+                continue
+            plan = stats["plan"]
+            unindexed = bool(plan and (plan["collection_scan"] or plan["in_memory_sort"]))
+            if not include_all and not unindexed:
+                continue
+            entry = {
+                "collection": name,
+                "filter_shape": describe_filter_shape(filter_shape),
+                "sort": [[field, direction] for field, direction in sort_fields],
+                "executions": stats["executions"],
+                "total_ms": round(stats["total_ms"], 2),
+                "avg_ms": round(stats["total_ms"] / stats["executions"], 2),
+                "max_ms": round(stats["max_ms"], 2),
+                "documents_returned": stats["documents_returned"],
+                "collection_scans": stats["collection_scans"],
+                "in_memory_sorts": stats["in_memory_sorts"],
+                "plan_sampled": plan is not None,
+                "indexes_used": plan["indexes_used"] if plan else [],
+                "winning_plan_stages": plan["winning_plan_stages"] if plan else []
+            }
+            if unindexed:
+                suggestions, notes = suggest_indexes(filter_shape, sort_fields)
+                entry["suggested_indexes"] = suggestions
+                entry["notes"] = notes
+            advice.append(entry)
+
+        advice.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return advice[:limit]
+
+    def _sample_plan(self, shape, collection_name, filter_dict, sort_fields):
+        try:
+            plan = self._explain(collection_name, filter_dict, sort_fields)
+        except Exception as e:
+            print(f"⚠️  Index advisor could not explain a query on {collection_name}: {e}")
+            plan = None
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                return
+            stats["explain_pending"] = False
+            stats["explained_at"] = time.monotonic()
+            if plan:
+                # Executions recorded before the plan was known count toward its totals
+                if stats["plan"] is None:
+                    stats["collection_scans"] = stats["executions"] if plan["collection_scan"] else 0
+                    stats["in_memory_sorts"] = stats["executions"] if plan["in_memory_sort"] else 0
+                stats["plan"] = plan
+
+    def _explain(self, collection_name, filter_dict, sort_fields):
+        command = {'find': collection_name, 'filter': filter_dict or {}}
+        if sort_fields:
+            command['sort'] = dict(sort_fields)
+        explain = self.mongo.db.command('explain', command, verbosity='queryPlanner')
+        summary = summarize_explain(explain)
+        return {
+            "collection_scan": summary["collection_scan"],
+            "in_memory_sort": summary["in_memory_sort"],
+            "indexes_used": summary["indexes_used"],
+            "winning_plan_stages": summary["winning_plan_stages"]
+        }
+
+
+# Create global index advisor instance
+index_advisor = IndexAdvisor(db_instance, Config.INDEX_ADVISOR_MAX_SHAPES, Config.INDEX_ADVISOR_REEXPLAIN_SECONDS)
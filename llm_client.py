@@ -0,0 +1,198 @@
+# llm_client.py
+"""
+Outbound client for the generative model API.
+
+Keeps a keep-alive connection pool, applies connect/read timeouts, retries
+transient failures with exponential backoff and full jitter, bounds the
+number of concurrent calls and caches responses by a hash of the
+(model, payload) pair.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import MemoryBackend
+from config import Config
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Transient transport failures, including a pooled keep-alive connection dropped mid-response
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+ASYNC_RETRY_EXCEPTIONS = (httpx.NetworkError, httpx.TimeoutException, httpx.RemoteProtocolError)
+
+
+class ModelClientBusy(Exception):
+    """Raised when no call slot frees up within LLM_QUEUE_TIMEOUT"""
+
+
+def response_cache_key(model, payload):
+    """Content hash identifying a (model, payload) request"""
+    body = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(f"{model}\x00{body}".encode('utf-8')).hexdigest()
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, honouring a server Retry-After when given"""
+    if retry_after:
+        try:
+            return min(float(retry_after), Config.LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    ceiling = min(Config.LLM_BACKOFF_BASE * (2 ** attempt), Config.LLM_BACKOFF_MAX)
+    return random.uniform(0, ceiling)
+
+
+class ModelClient:
+    """Pooled, retrying, cached client used by the Flask routes"""
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.LLM_MAX_CONCURRENCY)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self._slots = threading.BoundedSemaphore(Config.LLM_MAX_CONCURRENCY)
+        self.cache = MemoryBackend(Config.LLM_CACHE_MAX_ENTRIES)
+
+    def generate(self, url, model, payload):
+        """POST a payload to the model; returns (response json, served_from_cache)"""
+        key = response_cache_key(model, payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached, True
+
+        if not self._slots.acquire(timeout=Config.LLM_QUEUE_TIMEOUT):
+            raise ModelClientBusy("Too many model calls in flight, try again later")
+        try:
+            result = self._post_with_retries(url, payload)
+        finally:
+            self._slots.release()
+
+        if Config.LLM_CACHE_TTL:
+            self.cache.set(key, result, Config.LLM_CACHE_TTL)
+        return result, False
+
+    def _post_with_retries(self, url, payload):
+        for attempt in range(Config.LLM_MAX_RETRIES + 1):
+            try:
+                response = self.session.post(
+                    url, json=payload,
+                    timeout=(Config.LLM_CONNECT_TIMEOUT, Config.LLM_READ_TIMEOUT)
+                )
+                if response.status_code in RETRY_STATUSES and attempt < Config.LLM_MAX_RETRIES:
+                    time.sleep(backoff_delay(attempt, response.headers.get('Retry-After')))
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except RETRY_EXCEPTIONS:
+                if attempt >= Config.LLM_MAX_RETRIES:
+                    raise
+                time.sleep(backoff_delay(attempt))
+
+
+class AsyncModelClient:
+    """Async counterpart used by the ASGI routes; shares the response cache"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.http = httpx.AsyncClient(
+            timeout=httpx.Timeout(Config.LLM_READ_TIMEOUT, connect=Config.LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=Config.LLM_MAX_CONCURRENCY,
+                                max_keepalive_connections=Config.LLM_MAX_CONCURRENCY)
+        )
+        self._slots = asyncio.Semaphore(Config.LLM_MAX_CONCURRENCY)
+
+    async def generate(self, url, model, payload):
+        """POST a payload to the model; returns (response json, served_from_cache)"""
+        key = response_cache_key(model, payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached, True
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=Config.LLM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ModelClientBusy("Too many model calls in flight, try again later")
+        try:
+            result = await self._post_with_retries(url, payload)
+        finally:
+            self._slots.release()
+
+        if Config.LLM_CACHE_TTL:
+            self.cache.set(key, result, Config.LLM_CACHE_TTL)
+        return result, False
+
+    async def _post_with_retries(self, url, payload):
+        for attempt in range(Config.LLM_MAX_RETRIES + 1):
+            try:
+                response = await self.http.post(url, json=payload)
+                if response.status_code in RETRY_STATUSES and attempt < Config.LLM_MAX_RETRIES:
+                    await asyncio.sleep(backoff_delay(attempt, response.headers.get('Retry-After')))
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except ASYNC_RETRY_EXCEPTIONS:
+                if attempt >= Config.LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+
+    async def close(self):
+        await self.http.aclose()
+
+
+class JobStore:
+    """In-process background jobs for long analyses, expired after LLM_JOB_TTL"""
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn in the background and return the new job id"""
+        self._expire()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {"job_id": job_id, "status": "pending", "created_at": time.time()}
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            result = fn(*args, **kwargs)
+            self._update(job_id, status="succeeded", result=result, finished_at=time.time())
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _expire(self):
+        cutoff = time.time() - Config.LLM_JOB_TTL
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items()
+                           if job.get("finished_at", time.time()) < cutoff]:
+                del self._jobs[job_id]
+
+
+# Create global model client and job store instances
+model_client = ModelClient()
+analysis_jobs = JobStore(Config.LLM_JOB_WORKERS)
@@ -0,0 +1,347 @@
+# metrics.py
+"""
+Request instrumentation and Prometheus text exposition.
+
+Each request gets a RequestStats in a context variable, so code running on
+its behalf (the views, the pymongo event listeners, threads started with
+asyncio.to_thread) can add to it without passing it around. Time is split
+into phases:
+
+  parse      request parameters turned into a filter, pipeline or spec
+  pool_wait  waiting to check a connection out of the driver's pool
+  mongo      MongoDB command round trips, as timed by the CommandListener
+  serialize  encoding documents to JSON / NDJSON
+  write      sending the body to the client, minus the phases above
+
+Work handed to other worker pools (partitioned scans, bulk batches) is
+counted in the per-command metrics but not attributed to the request.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import Config
+
+PHASES = ('parse', 'pool_wait', 'mongo', 'serialize', 'write')
+
+# Collection label for requests beyond METRICS_MAX_COLLECTIONS distinct names
+OTHER_COLLECTION = '_other'
+
+_current = ContextVar('request_stats', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """Monotonic counter per label set"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets or Config.METRICS_BUCKETS))
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        for label_values, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                le = f'le="{_format_number(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {entry[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_number(round(entry[-2], 6))}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {entry[-1]}"
+
+
+class RequestStats:
+    """Timings and counters for one request"""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.route = None  # route pattern, e.g. /query/<collection_name>
+        self.collection = None
+        self.status = None
+        self.started = time.perf_counter()
+        self.duration = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.documents = 0
+        self.bytes_sent = 0
+        self.commands = 0
+        self.query = None  # (collection, filter, sort) of the main query, for the slow-request log
+        self._responded_at = None
+        self._phases_at_response = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, phase_name, seconds):
+        with self._lock:
+            self.phases[phase_name] += seconds
+
+    def add_documents(self, count):
+        with self._lock:
+            self.documents += count
+
+    def add_command(self, seconds):
+        with self._lock:
+            self.phases['mongo'] += seconds
+            self.commands += 1
+
+    def io_seconds(self):
+        return self.phases['mongo'] + self.phases['pool_wait']
+
+    def responded(self):
+        """The handler has returned; time from here to finish() is spent writing the body"""
+        self._responded_at = time.perf_counter()
+        self._phases_at_response = sum(self.phases.values())
+
+    def finish(self):
+        now = time.perf_counter()
+        if self._responded_at is not None:
+            # Streamed bodies keep reading and encoding while they are written
+            overlap = sum(self.phases.values()) - self._phases_at_response
+            self.phases['write'] += max(now - self._responded_at - overlap, 0.0)
+        self.duration = now - self.started
+
+
+def begin_request(method, path):
+    """Start tracking a request in the current context"""
+    stats = RequestStats(method, path)
+    _current.set(stats)
+    return stats
+
+
+def current_request():
+    """Stats of the request being served in this context, or None"""
+    return _current.get()
+
+
+def end_request():
+    _current.set(None)
+
+
+def note_query(collection_name, filter_dict, sort_fields=None):
+    """Remember the request's main query so a slow request can log its shape"""
+    stats = _current.get()
+    if stats is not None:
+        stats.query = (collection_name, filter_dict, sort_fields)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current request's phase.
+
+    MongoDB round trips and pool waits inside the block are already counted
+    by the driver listeners, so they are left out.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    io_before = stats.io_seconds()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (stats.io_seconds() - io_before)
+        stats.add(name, max(elapsed, 0.0))
+
+
+class MetricsMiddleware:
+    """WSGI middleware tracking each request from the first call to the body being closed"""
+
+    def __init__(self, wsgi_app, on_finish):
+        self.wsgi_app = wsgi_app
+        self.on_finish = on_finish
+
+    def __call__(self, environ, start_response):
+        stats = begin_request(environ.get('REQUEST_METHOD', ''), environ.get('PATH_INFO', ''))
+
+        def record_status(status, headers, exc_info=None):
+            stats.status = int(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, record_status)
+        except BaseException:
+            stats.status = stats.status or 500
+            self._finish(stats)
+            raise
+        stats.responded()
+        return _MeteredBody(body, stats, self._finish)
+
+    def _finish(self, stats):
+        stats.finish()
+        end_request()
+        self.on_finish(stats)
+
+
+class _MeteredBody:
+    """Counts the bytes of a WSGI response body and finishes the request on close"""
+
+    def __init__(self, body, stats, on_close):
+        self.body = body
+        self.stats = stats
+        self.on_close = on_close
+
+    def __iter__(self):
+        # Servers may iterate the body outside the context the app was called in
+        _current.set(self.stats)
+        for chunk in self.body:
+            self.stats.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.on_close(self.stats)
+
+
+class MetricsRegistry:
+    """Request, phase and MongoDB command metrics rendered in Prometheus text format"""
+
+    def __init__(self, max_collections):
+        self.max_collections = max_collections
+        self._collections = set()
+        self._lock = threading.Lock()
+        self.requests = Counter(
+            'http_requests_total', 'HTTP requests by route, collection and status',
+            ('method', 'route', 'collection', 'status'))
+        self.request_seconds = Histogram(
+            'http_request_duration_seconds', 'Wall time from request start to the last byte sent',
+            ('method', 'route', 'collection'))
+        self.phase_seconds = Histogram(
+            'http_request_phase_seconds', 'Wall time per request phase (parse, pool_wait, mongo, serialize, write)',
+            ('route', 'collection', 'phase'))
+        self.documents = Counter(
+            'http_response_documents_total', 'Documents returned in response bodies',
+            ('route', 'collection'))
+        self.bytes_sent = Counter(
+            'http_response_bytes_total', 'Response body bytes sent',
+            ('route', 'collection'))
+        self.command_seconds = Histogram(
+            'mongodb_command_duration_seconds', 'MongoDB command round trips reported by the driver',
+            ('command', 'collection'))
+        self.command_failures = Counter(
+            'mongodb_command_failures_total', 'MongoDB commands that failed',
+            ('command', 'collection'))
+        self.pool_wait_seconds = Histogram(
+            'mongodb_pool_wait_seconds', 'Time spent waiting to check out a pooled connection')
+        self.slow_requests = Counter(
+            'http_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS',
+            ('route', 'collection'))
+        self.coalesced = Counter(
+            'http_coalesced_requests_total',
+            'Single-flight outcomes: leader executed, follower shared its response, timeout ran alone',
+            ('route', 'role'))
+        self._metrics = [self.requests, self.request_seconds, self.phase_seconds, self.documents,
+                         self.bytes_sent, self.command_seconds, self.command_failures,
+                         self.pool_wait_seconds, self.slow_requests, self.coalesced]
+
+    def collection_label(self, name):
+        """Collection names are client supplied; cap how many become label values"""
+        if not name:
+            return ''
+        with self._lock:
+            if name in self._collections:
+                return name
+            if len(self._collections) < self.max_collections:
+                self._collections.add(name)
+                return name
+        return OTHER_COLLECTION
+
+    def record_request(self, stats):
+        """Account a finished request"""
+        route = stats.route or 'unmatched'
+        collection = self.collection_label(stats.collection)
+        self.requests.inc(stats.method, route, collection, str(stats.status))
+        self.request_seconds.observe(stats.duration, stats.method, route, collection)
+        for name, seconds in stats.phases.items():
+            self.phase_seconds.observe(seconds, route, collection, name)
+        if stats.documents:
+            self.documents.inc(route, collection, amount=stats.documents)
+        if stats.bytes_sent:
+            self.bytes_sent.inc(route, collection, amount=stats.bytes_sent)
+
+    def record_command(self, command, collection, seconds, failed=False):
+        collection = self.collection_label(collection)
+        self.command_seconds.observe(seconds, command, collection)
+        if failed:
+            self.command_failures.inc(command, collection)
+
+    def render(self, extra=()):
+        """Prometheus text format; extra holds (name, type, help, value) samples read at scrape time"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for name, kind, help_text, value in extra:
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {_format_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Create global metrics registry instance
+metrics = MetricsRegistry(Config.METRICS_MAX_COLLECTIONS)
@@ -0,0 +1,274 @@
+# negotiation.py
+"""
+Response negotiation: body encoding, compression and conditional GET.
+
+Clients choose the body encoding with Accept (JSON unless they prefer BSON
+or MessagePack) and the compression with Accept-Encoding; codings the
+client rates equally are tried in COMPRESSION_ENCODINGS order. Bodies under
+COMPRESSION_MIN_BYTES go out uncompressed, streamed bodies are compressed
+chunk by chunk as they are produced.
+
+Full GET responses carry a strong ETag hashed from the encoded, uncompressed
+body and suffixed with the content coding, so every representation has its
+own tag. A matching If-None-Match is answered with 304 after the handler
+ran, which saves the transfer, or before it runs, which also saves the query
+and the encoding: the validator index remembers the last tag served per
+request together with the change marker of the collection it read, and
+trusts it while the marker is unchanged and the endpoint's result cache TTL
+has not passed, i.e. within the staleness the result cache already allows.
+"""
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextvars import ContextVar
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+from cache import DATABASE_SCOPE
+from config import Config
+from metrics import current_request, phase
+from serialization import BSON_MIMETYPE, JSON_MIMETYPE, MSGPACK_MIMETYPE, msgpack
+
+# brotli and zstandard are optional; codings whose library is missing are not offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# MessagePack has no registered type; accept the spellings clients use
+MSGPACK_ALIASES = (MSGPACK_MIMETYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+
+COMPRESSIBLE_MIMETYPES = {
+    JSON_MIMETYPE, NDJSON_MIMETYPE, BSON_MIMETYPE, MSGPACK_MIMETYPE,
+    'application/javascript', 'image/svg+xml'
+}
+
+
+def _mimetype_offers():
+    offers = [JSON_MIMETYPE]
+    if 'bson' in Config.BINARY_ENCODINGS:
+        offers.append(BSON_MIMETYPE)
+    if 'msgpack' in Config.BINARY_ENCODINGS and msgpack is not None:
+        offers.extend(MSGPACK_ALIASES)
+    return offers
+
+
+def _encoding_offers():
+    available = {'gzip': True, 'br': brotli is not None, 'zstd': zstandard is not None}
+    return [encoding for encoding in Config.COMPRESSION_ENCODINGS if available.get(encoding)]
+
+
+_MIMETYPE_OFFERS = _mimetype_offers()
+_ENCODING_OFFERS = _encoding_offers() if Config.COMPRESSION_ENABLED else []
+
+# Body encoding negotiated for the request being served (native ASGI routes)
+_mimetype = ContextVar('response_mimetype', default=JSON_MIMETYPE)
+
+
+def negotiate_mimetype(accept_header):
+    """Body encoding for an Accept header: JSON unless the client prefers BSON or MessagePack"""
+    if not accept_header or len(_MIMETYPE_OFFERS) == 1:
+        return JSON_MIMETYPE
+    best = parse_accept_header(accept_header, MIMEAccept).best_match(_MIMETYPE_OFFERS, default=JSON_MIMETYPE)
+    return MSGPACK_MIMETYPE if best in MSGPACK_ALIASES else best
+
+
+def prefers_ndjson(accept_header):
+    """Whether an Accept header ranks a newline-delimited JSON stream above a JSON document"""
+    best = parse_accept_header(accept_header, MIMEAccept).best_match([JSON_MIMETYPE, NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def binary_encodings_offered():
+    return len(_MIMETYPE_OFFERS) > 1
+
+
+def use_mimetype(mimetype):
+    """Encode this context's JSON responses as mimetype; returns a token for reset_mimetype"""
+    return _mimetype.set(mimetype)
+
+
+def reset_mimetype(token):
+    _mimetype.reset(token)
+
+
+def current_mimetype():
+    return _mimetype.get()
+
+
+def negotiate_encoding(accept_encoding):
+    """Content coding for an Accept-Encoding header, or None for identity"""
+    if not accept_encoding or not _ENCODING_OFFERS:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    best, best_quality = None, 0
+    for encoding in _ENCODING_OFFERS:
+        quality = accepted.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(mimetype):
+    return bool(_ENCODING_OFFERS) and mimetype is not None and (
+        mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+class _BrotliCompressor:
+    """brotli's streaming compressor behind zlib's compress()/flush() interface"""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=Config.BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def _compressor(encoding):
+    if encoding == 'br':
+        return _BrotliCompressor()
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=Config.ZSTD_LEVEL).compressobj()
+    # wbits 31 writes the gzip header and trailer
+    return zlib.compressobj(Config.GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def compress(body, encoding):
+    """Compress a whole body; the time counts as serialization"""
+    compressor = _compressor(encoding)
+    with phase('serialize'):
+        return compressor.compress(body) + compressor.flush()
+
+
+def _encode_chunk(chunk):
+    return chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+
+def compress_chunks(chunks, encoding):
+    """Compress a streamed body as it is produced"""
+    compressor = _compressor(encoding)
+    stats = current_request()
+    elapsed = 0.0
+    try:
+        for chunk in chunks:
+            started = time.perf_counter()
+            data = compressor.compress(_encode_chunk(chunk))
+            elapsed += time.perf_counter() - started
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        if stats is not None:
+            stats.add('serialize', elapsed)
+
+
+async def compress_chunks_async(chunks, encoding):
+    """Async counterpart of compress_chunks for Starlette streaming bodies"""
+    compressor = _compressor(encoding)
+    stats = current_request()
+    elapsed = 0.0
+    try:
+        async for chunk in chunks:
+            started = time.perf_counter()
+            data = compressor.compress(_encode_chunk(chunk))
+            elapsed += time.perf_counter() - started
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'aclose'):
+            await chunks.aclose()
+        if stats is not None:
+            stats.add('serialize', elapsed)
+
+
+def body_tag(body):
+    """Strong entity tag (unquoted) for an encoded, uncompressed body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def representation_tag(tag, encoding):
+    """Each content coding is its own representation and gets its own tag"""
+    return f"{tag}-{encoding}" if encoding else tag
+
+
+def etag_matches(if_none_match, tag):
+    """If-None-Match uses the weak comparison, and * matches any current representation"""
+    return bool(if_none_match) and parse_etags(if_none_match).contains_weak(tag)
+
+
+class ValidatorIndex:
+    """Last ETag served per request, valid while the collection it read is unchanged"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.counters = {"not_modified_early": 0, "not_modified": 0, "tagged": 0}
+        self._entries = OrderedDict()  # request key -> (expires_at, scope, marker, tag)
+        self._generations = {}  # scope -> changes seen
+        self._epoch = 0  # changes that may have touched any collection
+        self._lock = threading.Lock()
+
+    def marker(self, scope):
+        """Change marker of a collection (or DATABASE_SCOPE); take it before reading"""
+        with self._lock:
+            return self._epoch, self._generations.get(scope, 0)
+
+    def changed(self, collection_name=None):
+        """A collection changed (None: anything may have); database-wide responses change with it"""
+        with self._lock:
+            if collection_name is None:
+                self._epoch += 1
+                self._entries.clear()
+                return
+            for scope in (collection_name, DATABASE_SCOPE):
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+
+    def remember(self, key, scope, marker, tag, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, scope, marker, tag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def lookup(self, key):
+        """The tag last served for key, or None when it may be stale"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, scope, marker, tag = entry
+            if expires_at <= time.monotonic() or marker != (self._epoch, self._generations.get(scope, 0)):
+                del self._entries[key]
+                return None
+            return tag
+
+    def count(self, outcome):
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": Config.ETAG_ENABLED,
+                "entries": len(self._entries),
+                "compression": _ENCODING_OFFERS,
+                "body_encodings": [mimetype for mimetype in _MIMETYPE_OFFERS if mimetype not in MSGPACK_ALIASES[1:]],
+                **self.counters
+            }
+
+
+# Create global validator index instance
+validators = ValidatorIndex(Config.ETAG_MAX_ENTRIES)
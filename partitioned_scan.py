@@ -0,0 +1,234 @@
+# partitioned_scan.py
+"""
+Parallel partitioned reads for large exports and streaming aggregations.
+
+A collection is split into contiguous _id ranges. Boundaries come from
+quantiles of a $sample of _ids (cheap, splitVector-style) or from
+$bucketAuto over the matching _ids (exact, but reads every _id). Each range
+is read by its own cursor on a worker from a shared, bounded pool, and the
+documents are merged into one stream:
+
+  unordered  batches are yielded as soon as any partition produces them
+  ordered    partitions are drained in _id order while later ones prefetch
+             (_ids of another BSON type than the boundaries come last)
+
+Every partition buffers at most SCAN_QUEUE_BATCHES batches, so memory is
+bounded no matter how large the result is. Closing the generator (e.g. the
+client disconnects) stops all workers.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from bson import Binary, Decimal128, Int64, ObjectId
+from config import Config
+
+BOUNDARY_METHODS = ('sample', 'bucketAuto')
+
+# Stages that transform documents one at a time, so running them per _id range
+# and concatenating the output equals running them once
+PARTITION_SAFE_STAGES = {
+    '$match', '$project', '$addFields', '$set', '$unset', '$replaceRoot', '$replaceWith',
+    '$unwind', '$lookup', '$graphLookup', '$redact'
+}
+
+# Range comparisons only match _ids of the boundary's type, so documents whose
+# _id has another BSON type get a partition of their own
+BOUNDARY_TYPES = {
+    ObjectId: 'objectId', str: 'string', int: 'number', Int64: 'number', float: 'number',
+    Decimal128: 'number', datetime: 'date', Binary: 'binData'
+}
+
+# Partition end marker on a queue
+_DONE = object()
+
+
+def partition_safe(pipeline):
+    """Whether an aggregation pipeline can be split by _id range"""
+    return all(isinstance(stage, dict) and next(iter(stage), None) in PARTITION_SAFE_STAGES
+               for stage in pipeline)
+
+
+def partition_filters(boundaries):
+    """_id conditions that together match every document exactly once.
+
+    Consecutive half-open ranges between the boundaries, plus one partition
+    for _ids of any other BSON type. No boundaries means one partition ({}).
+    """
+    if not boundaries:
+        return [{}]
+    edges = [None] + list(boundaries) + [None]
+    filters = []
+    for lower, upper in zip(edges[:-1], edges[1:]):
+        condition = {}
+        if lower is not None:
+            condition['$gte'] = lower
+        if upper is not None:
+            condition['$lt'] = upper
+        filters.append({'_id': condition})
+    filters.append({'_id': {'$not': {'$type': BOUNDARY_TYPES[type(boundaries[0])]}}})
+    return filters
+
+
+def with_partition(filter_dict, partition):
+    if not partition:
+        return filter_dict
+    if not filter_dict:
+        return partition
+    return {'$and': [filter_dict, partition]}
+
+
+def partition_boundaries(collection, filter_dict, partitions, method=None):
+    """Up to partitions - 1 ascending _id split points for the matching documents"""
+    method = method or Config.SCAN_BOUNDARY_METHOD
+    if method not in BOUNDARY_METHODS:
+        raise ValueError(f"SCAN_BOUNDARY_METHOD must be one of: {', '.join(BOUNDARY_METHODS)}")
+    if partitions < 2:
+        return []
+
+    if method == 'bucketAuto':
+        buckets = collection.aggregate([
+            {'$match': filter_dict or {}},
+            {'$bucketAuto': {'groupBy': '$_id', 'buckets': partitions}}
+        ], allowDiskUse=True)
+        # Each bucket's min starts a range; the first range is open below
+        return usable_boundaries([bucket['_id']['min'] for bucket in buckets][1:])
+
+    # Sample several _ids per partition and take evenly spaced quantiles
+    sample_size = partitions * Config.SCAN_SAMPLES_PER_PARTITION
+    pipeline = [{'$sample': {'size': sample_size}}, {'$project': {'_id': 1}}, {'$sort': {'_id': 1}}]
+    if filter_dict:
+        pipeline.insert(0, {'$match': filter_dict})
+    ids = [doc['_id'] for doc in collection.aggregate(pipeline, allowDiskUse=True)]
+    if len(ids) < partitions:
+        return []
+    step = len(ids) / partitions
+    boundaries = []
+    for i in range(1, partitions):
+        value = ids[int(i * step)]
+        if not boundaries or value != boundaries[-1]:
+            boundaries.append(value)
+    return usable_boundaries(boundaries)
+
+
+def usable_boundaries(boundaries):
+    """Boundaries only split cleanly when they share one comparable BSON type"""
+    kinds = {BOUNDARY_TYPES.get(type(value)) for value in boundaries}
+    if len(kinds) != 1 or None in kinds:
+        return []
+    return boundaries
+
+
+class PartitionedScanner:
+    """Reads _id ranges on a shared worker pool and merges them into one stream"""
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="partition-scan")
+
+    def find(self, collection, filter_dict=None, projection=None, partitions=None, ordered=False):
+        """Documents matching a filter, read in parallel _id ranges"""
+        ranges = self._partitions(collection, filter_dict, partitions)
+
+        def open_cursor(partition):
+            cursor = collection.find(with_partition(filter_dict, partition), projection)
+            if ordered:
+                cursor = cursor.sort('_id', 1)
+            return cursor.batch_size(Config.EXPORT_BATCH_SIZE)
+
+        return self._merge(ranges, open_cursor, ordered)
+
+    def aggregate(self, collection, pipeline, partitions=None, ordered=False, **options):
+        """Run a partition-safe pipeline once per _id range; the range is matched first"""
+        if not partition_safe(pipeline):
+            raise ValueError("Pipeline has stages that cannot be split by _id range "
+                             f"(allowed: {', '.join(sorted(PARTITION_SAFE_STAGES))})")
+        # A leading $match narrows the boundary sample to the documents that will be read
+        leading = pipeline[0]['$match'] if pipeline and '$match' in pipeline[0] else None
+        ranges = self._partitions(collection, leading, partitions)
+
+        def open_cursor(partition):
+            stages = list(pipeline)
+            if ordered:
+                stages.insert(0, {'$sort': {'_id': 1}})
+            if partition:
+                stages.insert(0, {'$match': partition})
+            return collection.aggregate(stages, batchSize=Config.EXPORT_BATCH_SIZE, **options)
+
+        return self._merge(ranges, open_cursor, ordered)
+
+    def _partitions(self, collection, filter_dict, partitions):
+        partitions = max(1, min(partitions or Config.SCAN_PARTITIONS, Config.SCAN_MAX_PARTITIONS))
+        return partition_filters(partition_boundaries(collection, filter_dict, partitions))
+
+    def _merge(self, ranges, open_cursor, ordered):
+        stop = threading.Event()
+        if ordered:
+            queues = [queue.Queue(maxsize=Config.SCAN_QUEUE_BATCHES) for _ in ranges]
+        else:
+            shared = queue.Queue(maxsize=Config.SCAN_QUEUE_BATCHES * len(ranges))
+            queues = [shared] * len(ranges)
+
+        def generate():
+            # Workers start with the first read, so an unconsumed stream holds no threads.
+            # Submitted in range order, so ordered scans always have their next partition running
+            for partition, out in zip(ranges, queues):
+                self._executor.submit(self._read_partition, open_cursor, partition, out, stop)
+            try:
+                if ordered:
+                    for out in queues:
+                        yield from self._drain(out, 1)
+                else:
+                    yield from self._drain(queues[0], len(ranges))
+            finally:
+                stop.set()
+
+        return generate()
+
+    @staticmethod
+    def _drain(out, producers):
+        """Yield documents from a queue until every producer has finished"""
+        finished = 0
+        while finished < producers:
+            item = out.get()
+            if item is _DONE:
+                finished += 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield from item
+
+    @staticmethod
+    def _read_partition(open_cursor, partition, out, stop):
+        def put(item):
+            # Wait for room, but give up as soon as the consumer has gone away
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        cursor = None
+        try:
+            cursor = open_cursor(partition)
+            batch = []
+            for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= Config.EXPORT_BATCH_SIZE:
+                    if not put(batch):
+                        return
+                    batch = []
+            if batch and not put(batch):
+                return
+            put(_DONE)
+        except Exception as e:
+            if put(e):
+                put(_DONE)
+        finally:
+            if cursor is not None:
+                cursor.close()
+
+
+# Create global partitioned scanner instance
+partitioned_scanner = PartitionedScanner(Config.SCAN_WORKERS)
@@ -0,0 +1,227 @@
+# query_compiler.py
+"""
+Compiles /query filter parameters (field=value, field__op=value) into a
+MongoDB filter.
+
+Values are coerced once, using the field types recorded in the collection's
+stored schema profile: a string field keeps "12" as a string, and an int
+field turns it into 12. Fields the profile does not know fall back to the
+original best-guess parse_value. Operators on the same field are merged,
+so age__gte=18&age__lte=65 yields {'age': {'$gte': 18, '$lte': 65}}.
+
+Compiled filters are memoized per (collection, normalized parameters) and
+shared between requests; treat them as read-only.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import InvalidOperation
+from bson import Decimal128, ObjectId
+from bson.errors import InvalidId
+from config import Config
+from schema_profiler import schema_profiler
+
+# Query parameters that are not field filters
+RESERVED_PARAMS = frozenset(['limit', 'skip', 'sort', 'fields', 'search', 'search_mode',
+                             'after', 'before', 'paginate', 'count', 'parallel', 'ordered',
+                             'read_preference', 'read_preference_tags', 'max_staleness_seconds', 'read_concern'])
+
+OPERATORS = {
+    'gte': '$gte', 'lte': '$lte', 'gt': '$gt', 'lt': '$lt', 'ne': '$ne',
+    'in': '$in', 'nin': '$nin', 'regex': '$regex', 'exists': '$exists'
+}
+LIST_OPERATORS = {'in', 'nin'}
+
+COERCION_ERRORS = (ValueError, TypeError, InvalidId, InvalidOperation)
+
+
+def parse_value(value):
+    """Parse string value to appropriate type"""
+    if not isinstance(value, str):
+        return value
+
+    # Try to parse as ObjectId
+    if len(value) == 24 and re.match(r'^[0-9a-fA-F]{24}$', value):
+        try:
+            return ObjectId(value)
+        except:
+            pass
+
+    # Try to parse as integer
+    if value.isdigit() or (value.startswith('-') and value[1:].isdigit()):
+        return int(value)
+
+    # Try to parse as float
+    try:
+        if '.' in value:
+            return float(value)
+    except ValueError:
+        pass
+
+    # Try to parse as boolean
+    if value.lower() in ['true', 'false']:
+        return value.lower() == 'true'
+
+    # Try to parse as datetime (ISO format)
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        pass
+
+    # Return as string
+    return value
+
+
+def _to_bool(value):
+    lowered = value.lower()
+    if lowered not in ('true', 'false'):
+        raise ValueError(value)
+    return lowered == 'true'
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+# Schema profile type names -> coercion from the query-string value
+COERCERS = {
+    'str': str,
+    'int': int,
+    'Int64': int,
+    'float': float,
+    'bool': _to_bool,
+    'datetime': _to_datetime,
+    'ObjectId': ObjectId,
+    'Decimal128': Decimal128,
+}
+
+
+def coerce_value(field, value, types):
+    """Convert a value to the first of the field's observed types it parses as"""
+    candidates = [name for name in types or () if name in COERCERS]
+    if not candidates:
+        return parse_value(value)
+    for name in candidates:
+        try:
+            return COERCERS[name](value)
+        except COERCION_ERRORS:
+            continue
+    raise ValueError(f"Invalid value '{value}' for field '{field}' (expected {'/'.join(candidates)})")
+
+
+def compile_filter_params(params, field_types):
+    """Compile (key, value) filter parameters into a MongoDB filter"""
+    filter_dict = {}
+    operator_fields = set()  # fields whose condition is an operator document
+
+    for key, value in params:
+        field, _, operator = key.partition('__')
+        if operator and operator not in OPERATORS:
+            # Unknown operator, treat as regular field
+            field, operator = key, ''
+        types = field_types.get(field)
+
+        if not operator:
+            condition = coerce_value(field, value, types)
+            if field in operator_fields:
+                filter_dict[field]['$eq'] = condition
+            else:
+                filter_dict[field] = condition
+            continue
+
+        if operator in LIST_OPERATORS:
+            # Handle comma-separated values
+            operand = {OPERATORS[operator]: [coerce_value(field, v.strip(), types) for v in value.split(',')]}
+        elif operator == 'regex':
+            operand = {'$regex': value, '$options': 'i'}
+        elif operator == 'exists':
+            operand = {'$exists': value.lower() == 'true'}
+        else:
+            operand = {OPERATORS[operator]: coerce_value(field, value, types)}
+
+        # Combine operators on the same field instead of overwriting them
+        if field in operator_fields:
+            filter_dict[field].update(operand)
+        elif field in filter_dict:
+            filter_dict[field] = {'$eq': filter_dict[field], **operand}
+            operator_fields.add(field)
+        else:
+            filter_dict[field] = operand
+            operator_fields.add(field)
+
+    return filter_dict
+
+
+class QueryCompiler:
+    """Memoized filter compilation with per-collection type hints"""
+
+    def __init__(self, profiler, cache_size, hints_ttl):
+        self.profiler = profiler
+        self.cache_size = cache_size
+        self.hints_ttl = hints_ttl
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()  # (collection, params) -> compiled filter
+        self._hints = {}  # collection -> (loaded_at, field types)
+        self._lock = threading.Lock()
+
+    def compile(self, collection_name, args):
+        """Filter for the request's filter parameters (read-only, possibly shared)"""
+        params = tuple(sorted((key, value) for key, value in args.items() if key not in RESERVED_PARAMS))
+        field_types = self.field_types(collection_name)
+        key = (collection_name, params)
+        with self._lock:
+            compiled = self._plans.get(key)
+            if compiled is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        compiled = compile_filter_params(params, field_types)
+        with self._lock:
+            self._plans[key] = compiled
+            while len(self._plans) > self.cache_size:
+                self._plans.popitem(last=False)
+        return compiled
+
+    def hints_fresh(self, collection_name):
+        """Whether field types are cached, i.e. compile() will not read the database"""
+        if not Config.QUERY_TYPE_HINTS:
+            return True
+        with self._lock:
+            entry = self._hints.get(collection_name)
+        return entry is not None and time.monotonic() - entry[0] < self.hints_ttl
+
+    def field_types(self, collection_name):
+        if not Config.QUERY_TYPE_HINTS:
+            return {}
+        with self._lock:
+            entry = self._hints.get(collection_name)
+            if entry and time.monotonic() - entry[0] < self.hints_ttl:
+                return entry[1]
+
+        try:
+            types = self.profiler.field_types(collection_name)
+        except Exception as e:
+            print(f"⚠️  No type hints for {collection_name}: {e}")
+            types = entry[1] if entry else {}
+
+        with self._lock:
+            if entry is None or entry[1] != types:
+                # Plans compiled with the old hints may have coerced values differently
+                for key in [k for k in self._plans if k[0] == collection_name]:
+                    del self._plans[key]
+            self._hints[collection_name] = (time.monotonic(), types)
+        return types
+
+    def stats(self):
+        with self._lock:
+            return {"plans": len(self._plans), "max_plans": self.cache_size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+# Create global query compiler instance
+query_compiler = QueryCompiler(schema_profiler, Config.QUERY_PLAN_CACHE_SIZE, Config.QUERY_TYPE_HINTS_TTL)
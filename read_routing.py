@@ -0,0 +1,213 @@
+# read_routing.py
+"""
+Read preference and read concern per endpoint.
+
+Read endpoints ask for a named route: query, aggregate, export, views,
+schema, analyze or collections. READ_ROUTES is a JSON object mapping route
+names to settings, e.g.
+
+  {"aggregate": {"mode": "secondary", "tags": [{"workload": "analytics"}, {}],
+                 "max_staleness_seconds": 120, "read_concern": "majority"},
+   "query": {"mode": "primaryPreferred"}}
+
+  mode                   primary, primaryPreferred, secondary,
+                         secondaryPreferred or nearest
+  tags                   tag sets tried in order; {} matches any member
+  max_staleness_seconds  skip secondaries lagging more than this (>= 90)
+  hedge                  on sharded clusters, send the read to two members
+                         and keep the first answer (ignored by MongoDB 8.0+)
+  read_concern           local, available, majority or linearizable
+
+Routes that are not listed use READ_PREFERENCE, READ_MAX_STALENESS_SECONDS
+and READ_CONCERN; left empty, reads keep the client's settings (the primary
+unless the connection URI says otherwise).
+
+/query, /export, /aggregate and /views/<view> take per-request overrides
+(read_preference, read_preference_tags, max_staleness_seconds,
+read_concern) unless READ_ROUTING_OVERRIDES is off. Writes and the app's own
+bookkeeping (stored profiles, view refreshes) always use the client defaults.
+"""
+import json
+from functools import lru_cache
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from config import Config
+
+READ_PREFERENCE_MODES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest
+}
+READ_CONCERN_LEVELS = ('local', 'available', 'majority', 'linearizable')
+ROUTES = ('query', 'aggregate', 'export', 'views', 'schema', 'analyze', 'collections')
+
+# Smallest maxStalenessSeconds servers accept (heartbeat interval plus idle write period)
+MIN_MAX_STALENESS_SECONDS = 90
+
+# Per-request parameters (query string or JSON body) and the route setting each one sets
+OVERRIDE_PARAMS = {
+    'read_preference': 'mode',
+    'read_preference_tags': 'tags',
+    'max_staleness_seconds': 'max_staleness_seconds',
+    'read_concern': 'read_concern'
+}
+
+# Settings that only make sense for the mode they were given with
+MODE_SETTINGS = ('tags', 'max_staleness_seconds', 'hedge')
+
+
+class ReadRoute:
+    """Read preference and read concern for one kind of read; None keeps the client's setting"""
+
+    def __init__(self, name, read_preference=None, read_concern=None):
+        self.name = name
+        self.read_preference = read_preference
+        self.read_concern = read_concern
+
+    def options(self):
+        """Keyword arguments for Database.get_collection"""
+        options = {}
+        if self.read_preference is not None:
+            options["read_preference"] = self.read_preference
+        if self.read_concern is not None:
+            options["read_concern"] = self.read_concern
+        return options
+
+    def describe(self):
+        return {
+            "read_preference": self.read_preference.document if self.read_preference is not None else "client default",
+            "read_concern": self.read_concern.level if self.read_concern is not None else "client default"
+        }
+
+
+def build_route(name, settings):
+    """ReadRoute from route settings; raises ValueError for invalid ones"""
+    mode = settings.get('mode') or None
+    if mode is not None and mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"read_preference must be one of: {', '.join(READ_PREFERENCE_MODES)}")
+
+    tags = settings.get('tags')
+    if isinstance(tags, str):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            raise ValueError("read_preference_tags must be a JSON list of tag sets")
+    if tags is not None and (not isinstance(tags, list) or not all(isinstance(tag_set, dict) for tag_set in tags)):
+        raise ValueError('read_preference_tags must be a JSON list of tag sets, e.g. [{"workload": "analytics"}, {}]')
+
+    try:
+        max_staleness = int(settings.get('max_staleness_seconds', -1))
+    except (TypeError, ValueError):
+        raise ValueError("max_staleness_seconds must be an integer")
+    if max_staleness != -1 and max_staleness < MIN_MAX_STALENESS_SECONDS:
+        raise ValueError(f"max_staleness_seconds must be at least {MIN_MAX_STALENESS_SECONDS} (or -1 for no limit)")
+
+    hedge = settings.get('hedge')
+    if mode in (None, 'primary') and (tags or max_staleness != -1 or hedge):
+        raise ValueError("read_preference_tags, max_staleness_seconds and hedge need a non-primary read_preference")
+
+    if mode is None:
+        read_preference = None
+    elif mode == 'primary':
+        read_preference = Primary()
+    else:
+        options = {"tag_sets": tags or None, "max_staleness": max_staleness}
+        if hedge is not None:
+            options["hedge"] = {"enabled": bool(hedge)}
+        read_preference = READ_PREFERENCE_MODES[mode](**options)
+
+    level = settings.get('read_concern') or None
+    if level is not None and level not in READ_CONCERN_LEVELS:
+        raise ValueError(f"read_concern must be one of: {', '.join(READ_CONCERN_LEVELS)}")
+    if level == 'linearizable' and mode not in (None, 'primary'):
+        raise ValueError("linearizable read concern requires read_preference primary")
+    return ReadRoute(name, read_preference, ReadConcern(level) if level else None)
+
+
+@lru_cache(maxsize=256)
+def _build_cached(name, frozen_settings):
+    return build_route(name, json.loads(frozen_settings))
+
+
+def overrides_from(params):
+    """Per-request route settings from query parameters or a JSON body"""
+    if not Config.READ_ROUTING_OVERRIDES or not params:
+        return {}
+    overrides = {}
+    for param, setting in OVERRIDE_PARAMS.items():
+        value = params.get(param)
+        if value not in (None, ''):
+            overrides[setting] = value
+    return overrides
+
+
+def default_route_settings():
+    """Route settings for routes missing from READ_ROUTES"""
+    settings = {}
+    if Config.READ_PREFERENCE:
+        settings['mode'] = Config.READ_PREFERENCE
+    if Config.READ_MAX_STALENESS_SECONDS != -1:
+        settings['max_staleness_seconds'] = Config.READ_MAX_STALENESS_SECONDS
+    if Config.READ_CONCERN:
+        settings['read_concern'] = Config.READ_CONCERN
+    return settings
+
+
+def configured_read_routes():
+    """Per-route settings from READ_ROUTES"""
+    try:
+        routes = json.loads(Config.READ_ROUTES) if Config.READ_ROUTES else {}
+    except ValueError:
+        print("⚠️  READ_ROUTES is not valid JSON; every read uses the default read preference")
+        return {}
+    if not isinstance(routes, dict):
+        return {}
+    for name in routes:
+        if name not in ROUTES:
+            print(f"⚠️  READ_ROUTES names unknown route '{name}' (known: {', '.join(ROUTES)})")
+    return {name: settings for name, settings in routes.items() if isinstance(settings, dict)}
+
+
+class ReadRouter:
+    """Resolves the read route for an endpoint and request"""
+
+    def __init__(self, routes, defaults):
+        try:
+            build_route('default', defaults)
+        except ValueError as e:
+            print(f"⚠️  Default read preference is invalid ({str(e)}); reads keep the client's settings")
+            defaults = {}
+        self._settings = {}
+        for name in ROUTES:
+            settings = routes.get(name, defaults)
+            try:
+                build_route(name, settings)
+            except ValueError as e:
+                print(f"⚠️  Read route '{name}' is invalid ({str(e)}); using the default read preference")
+                settings = defaults
+            self._settings[name] = settings
+
+    def route(self, name, overrides=None):
+        """ReadRoute for a route name with per-request overrides; raises ValueError for invalid overrides"""
+        settings = self._settings.get(name, {})
+        if overrides:
+            settings = dict(settings)
+            if 'mode' in overrides:
+                # A new mode starts from its own tags and staleness, not the route's
+                for key in MODE_SETTINGS:
+                    settings.pop(key, None)
+            settings.update(overrides)
+        return _build_cached(name, json.dumps(settings, sort_keys=True))
+
+    def describe(self):
+        """Effective read preference and read concern per route"""
+        return {
+            "routes": {name: self.route(name).describe() for name in ROUTES},
+            "per_request_overrides": Config.READ_ROUTING_OVERRIDES
+        }
+
+
+# Create global read router instance
+read_router = ReadRouter(configured_read_routes(), default_route_settings())
@@ -0,0 +1,229 @@
+# schema_profiler.py
+import hashlib
+import threading
+from datetime import datetime
+from config import Config
+from database import db_instance
+from read_routing import read_router
+
+# Distinct-value sketch size: keeps the k smallest value hashes per field
+SKETCH_SIZE = 64
+HASH_SPACE = 2 ** 63
+SAMPLE_VALUE_LIMIT = 5
+
+
+class FieldProfile:
+    """Compact per-field accumulator: type histogram, nulls and a cardinality sketch"""
+
+    def __init__(self):
+        self.total_count = 0
+        self.null_count = 0
+        self.type_counts = {}
+        self.item_type_counts = {}  # element types when the field holds arrays
+        self.sample_values = []
+        self.sketch = []  # sorted k-minimum-values of value hashes
+
+    def add(self, value):
+        self.total_count += 1
+        if value is None:
+            self.null_count += 1
+            self._count_type(self.type_counts, 'null')
+            return
+
+        self._count_type(self.type_counts, type(value).__name__)
+        if isinstance(value, list):
+            for item in value:
+                self._count_type(self.item_type_counts, 'null' if item is None else type(item).__name__)
+            return
+        if isinstance(value, dict):
+            return
+
+        self._add_hash(value)
+        # Add sample values (limit to 5)
+        if len(self.sample_values) < SAMPLE_VALUE_LIMIT and isinstance(value, (str, int, float, bool)):
+            if value not in self.sample_values:
+                self.sample_values.append(value)
+
+    def cardinality_estimate(self):
+        if len(self.sketch) < SKETCH_SIZE:
+            return len(self.sketch)
+        # KMV estimator: (k - 1) / normalized k-th smallest hash
+        return int((SKETCH_SIZE - 1) / (self.sketch[-1] / HASH_SPACE))
+
+    def to_doc(self, path):
+        return {
+            "path": path,
+            "total_count": self.total_count,
+            "null_count": self.null_count,
+            "type_counts": self.type_counts,
+            "item_type_counts": self.item_type_counts,
+            "sample_values": self.sample_values,
+            "sketch": self.sketch
+        }
+
+    @classmethod
+    def from_doc(cls, doc):
+        profile = cls()
+        profile.total_count = doc.get("total_count", 0)
+        profile.null_count = doc.get("null_count", 0)
+        profile.type_counts = dict(doc.get("type_counts", {}))
+        profile.item_type_counts = dict(doc.get("item_type_counts", {}))
+        profile.sample_values = list(doc.get("sample_values", []))
+        profile.sketch = list(doc.get("sketch", []))
+        return profile
+
+    def summary(self, documents_profiled):
+        summary = {
+            "types": sorted(self.type_counts, key=self.type_counts.get, reverse=True),
+            "type_counts": self.type_counts,
+            "sample_values": self.sample_values,
+            "null_count": self.null_count,
+            "total_count": self.total_count,
+            "presence_ratio": round(self.total_count / documents_profiled, 4) if documents_profiled else 0,
+            "null_ratio": round(self.null_count / self.total_count, 4) if self.total_count else 0,
+            "cardinality_estimate": self.cardinality_estimate()
+        }
+        if self.item_type_counts:
+            summary["item_types"] = self.item_type_counts
+        return summary
+
+    def _add_hash(self, value):
+        digest = hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8).digest()
+        value_hash = int.from_bytes(digest, 'big') >> 1
+        sketch = self.sketch
+        if value_hash in sketch or (len(sketch) >= SKETCH_SIZE and value_hash >= sketch[-1]):
+            return
+        sketch.append(value_hash)
+        sketch.sort()
+        del sketch[SKETCH_SIZE:]
+
+    @staticmethod
+    def _count_type(counts, name, amount=1):
+        counts[name] = counts.get(name, 0) + amount
+
+
+def profile_documents(documents, fields=None):
+    """Accumulate field profiles for documents, recursing into nested paths"""
+    fields = {} if fields is None else fields
+
+    def visit(value, path):
+        profile = fields.get(path)
+        if profile is None:
+            profile = fields[path] = FieldProfile()
+        profile.add(value)
+        if isinstance(value, dict):
+            for key, child in value.items():
+                visit(child, f"{path}.{key}")
+        elif isinstance(value, list):
+            # Array elements are addressed by the same dotted path in queries
+            for item in value:
+                if isinstance(item, dict):
+                    for key, child in item.items():
+                        visit(child, f"{path}.{key}")
+
+    for doc in documents:
+        for key, value in doc.items():
+            visit(value, key)
+    return fields
+
+
+class SchemaProfiler:
+    """Persisted, incrementally refreshed schema profiles per collection"""
+
+    def __init__(self, mongo):
+        self.mongo = mongo
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def get_profile(self, collection_name, sample_size=None, force_rebuild=False):
+        """Return the stored profile, building or refreshing it when needed"""
+        with self._lock_for(collection_name):
+            stored = None if force_rebuild else self._profiles().find_one({"_id": collection_name})
+            if stored is None:
+                stored = self._build(collection_name, sample_size or Config.SCHEMA_SAMPLE_SIZE)
+            elif (datetime.utcnow() - stored["updated_at"]).total_seconds() >= Config.SCHEMA_REFRESH_SECONDS:
+                stored = self._refresh(collection_name, stored)
+        return self._render(stored)
+
+    def field_types(self, collection_name):
+        """Observed types per field path, most common first, from the stored profile only.
+
+        Never builds a profile; returns {} until one exists. Array fields
+        report their element types, since query values match elements.
+        """
+        stored = self._profiles().find_one({"_id": collection_name}, {"fields.path": 1, "fields.type_counts": 1,
+                                                                       "fields.item_type_counts": 1})
+        types = {}
+        for field in (stored or {}).get("fields", []):
+            counts = dict(field.get("type_counts", {}))
+            if counts.get('list') and field.get("item_type_counts"):
+                counts.pop('list')
+                for name, count in field["item_type_counts"].items():
+                    counts[name] = counts.get(name, 0) + count
+            counts.pop('null', None)
+            types[field["path"]] = sorted(counts, key=counts.get, reverse=True)
+        return types
+
+    def _build(self, collection_name, sample_size):
+        collection = self.mongo.get_collection(collection_name, read_router.route('schema'))
+
+        # Remember the newest _id first so documents inserted meanwhile are picked up later
+        newest = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        samples = collection.aggregate([{"$sample": {"size": sample_size}}])
+        fields = profile_documents(samples)
+        # Every document has _id, so its count is the number of documents profiled
+        documents_profiled = fields["_id"].total_count if "_id" in fields else 0
+
+        return self._save(collection_name, fields, documents_profiled,
+                          newest["_id"] if newest else None, "sample")
+
+    def _refresh(self, collection_name, stored):
+        collection = self.mongo.get_collection(collection_name, read_router.route('schema'))
+        last_id = stored.get("last_id")
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+
+        fields = {doc["path"]: FieldProfile.from_doc(doc) for doc in stored.get("fields", [])}
+        new_docs = list(collection.find(query).sort("_id", 1).limit(Config.SCHEMA_INCREMENT_LIMIT))
+        if not new_docs:
+            self._profiles().update_one({"_id": collection_name}, {"$set": {"updated_at": datetime.utcnow()}})
+            stored["updated_at"] = datetime.utcnow()
+            return stored
+
+        profile_documents(new_docs, fields)
+        return self._save(collection_name, fields, stored.get("documents_profiled", 0) + len(new_docs),
+                          new_docs[-1]["_id"], "incremental")
+
+    def _save(self, collection_name, fields, documents_profiled, last_id, method):
+        profile = {
+            "_id": collection_name,
+            "fields": [field.to_doc(path) for path, field in sorted(fields.items())],
+            "documents_profiled": documents_profiled,
+            "last_id": last_id,
+            "last_method": method,
+            "updated_at": datetime.utcnow()
+        }
+        self._profiles().replace_one({"_id": collection_name}, profile, upsert=True)
+        return profile
+
+    def _render(self, stored):
+        documents_profiled = stored.get("documents_profiled", 0)
+        schema = {}
+        for field in stored.get("fields", []):
+            schema[field["path"]] = FieldProfile.from_doc(field).summary(documents_profiled)
+        return {
+            "schema": schema,
+            "sample_size": documents_profiled,
+            "profile_method": stored.get("last_method"),
+            "profiled_at": stored.get("updated_at").isoformat() if stored.get("updated_at") else None
+        }
+
+    def _profiles(self):
+        return self.mongo.get_collection(Config.SCHEMA_COLLECTION)
+
+    def _lock_for(self, collection_name):
+        with self._locks_guard:
+            return self._locks.setdefault(collection_name, threading.Lock())
+
+
+# Create global schema profiler instance
+schema_profiler = SchemaProfiler(db_instance)
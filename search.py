@@ -0,0 +1,170 @@
+# search.py
+"""
+Search backends for ?search=.
+
+  text    $text over the collection's text index, ranked by textScore
+  prefix  anchored prefix match on lowercase shadow fields (_search.<field>),
+          served by ordinary indexes where a text index is not allowed
+  regex   the original unanchored, case-insensitive $regex over the
+          searchable fields; always a collection scan
+
+In auto mode the text index is used when one exists, then indexed prefix
+shadow fields, then (if SEARCH_ALLOW_REGEX) the regex fallback. Searchable
+fields come from SEARCH_FIELDS, a JSON object mapping collection names to
+field lists, falling back to SEARCH_DEFAULT_FIELDS.
+
+Shadow fields are written by build_prefix_shadows and are not maintained
+on later writes; rebuild them after bulk changes.
+"""
+import json
+import re
+import threading
+import time
+from config import Config
+from database import db_instance
+
+SEARCH_MODES = ('auto', 'text', 'prefix', 'regex')
+TEXT_SCORE = {'$meta': 'textScore'}
+TEXT_INDEX_NAME = 'search_text'
+# Runs of non-whitespace; the server's PCRE \s is ASCII-only, so Python matches in ASCII mode too
+SEARCH_WORD_PATTERN = r'\S+'
+
+
+def configured_search_fields():
+    """Per-collection searchable fields from SEARCH_FIELDS"""
+    try:
+        fields = json.loads(Config.SEARCH_FIELDS) if Config.SEARCH_FIELDS else {}
+    except ValueError:
+        print("⚠️  SEARCH_FIELDS is not valid JSON; using SEARCH_DEFAULT_FIELDS for every collection")
+        return {}
+    return fields if isinstance(fields, dict) else {}
+
+
+def shadow_field(field):
+    """Lowercase shadow copy of a field used for prefix search"""
+    return f"{Config.SEARCH_SHADOW_PREFIX}.{field.replace('.', '__')}"
+
+
+def normalize_search_term(term):
+    """Collapse whitespace and lowercase, matching how shadow fields are written"""
+    return " ".join(re.findall(SEARCH_WORD_PATTERN, term, re.ASCII)).lower()
+
+
+def normalized_shadow_value(field):
+    """Aggregation expression giving normalize_search_term of a string field"""
+    return {'$toLower': {'$reduce': {
+        'input': {'$regexFindAll': {'input': f'${field}', 'regex': SEARCH_WORD_PATTERN}},
+        'initialValue': '',
+        'in': {'$concat': ['$$value', {'$cond': [{'$eq': ['$$value', '']}, '', ' ']}, '$$this.match']}
+    }}}
+
+
+class SearchEngine:
+    """Chooses and builds the search filter for a collection"""
+
+    def __init__(self, mongo, index_ttl):
+        self.mongo = mongo
+        self.index_ttl = index_ttl
+        self.collection_fields = configured_search_fields()
+        self._indexes = {}  # name -> (loaded_at, text index fields or None, indexed shadow fields)
+        self._lock = threading.Lock()
+
+    def search_fields(self, collection_name):
+        return self.collection_fields.get(collection_name) or Config.SEARCH_DEFAULT_FIELDS
+
+    def index_status(self, collection_name):
+        """(text index fields or None, fields with an indexed prefix shadow), cached for index_ttl"""
+        with self._lock:
+            entry = self._indexes.get(collection_name)
+            if entry and time.monotonic() - entry[0] < self.index_ttl:
+                return entry[1], entry[2]
+
+        text_fields = None
+        shadow_fields = set()
+        for info in self.mongo.get_collection(collection_name).index_information().values():
+            keys = info.get('key') or []
+            if any(direction == 'text' for _, direction in keys):
+                text_fields = sorted(info.get('weights', {}))
+            elif keys and keys[0][0].startswith(Config.SEARCH_SHADOW_PREFIX + '.'):
+                shadow_fields.add(keys[0][0])
+
+        prefix_fields = [field for field in self.search_fields(collection_name) if shadow_field(field) in shadow_fields]
+        with self._lock:
+            self._indexes[collection_name] = (time.monotonic(), text_fields, prefix_fields)
+        return text_fields, prefix_fields
+
+    def plan(self, collection_name, term, mode=None):
+        """Resolve a search to {"mode", "filter", "rank"}; raises ValueError when the mode cannot be served"""
+        mode = (mode or Config.SEARCH_MODE).lower()
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"search_mode must be one of: {', '.join(SEARCH_MODES)}")
+
+        if mode in ('auto', 'text', 'prefix'):
+            text_fields, prefix_fields = self.index_status(collection_name)
+            if mode == 'text' and text_fields is None and Config.SEARCH_AUTO_CREATE_INDEX:
+                text_fields = self.build_text_index(collection_name)["fields"]
+            if mode in ('auto', 'text') and text_fields is not None:
+                return {"mode": "text", "filter": {'$text': {'$search': term}}, "rank": True}
+            if mode in ('auto', 'prefix') and prefix_fields:
+                return {"mode": "prefix", "filter": self._prefix_filter(term, prefix_fields), "rank": False}
+            if mode == 'text':
+                raise ValueError(f"Collection '{collection_name}' has no text index; "
+                                 f"create one with POST /collection/{collection_name}/search-index")
+            if mode == 'prefix':
+                raise ValueError(f"Collection '{collection_name}' has no indexed prefix search fields; "
+                                 f"build them with POST /collection/{collection_name}/search-index")
+            if not Config.SEARCH_ALLOW_REGEX:
+                raise ValueError(f"Collection '{collection_name}' has no search index and regex search is disabled")
+
+        return {"mode": "regex", "filter": self._regex_filter(term, self.search_fields(collection_name)), "rank": False}
+
+    def build_text_index(self, collection_name, fields=None, language=None):
+        """Create the collection's text index over the searchable fields"""
+        fields = fields or self.search_fields(collection_name)
+        collection = self.mongo.get_collection(collection_name)
+        name = collection.create_index(
+            [(field, 'text') for field in fields],
+            name=TEXT_INDEX_NAME,
+            default_language=language or Config.SEARCH_LANGUAGE
+        )
+        self.invalidate(collection_name)
+        return {"type": "text", "index": name, "fields": fields}
+
+    def build_prefix_shadows(self, collection_name, fields=None):
+        """Write normalized (lowercase, single-spaced) shadow copies of the searchable fields and index them"""
+        fields = fields or self.search_fields(collection_name)
+        collection = self.mongo.get_collection(collection_name)
+        # Strings only; other values would not match a string prefix anyway
+        shadows = {
+            shadow_field(field): {'$cond': [
+                {'$eq': [{'$type': f'${field}'}, 'string']},
+                normalized_shadow_value(field),
+                '$$REMOVE'
+            ]}
+            for field in fields
+        }
+        result = collection.update_many({}, [{'$set': shadows}])
+        indexes = [collection.create_index([(shadow, 1)]) for shadow in shadows]
+        self.invalidate(collection_name)
+        return {"type": "prefix", "indexes": indexes, "fields": fields, "documents_updated": result.modified_count}
+
+    def invalidate(self, collection_name=None):
+        with self._lock:
+            if collection_name:
+                self._indexes.pop(collection_name, None)
+            else:
+                self._indexes.clear()
+
+    @staticmethod
+    def _prefix_filter(term, fields):
+        # Anchored and case-sensitive against lowercase data, so each branch is an index range scan
+        pattern = '^' + re.escape(normalize_search_term(term))
+        return {'$or': [{shadow_field(field): {'$regex': pattern}} for field in fields]}
+
+    @staticmethod
+    def _regex_filter(term, fields):
+        return {'$or': [{field: {'$regex': term, '$options': 'i'}} for field in fields]}
+
+
+# Create global search engine instance
+search_engine = SearchEngine(db_instance, Config.SEARCH_INDEX_CACHE_SECONDS)
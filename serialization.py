@@ -0,0 +1,143 @@
+# serialization.py
+import base64
+import json
+import uuid
+from collections.abc import Mapping
+from datetime import date, datetime
+from decimal import Decimal
+import bson
+from bson import Binary, Code, DBRef, Decimal128, MaxKey, MinKey, ObjectId, Regex, Timestamp
+from bson.codec_options import CodecOptions, TypeRegistry
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional; the stdlib encoder is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# msgpack is optional; MessagePack bodies are only offered when it is installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+BSON_MIMETYPE = 'application/bson'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+def _encode_binary(value):
+    if value.subtype in (3, 4) and len(value) == 16:
+        return str(uuid.UUID(bytes=bytes(value)))
+    return base64.b64encode(bytes(value)).decode('ascii')
+
+
+# Exact-type dispatch keeps the common BSON types to a single dict lookup
+_ENCODERS = {
+    ObjectId: str,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    # Keep full precision instead of rounding through float
+    Decimal128: str,
+    Decimal: str,
+    Binary: _encode_binary,
+    bytes: lambda value: base64.b64encode(value).decode('ascii'),
+    bytearray: lambda value: base64.b64encode(bytes(value)).decode('ascii'),
+    uuid.UUID: str,
+    Timestamp: lambda value: {"t": value.time, "i": value.inc},
+    DBRef: lambda value: {"$ref": value.collection, "$id": value.id},
+    Regex: lambda value: value.pattern,
+    Code: str,
+    MinKey: lambda value: "$minKey",
+    MaxKey: lambda value: "$maxKey",
+    set: list,
+    frozenset: list,
+    tuple: list,
+}
+
+
+def bson_default(value):
+    """Encode BSON and other non-JSON values while the encoder walks the document"""
+    encoder = _ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    # Subclasses (e.g. Binary subtypes, datetime with tzinfo classes) and compiled regexes
+    for value_type, encoder in _ENCODERS.items():
+        if isinstance(value, value_type):
+            return encoder(value)
+    if hasattr(value, 'pattern') and hasattr(value, 'flags'):
+        return value.pattern
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """Encode an object (documents included) to JSON bytes in a single pass"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson rejects integers beyond 64 bits; the stdlib encoder does not
+            pass
+    return json.dumps(obj, default=bson_default, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj):
+    """Encode an object to a JSON string in a single pass"""
+    return dumps_bytes(obj).decode('utf-8')
+
+
+def _bson_fallback(value):
+    """Values BSON has no type for: decimals stay exact, the rest are encoded as for JSON"""
+    if isinstance(value, Decimal):
+        return Decimal128(value)
+    return bson_default(value)
+
+
+_BSON_OPTIONS = CodecOptions(type_registry=TypeRegistry(fallback_encoder=_bson_fallback))
+
+
+def dumps_as(obj, mimetype):
+    """Encode an object as JSON, BSON or MessagePack; returns (body, mimetype).
+
+    BSON and MessagePack keep ObjectId, datetime and binary values in their
+    native types where the format has one. Objects a format cannot hold (a
+    top-level list in BSON) and formats whose library is missing fall back
+    to JSON.
+    """
+    if mimetype == BSON_MIMETYPE and isinstance(obj, Mapping):
+        return bson.encode(obj, codec_options=_BSON_OPTIONS), BSON_MIMETYPE
+    if mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        return msgpack.packb(obj, default=bson_default, use_bin_type=True), MSGPACK_MIMETYPE
+    return dumps_bytes(obj), JSON_MIMETYPE
+
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes raw MongoDB documents directly.
+
+    Endpoints can hand cursor results straight to jsonify: ObjectId,
+    datetime, Decimal128, Binary and friends are converted by the encoder's
+    default hook instead of a separate pre-serialization walk.
+    """
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.keys() - {'separators'}:
+            kwargs.setdefault('default', bson_default)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def response(self, *args, **kwargs):
+        return self.response_as(JSON_MIMETYPE, *args, **kwargs)
+
+    def response_as(self, mimetype, *args, **kwargs):
+        """jsonify's response, with the body encoded as mimetype (see dumps_as)"""
+        obj = self._prepare_response_obj(args, kwargs)
+        if mimetype != JSON_MIMETYPE:
+            body, mimetype = dumps_as(obj, mimetype)
+            return self._app.response_class(body + b"\n" if mimetype == JSON_MIMETYPE else body, mimetype=mimetype)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            body = json.dumps(obj, default=bson_default, indent=2).encode('utf-8')
+        else:
+            body = dumps_bytes(obj)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,180 @@
+# summarizer.py
+"""
+Bounded-memory collection summaries for /gemini/analyze.
+
+A summary never reads the whole collection. It is built from:
+  1. the estimated document count (collection metadata),
+  2. a $sample used for field discovery and a few example rows,
+  3. per-field statistics computed server-side with $facet/$group
+     over a bounded $sample.
+
+The pipelines are plain data so the Flask and ASGI routes can run them
+with either driver.
+"""
+from serialization import dumps
+from config import Config
+
+NUMERIC_TYPES = {'int', 'long', 'double', 'decimal'}
+CATEGORICAL_TYPES = {'string', 'bool'}
+DATE_TYPES = {'date'}
+
+# Rough characters-per-token ratio used to keep prompts under the token budget
+CHARS_PER_TOKEN = 4
+
+
+def discovery_pipeline():
+    """Sample documents once for example rows and server-side field/type discovery"""
+    return [
+        {'$sample': {'size': Config.ANALYZE_DISCOVERY_SAMPLE}},
+        {'$facet': {
+            'examples': [{'$limit': Config.ANALYZE_EXAMPLE_ROWS}],
+            'fields': [
+                {'$project': {'kv': {'$objectToArray': '$$ROOT'}}},
+                {'$unwind': '$kv'},
+                {'$group': {
+                    '_id': '$kv.k',
+                    'present': {'$sum': 1},
+                    'types': {'$addToSet': {'$type': '$kv.v'}}
+                }},
+                {'$sort': {'present': -1, '_id': 1}}
+            ],
+            'sampled': [{'$count': 'n'}]
+        }}
+    ]
+
+
+def select_fields(discovered):
+    """Pick the most common fields whose types have useful statistics"""
+    fields = []
+    for entry in discovered:
+        name = entry['_id']
+        if name == '_id' or name.startswith('$') or '.' in name:
+            continue
+        fields.append({'name': name, 'types': sorted(entry['types']), 'present': entry['present']})
+        if len(fields) >= Config.ANALYZE_MAX_FIELDS:
+            break
+    return fields
+
+
+def stats_pipeline(fields):
+    """One $facet computing per-field statistics over a bounded random sample"""
+    facets = {}
+    for index, field in enumerate(fields):
+        path = f"${field['name']}"
+        types = set(field['types'])
+        if types & NUMERIC_TYPES:
+            facets[f'f{index}'] = [
+                {'$match': {field['name']: {'$type': 'number'}}},
+                {'$group': {'_id': None, 'min': {'$min': path}, 'max': {'$max': path},
+                            'avg': {'$avg': path}, 'n': {'$sum': 1}}}
+            ]
+        elif types & DATE_TYPES:
+            facets[f'f{index}'] = [
+                {'$match': {field['name']: {'$type': 'date'}}},
+                {'$group': {'_id': None, 'min': {'$min': path}, 'max': {'$max': path}, 'n': {'$sum': 1}}}
+            ]
+        elif types & CATEGORICAL_TYPES:
+            facets[f'f{index}'] = [
+                {'$match': {field['name']: {'$type': ['string', 'bool']}}},
+                {'$group': {'_id': path, 'n': {'$sum': 1}}},
+                {'$sort': {'n': -1}},
+                {'$limit': Config.ANALYZE_TOP_VALUES}
+            ]
+    if not facets:
+        return None
+    return [{'$sample': {'size': Config.ANALYZE_STATS_SAMPLE}}, {'$facet': facets}]
+
+
+def build_summary(collection_name, estimated_count, discovery, stats):
+    """Combine the discovery and statistics results into a compact summary"""
+    sampled = discovery['sampled'][0]['n'] if discovery.get('sampled') else 0
+    fields = select_fields(discovery.get('fields', []))
+    stats = stats or {}
+
+    for index, field in enumerate(fields):
+        field['presence'] = round(field['present'] / sampled, 3) if sampled else 0
+        rows = stats.get(f'f{index}') or []
+        if not rows:
+            continue
+        if rows[0].get('_id') is None and 'min' in rows[0]:
+            field['stats'] = {key: rows[0][key] for key in ('min', 'max', 'avg') if key in rows[0]}
+        else:
+            field['top_values'] = [[row['_id'], row['n']] for row in rows]
+
+    return {
+        "collection": collection_name,
+        "estimated_count": estimated_count,
+        "sampled": sampled,
+        "fields": fields,
+        "examples": discovery.get('examples', [])
+    }
+
+
+def build_prompt(summary, analysis_goals):
+    """Render a summary as a prompt that fits Config.ANALYZE_TOKEN_BUDGET"""
+    budget = Config.ANALYZE_TOKEN_BUDGET * CHARS_PER_TOKEN
+    header = (
+        f"The collection '{summary['collection']}' contains about {summary['estimated_count']} records. "
+        f"Statistics below come from a random sample of {summary['sampled']} documents."
+    )
+    footer = f"{analysis_goals} Please provide insights based on this data."
+
+    field_lines = [_describe_field(field) for field in summary['fields']]
+    example_rows = [dumps(example) for example in summary['examples']]
+
+    # Fields are kept before example rows; trim from the end until everything fits
+    def render():
+        parts = [header, "Fields:"] + field_lines
+        if example_rows:
+            parts += ["Example rows:"] + example_rows
+        parts.append(footer)
+        return "\n".join(parts)
+
+    prompt = render()
+    while len(prompt) > budget and example_rows:
+        example_rows.pop()
+        prompt = render()
+    while len(prompt) > budget and field_lines:
+        field_lines.pop()
+        prompt = render()
+    return prompt[:budget]
+
+
+def _describe_field(field):
+    line = f"- {field['name']} ({'/'.join(field['types'])}, present in {field.get('presence', 0):.0%})"
+    if 'stats' in field:
+        stats = ", ".join(f"{key} {_short(value)}" for key, value in field['stats'].items())
+        line += f": {stats}"
+    elif 'top_values' in field:
+        values = ", ".join(f"{_short(value)} ({count})" for value, count in field['top_values'])
+        line += f": top values {values}"
+    return line
+
+
+def _short(value, width=60):
+    text = f"{value:.4g}" if isinstance(value, float) else dumps(value).strip('"')
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+def summarize_collection(collection):
+    """Build a summary with the sync driver"""
+    estimated_count = collection.estimated_document_count()
+    if not estimated_count:
+        return None
+    discovery = next(collection.aggregate(discovery_pipeline()), {})
+    pipeline = stats_pipeline(select_fields(discovery.get('fields', [])))
+    stats = next(collection.aggregate(pipeline, allowDiskUse=True), {}) if pipeline else {}
+    return build_summary(collection.name, estimated_count, discovery, stats)
+
+
+async def summarize_collection_async(collection):
+    """Build a summary with the async driver"""
+    estimated_count = await collection.estimated_document_count()
+    if not estimated_count:
+        return None
+    discovery = (await (await collection.aggregate(discovery_pipeline())).to_list(1) or [{}])[0]
+    pipeline = stats_pipeline(select_fields(discovery.get('fields', [])))
+    stats = {}
+    if pipeline:
+        stats = (await (await collection.aggregate(pipeline, allowDiskUse=True)).to_list(1) or [{}])[0]
+    return build_summary(collection.name, estimated_count, discovery, stats)
@@ -0,0 +1,51 @@
+"""
+Test setup: Config reads the environment at import time, so it is filled in
+before any app module is imported. Tests needing a database run against
+mongomock (the `app_module` fixture) and are skipped when it is missing.
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('FLASK_DEBUG', 'false')
+os.environ.setdefault('FLASK_PORT', '5000')
+os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017')
+os.environ.setdefault('DATABASE_NAME', 'api_tests')
+os.environ.setdefault('MONGO_SERVER_SELECTION_TIMEOUT_MS', '200')
+os.environ.setdefault('INDEX_ADVISOR_ENABLED', 'false')
+os.environ.setdefault('SLOW_REQUEST_MS', '0')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+else:
+    import mongomock.filtering
+    import pymongo
+    import re
+    from bson import Regex, Timestamp
+    pymongo.MongoClient = mongomock.MongoClient
+    # mongomock knows these $type aliases but does not implement them
+    for alias, types in (('timestamp', Timestamp), ('regex', (Regex, re.Pattern))):
+        if mongomock.filtering.TYPE_MAP.get(alias) is None:
+            mongomock.filtering.TYPE_MAP[alias] = lambda value, types=types: isinstance(value, types)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    if mongomock is None:
+        pytest.skip("mongomock is not installed")
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def db(app_module):
+    return app_module.db_instance.db
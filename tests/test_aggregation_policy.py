@@ -0,0 +1,106 @@
+import pytest
+
+from aggregation_policy import PipelineRejected, apply_policy, summarize_explain
+from config import Config
+
+LOOKUP = {'$lookup': {'from': 'orders', 'localField': '_id', 'foreignField': 'user_id', 'as': 'orders'}}
+
+
+@pytest.fixture(autouse=True)
+def policy_settings(monkeypatch):
+    monkeypatch.setattr(Config, 'MAX_LIMIT', 100)
+    monkeypatch.setattr(Config, 'AGGREGATE_MAX_TIME_MS', 30000)
+    monkeypatch.setattr(Config, 'AGGREGATE_ALLOW_DISK_USE', True)
+    monkeypatch.setattr(Config, 'AGGREGATE_ALLOW_UNINDEXED_LOOKUP', False)
+
+
+@pytest.mark.parametrize('pipeline, message', [
+    ([{'$out': 'copy'}], '$out is not allowed'),
+    ([{'$facet': {'a': [{'$merge': 'copy'}]}}], '$merge is not allowed'),
+    ([{'$match': {'$where': 'true'}}], '$where is not allowed'),
+    ([{'$match': {}, '$limit': 1}], 'exactly one operator'),
+    ({'$match': {}}, 'must be a list'),
+])
+def test_unsafe_pipelines_are_rejected(pipeline, message):
+    with pytest.raises(PipelineRejected, match=message.replace('$', r'\$')):
+        apply_policy(pipeline, {})
+
+
+def test_joins_need_an_index_on_the_foreign_field():
+    with pytest.raises(PipelineRejected, match='orders.user_id'):
+        apply_policy([LOOKUP], {'orders': {'_id'}})
+    apply_policy([LOOKUP], {'orders': {'user_id'}})
+
+
+def test_output_is_capped_server_side():
+    guarded, _, policy = apply_policy([{'$match': {}}], {})
+    assert guarded[-1] == {'$limit': 100} and policy['limit'] == 100
+    guarded, _, policy = apply_policy([{'$limit': 5}], {}, limit=50)
+    assert guarded == [{'$limit': 5}] and policy['limit'] == 5
+    assert apply_policy([], {}, limit=1000)[2]['limit'] == 100
+    guarded, _, policy = apply_policy([{'$match': {}}], {}, cap_output=False)
+    assert guarded == [{'$match': {}}] and policy['limit'] is None
+
+
+def test_clients_can_tighten_but_not_loosen_time_and_disk_use(monkeypatch):
+    _, options, _ = apply_policy([], {}, max_time_ms=500, allow_disk_use=False)
+    assert options == {'maxTimeMS': 500, 'allowDiskUse': False}
+    assert apply_policy([], {}, max_time_ms=10 ** 9)[1]['maxTimeMS'] == 30000
+    monkeypatch.setattr(Config, 'AGGREGATE_ALLOW_DISK_USE', False)
+    assert apply_policy([], {}, allow_disk_use=True)[1]['allowDiskUse'] is False
+
+
+@pytest.mark.parametrize('value', [0, -3, 'ten', True, 2.5, [1]])
+@pytest.mark.parametrize('name', ['limit', 'max_time_ms'])
+def test_limits_must_be_positive_integers(name, value):
+    with pytest.raises(PipelineRejected, match=f'{name} must be a positive integer'):
+        apply_policy([], {}, **{name: value})
+
+
+def test_numeric_strings_and_whole_floats_are_accepted():
+    assert apply_policy([], {}, limit='7', max_time_ms=250.0)[2] == {
+        "limit": 7, "max_time_ms": 250, "allow_disk_use": True, "stages": 1}
+
+
+def test_explain_summary_reads_find_and_aggregate_plans():
+    find_plan = {
+        'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}},
+        'executionStats': {'totalDocsExamined': 40, 'totalKeysExamined': 0, 'nReturned': 4, 'executionTimeMillis': 3}
+    }
+    summary = summarize_explain(find_plan)
+    assert summary["collection_scan"] and summary["in_memory_sort"]
+    assert (summary["documents_examined"], summary["keys_examined"], summary["documents_returned"],
+            summary["execution_time_ms"]) == (40, 0, 4, 3)
+
+    aggregate_plan = {'stages': [
+        {'$cursor': {'queryPlanner': {'winningPlan': {'stage': 'IXSCAN', 'indexName': 'age_1'}},
+                     'executionStats': {'totalDocsExamined': 0, 'totalKeysExamined': 9, 'nReturned': 9}}},
+        {'$group': {'_id': None}}
+    ]}
+    summary = summarize_explain(aggregate_plan)
+    assert summary["indexes_used"] == ['age_1'] and not summary["collection_scan"]
+    assert summary["keys_examined"] == 9 and summary["pipeline_stages"] == ['$cursor', '$group']
+
+
+def test_aggregate_endpoint_rejects_a_zero_limit(client):
+    response = client.post('/collection/agg_policy/aggregate', json={'pipeline': [], 'limit': 0})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'limit must be a positive integer'
+
+
+def test_aggregate_explain_asks_for_execution_stats(client, db, monkeypatch):
+    calls = []
+
+    def command(name, spec, **kwargs):
+        calls.append((name, spec, kwargs))
+        return {'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}},
+                'executionStats': {'totalDocsExamined': 12, 'nReturned': 2}}
+
+    monkeypatch.setattr(db, 'command', command)
+    response = client.post('/collection/agg_policy/aggregate',
+                           json={'pipeline': [{'$match': {'x': 1}}], 'explain': True, 'max_time_ms': 800})
+    body = response.get_json()
+    assert body['explain']['documents_examined'] == 12 and body['explain']['collection_scan']
+    ((name, spec, kwargs),) = calls
+    assert name == 'explain' and spec['aggregate'] == 'agg_policy'
+    assert kwargs == {'verbosity': 'executionStats', 'maxTimeMS': 800}
@@ -0,0 +1,153 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from negotiation import prefers_ndjson
+
+DOCS = [{'_id': 1, 'n': 1}, {'_id': 2, 'n': 2}]
+NDJSON = 'application/x-ndjson'
+
+
+class FakeAsyncCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+    async def to_list(self, length):
+        return list(self.docs)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncCollection:
+    """Async collection stand-in; the async driver has no mongomock counterpart"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipelines = []
+
+    async def aggregate(self, pipeline, **options):
+        self.pipelines.append(pipeline)
+        return FakeAsyncCursor(self.docs)
+
+    async def index_information(self):
+        return {}
+
+
+@pytest.fixture
+def asgi_module(app_module):
+    import asgi
+    return asgi
+
+
+@pytest.fixture
+def asgi_client(asgi_module):
+    from starlette.testclient import TestClient
+    # Without the context manager the lifespan (outbound model client) is not started
+    return TestClient(asgi_module.app)
+
+
+@pytest.fixture
+def async_collection(asgi_module, monkeypatch):
+    collection = FakeAsyncCollection(DOCS)
+    monkeypatch.setattr(asgi_module.async_db, 'get_collection', lambda name, route=None: collection)
+    return collection
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (NDJSON, True),
+    ('application/json, application/x-ndjson;q=0.5', False),
+    ('application/json;q=0.2, application/x-ndjson', True),
+    ('application/x-ndjson;q=0', False),
+    ('*/*', False),
+    (None, False),
+])
+def test_prefers_ndjson_uses_quality_values(accept, expected):
+    assert prefers_ndjson(accept) is expected
+
+
+def test_asgi_aggregate_streams_only_when_ndjson_is_preferred(asgi_client, async_collection):
+    pipeline = {'pipeline': [{'$match': {'n': {'$gte': 1}}}]}
+    streamed = asgi_client.post('/collection/agg/aggregate', json=pipeline, headers={'Accept': NDJSON})
+    assert streamed.headers['content-type'].startswith(NDJSON)
+    assert [json.loads(line)['n'] for line in streamed.text.splitlines()] == [1, 2]
+
+    declined = asgi_client.post('/collection/agg/aggregate', json=pipeline,
+                                headers={'Accept': 'application/json, application/x-ndjson;q=0'})
+    assert declined.headers['content-type'].startswith('application/json')
+    assert declined.json()['count'] == 2
+
+
+def test_asgi_aggregate_notes_the_leading_match(asgi_module, asgi_client, async_collection, monkeypatch):
+    noted = []
+    monkeypatch.setattr(asgi_module, 'note_query', lambda *query: noted.append(query))
+    asgi_client.post('/collection/agg/aggregate', json={'pipeline': [{'$match': {'n': 1}}, {'$project': {'n': 1}}]})
+    assert noted == [('agg', {'n': 1})]
+
+
+class BlockingDocuments:
+    """Partitioned-scan stand-in that remembers which threads pulled documents"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.threads = set()
+        self.closed = False
+
+    def __iter__(self):
+        for doc in self.docs:
+            self.threads.add(threading.current_thread().name)
+            yield doc
+
+    def close(self):
+        self.closed = True
+
+
+def test_partitioned_aggregates_are_pulled_off_the_event_loop(asgi_module, asgi_client, async_collection, monkeypatch):
+    documents = BlockingDocuments([{'_id': i} for i in range(5)])
+    monkeypatch.setattr(Config, 'EXPORT_BATCH_SIZE', 2)
+    monkeypatch.setattr(asgi_module.partitioned_scanner, 'aggregate', lambda *args, **options: documents)
+    response = asgi_client.post('/collection/agg/aggregate', json={'pipeline': [], 'parallel': 2},
+                                headers={'Accept': NDJSON})
+    assert [json.loads(line)['_id'] for line in response.text.splitlines()] == [0, 1, 2, 3, 4]
+    assert documents.closed
+    assert documents.threads and all(name.startswith('asyncio') for name in documents.threads)
+
+
+def test_health_reports_the_async_pool(asgi_module, asgi_client, monkeypatch):
+    async def connected():
+        return True
+
+    async def command(name):
+        return {'dataSize': 2 * 1024 * 1024}
+
+    async def list_collection_names():
+        return ['a', 'b']
+
+    monkeypatch.setattr(asgi_module.async_db, 'test_connection', connected)
+    monkeypatch.setattr(asgi_module.async_db, 'db', SimpleNamespace(command=command,
+                                                                    list_collection_names=list_collection_names))
+    body = asgi_client.get('/health').json()
+    assert body['status'] == 'healthy' and body['serving_mode'] == 'asgi'
+    assert body['collections_count'] == 2 and body['database_size_mb'] == 2.0
+    assert body['connection_pool'] == asgi_module.async_db.pool_stats.snapshot()
+
+
+def test_unhealthy_health_still_reports_the_async_pool(asgi_module, asgi_client, monkeypatch):
+    async def disconnected():
+        return False
+
+    monkeypatch.setattr(asgi_module.async_db, 'test_connection', disconnected)
+    response = asgi_client.get('/health')
+    assert response.status_code == 500
+    assert set(response.json()['connection_pool']) == set(asgi_module.async_db.pool_stats.snapshot())
@@ -0,0 +1,120 @@
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+from flask import request
+from pymongo.write_concern import WriteConcern
+
+from bulk_writer import BulkWriter, iter_ndjson_lines, write_concern_from_args
+from config import Config
+
+
+@pytest.fixture
+def bulk(client, db, monkeypatch):
+    """POST NDJSON lines to the bulk endpoint and return the parsed result lines"""
+    monkeypatch.setattr(Config, 'BULK_WRITES_ENABLED', True)
+    db['bulk_people'].delete_many({})
+
+    def post(lines, query=''):
+        response = client.post(f'/collection/bulk_people/bulk{query}', data='\n'.join(lines) + '\n',
+                               content_type='application/x-ndjson')
+        assert response.status_code == 200
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return post
+
+
+def test_bulk_writes_are_disabled_by_default(client, monkeypatch):
+    monkeypatch.setattr(Config, 'BULK_WRITES_ENABLED', False)
+    response = client.post('/collection/bulk_people/bulk', data='{"op": "insert", "document": {}}\n')
+    assert response.status_code == 403
+
+
+def test_results_come_back_in_input_order_across_batches(bulk, db, monkeypatch):
+    # One batch in flight at a time, so later batches see earlier writes
+    monkeypatch.setattr(Config, 'BULK_MAX_IN_FLIGHT', 1)
+    results = bulk([
+        '{"op": "insert", "document": {"_id": 1, "n": 1}}',
+        '{"op": "insert", "document": {"_id": 2, "n": 2}}',
+        '{"op": "insert", "document": {"_id": 3, "n": 3}}',
+        '{"op": "delete", "filter": {"_id": 2}}',
+        '{"op": "delete", "filter": {"n": {"$gte": 3}}, "multi": true}',
+    ], '?batch_size=2')
+    assert [result["index"] for result in results[:-1]] == [0, 1, 2, 3, 4]
+    assert all(result["ok"] for result in results[:-1])
+    assert [result.get("_id") for result in results[:3]] == [1, 2, 3]
+    summary = results[-1]["summary"]
+    assert results[-1]["success"] is True
+    assert (summary["received"], summary["batches"], summary["inserted"], summary["deleted"]) == (5, 3, 3, 2)
+    assert [doc['_id'] for doc in db['bulk_people'].find()] == [1]
+
+
+def test_invalid_lines_are_rejected_one_by_one(bulk, db):
+    results = bulk([
+        'not json',
+        '{"op": "merge", "filter": {}}',
+        '{"op": "delete", "filter": {"$where": "true"}}',
+        '{"op": "delete", "filter": {}, "multi": true}',
+        '{"op": "update", "filter": {}, "update": {"n": 1}}',
+        '{"op": "insert", "document": {"_id": 7}}',
+    ])
+    errors = [result.get("error", "") for result in results[:-1]]
+    assert errors[0].startswith("Invalid JSON")
+    assert errors[1].startswith("op must be one of")
+    assert errors[2].startswith("$where is not allowed")
+    assert errors[3] == "delete with multi=true requires a non-empty filter"
+    assert "update only works with $ operators" in errors[4]
+    assert results[5] == {"index": 5, "op": "insert", "ok": True, "_id": 7}
+    assert results[-1]["summary"]["failed"] == 5 and results[-1]["success"] is False
+    assert db['bulk_people'].count_documents({}) == 1
+
+
+def test_errors_only_keeps_failures_and_the_summary(bulk):
+    results = bulk(['{"op": "insert", "document": {"_id": 1}}', '{"op": "nope"}'], '?results=errors')
+    assert [result.get("index") for result in results] == [1, None]
+    assert results[-1]["summary"]["received"] == 2
+
+
+def test_oversized_lines_are_skipped_without_losing_their_index():
+    stream = io.BytesIO(b'{"a": 1}\n' + b'x' * 40 + b'\n\n{"b": 2}\n')
+    assert list(iter_ndjson_lines(stream, 16)) == [b'{"a": 1}\n', None, b'{"b": 2}\n']
+
+
+class UnacknowledgedCollection:
+    """Collection stand-in for w=0: writes are sent but nothing is reported back"""
+
+    name = 'bulk_people'
+
+    def __init__(self):
+        self.write_concern = None
+        self.requests = []
+
+    def with_options(self, write_concern=None):
+        self.write_concern = write_concern
+        return self
+
+    def bulk_write(self, requests, ordered):
+        self.requests.extend(requests)
+        return SimpleNamespace(acknowledged=False)
+
+
+def test_unacknowledged_writes_are_neither_succeeded_nor_failed():
+    collection = UnacknowledgedCollection()
+    lines = [b'{"op": "insert", "document": {"_id": 1}}', b'{"op": "delete", "filter": {"_id": 2}}', b'[]']
+    changed = []
+    results = list(BulkWriter(max_workers=1).run(collection, lines, batch_size=10, max_in_flight=1,
+                                                 write_concern=WriteConcern(w=0), on_batch=changed.append))
+    assert collection.write_concern == WriteConcern(w=0) and len(collection.requests) == 2
+    assert results[0] == {"index": 0, "op": "insert", "ok": None, "status": "unacknowledged", "_id": 1}
+    assert results[1] == {"index": 1, "op": "delete", "ok": None, "status": "unacknowledged"}
+    assert results[2]["ok"] is False
+    summary = results[-1]["summary"]
+    assert (summary["succeeded"], summary["failed"], summary["unconfirmed"]) == (0, 1, 2)
+    assert summary["inserted"] is None and summary["deleted"] is None
+    assert changed == ['bulk_people']
+
+
+def test_w0_is_parsed_from_the_request(app_module):
+    with app_module.app.test_request_context('/?w=0&j=false'):
+        assert write_concern_from_args(request.args) == WriteConcern(w=0, j=False)
+        assert not write_concern_from_args(request.args).acknowledged
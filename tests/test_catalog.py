@@ -0,0 +1,27 @@
+from catalog import CollectionCatalog
+from config import Config
+
+
+def test_list_names_leaves_out_internal_collections(app_module, db):
+    for name in ('catalog_users', Config.SCHEMA_COLLECTION, Config.VIEWS_COLLECTION,
+                 Config.VIEWS_TARGET_PREFIX + 'daily'):
+        db[name].insert_one({'x': 1})
+    names = app_module.collection_catalog.list_names()
+    assert 'catalog_users' in names
+    assert not any(name.startswith('_') for name in names)
+
+
+def test_describe_survives_invalidation_during_refresh(app_module, db):
+    db['catalog_a'].insert_one({'x': 1})
+    db['catalog_b'].insert_one({'y': 1})
+    catalog = CollectionCatalog(app_module.db_instance, refresh_interval=60, max_workers=2)
+    load = catalog._load
+
+    def load_then_invalidate(name):
+        info = load(name)
+        catalog.invalidate()  # what a change event does from the watcher thread
+        return info
+
+    catalog._load = load_then_invalidate
+    described = catalog.describe(['catalog_a', 'catalog_b'])
+    assert [info['name'] for info in described] == ['catalog_a', 'catalog_b']
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from coalesce import FOLLOWER, LEADER, TIMEOUT, AsyncSingleFlight, SingleFlight, _KeyStats
+
+
+def run_concurrently(count, target):
+    results = [None] * count
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, target())) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def slow_work(calls, release, result='body'):
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return result
+    return work
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight(wait_seconds=5, max_keys=10)
+    calls, release = [], threading.Event()
+    work = slow_work(calls, release)
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(4, lambda: flight.do('k', work))
+    assert calls == [1]
+    assert sorted(role for _, role in results) == [FOLLOWER, FOLLOWER, FOLLOWER, LEADER]
+    assert {body for body, _ in results} == {'body'}
+    stats = flight.stats()
+    assert (stats["executions"], stats["coalesced"], stats["in_flight"]) == (1, 3, 0)
+    assert stats["top_keys"][0]["max_waiters"] == 3 and stats["saved_ratio"] == 0.75
+
+
+def test_nothing_is_kept_after_the_execution():
+    flight = SingleFlight(wait_seconds=5, max_keys=10)
+    assert flight.do('k', lambda: 1) == (1, LEADER)
+    assert flight.do('k', lambda: 2) == (2, LEADER)
+
+
+def test_followers_run_the_work_themselves_when_the_leader_fails():
+    flight = SingleFlight(wait_seconds=5, max_keys=10)
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    leader = threading.Thread(target=lambda: pytest.raises(RuntimeError, flight.do, 'k', failing))
+    leader.start()
+    started.wait(5)
+    threading.Timer(0.1, release.set).start()
+    assert flight.do('k', lambda: 'own') == ('own', TIMEOUT)
+    leader.join(5)
+    assert flight.stats()["errors"] == 1
+
+
+def test_slow_leaders_are_not_waited_for_past_the_limit():
+    flight = SingleFlight(wait_seconds=0.05, max_keys=10)
+    calls, release = [], threading.Event()
+    leader = threading.Thread(target=flight.do, args=('k', slow_work(calls, release)))
+    leader.start()
+    while not calls:
+        time.sleep(0.01)
+    assert flight.do('k', lambda: 'own') == ('own', TIMEOUT)
+    release.set()
+    leader.join(5)
+
+
+def test_key_stats_are_bounded():
+    stats = _KeyStats(max_keys=2)
+    for key in ('a', 'b', 'c'):
+        stats.record(key, LEADER)
+    assert [item["key"] for item in stats.snapshot(10)["top_keys"]] == ['b', 'c']
+
+
+def test_async_callers_share_one_execution():
+    flight = AsyncSingleFlight(wait_seconds=5, key_stats=_KeyStats(10))
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'body'
+
+    async def main():
+        return await asyncio.gather(*(flight.do('k', work) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert sorted(role for _, role in results) == [FOLLOWER, FOLLOWER, LEADER]
+
+
+def test_coalesce_keys_normalize_parameter_order(app_module):
+    key = app_module.coalesce_key('/query/a', [('b', '2'), ('a', '1')], True)
+    assert key == app_module.coalesce_key('/query/a', [('a', '1'), ('b', '2')], True) == '/query/a?a=1&b=2'
+    assert app_module.coalesce_key('/query/a', [], False).endswith('(no-cache)')
+    assert app_module.coalesce_key('/query/a', [], True, 'application/bson') == '/query/a? as application/bson'
+
+
+def test_identical_concurrent_queries_run_once(app_module, db, monkeypatch):
+    db['coalesced'].delete_many({})
+    db['coalesced'].insert_one({'n': 1})
+    calls = []
+    open_cursor = app_module.open_query_cursor
+
+    def slow_cursor(collection, spec):
+        calls.append(1)
+        time.sleep(0.3)
+        return open_cursor(collection, spec)
+
+    monkeypatch.setattr(app_module, 'open_query_cursor', slow_cursor)
+
+    def fetch():
+        response = app_module.app.test_client().get('/query/coalesced?n=1', headers={'Cache-Control': 'no-cache'})
+        return response.status_code, response.get_json()['data']
+
+    results = run_concurrently(3, fetch)
+    assert len(calls) == 1
+    assert all(status == 200 and len(data) == 1 for status, data in results)
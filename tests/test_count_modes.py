@@ -0,0 +1,45 @@
+import pytest
+
+NO_CACHE = {'Cache-Control': 'no-cache'}
+
+
+@pytest.fixture
+def counted(app_module, db):
+    db['counted'].delete_many({})
+    db['counted'].insert_many([{'_id': i, 'kind': 'odd' if i % 2 else 'even'} for i in range(25)])
+    app_module._count_cache.clear()
+    return db['counted']
+
+
+def pagination(client, query):
+    response = client.get(f'/query/counted?{query}', headers=NO_CACHE)
+    assert response.status_code == 200
+    return response.get_json()['pagination']
+
+
+def test_exact_count_reports_totals_and_pages(client, counted):
+    page = pagination(client, 'limit=10&skip=10')
+    assert page['count_mode'] == 'exact'
+    assert (page['total'], page['total_pages'], page['page'], page['has_more']) == (25, 3, 2, True)
+    assert pagination(client, 'kind=odd&limit=10&skip=10')['has_more'] is False
+
+
+def test_no_count_detects_more_pages_from_one_extra_row(client, counted):
+    page = pagination(client, 'count=none&limit=10&skip=10')
+    assert 'total' not in page and page['count'] == 10 and page['has_more'] is True
+    last = pagination(client, 'count=none&limit=10&skip=20')
+    assert last['count'] == 5 and last['has_more'] is False
+
+
+def test_estimated_count_reuses_a_recent_filtered_count(client, counted):
+    assert pagination(client, 'count=estimated&kind=even&limit=5')['total'] == 13
+    counted.insert_one({'_id': 100, 'kind': 'even'})
+    assert pagination(client, 'count=estimated&kind=even&limit=5')['total'] == 13
+    assert pagination(client, 'count=exact&kind=even&limit=5')['total'] == 14
+    assert pagination(client, 'count=estimated&limit=5')['total'] == 26
+
+
+def test_unknown_count_mode_is_rejected(client, counted):
+    response = client.get('/query/counted?count=roughly', headers=NO_CACHE)
+    assert response.status_code == 400
+    assert 'count must be one of' in response.get_json()['error']
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from config import Config
+
+
+@pytest.fixture
+def people(db):
+    db['export_people'].delete_many({})
+    db['export_people'].insert_many([{'_id': i, 'age': 20 + i, 'name': f'p{i}', 'city': 'Oslo'} for i in range(30)])
+    return db['export_people']
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_export_streams_every_document_past_max_limit(client, people, monkeypatch):
+    monkeypatch.setattr(Config, 'MAX_LIMIT', 10)
+    response = client.get('/export/export_people')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+    assert sorted(doc['_id'] for doc in lines(response)) == list(range(30))
+
+
+def test_export_applies_filter_sort_skip_limit_and_fields(client, people):
+    response = client.get('/export/export_people?age__gte=26&sort=-age&skip=1&limit=3&fields=name')
+    assert lines(response) == [{'_id': 28, 'name': 'p28'}, {'_id': 27, 'name': 'p27'}, {'_id': 26, 'name': 'p26'}]
+
+
+def test_export_rejects_parallel_with_sort_before_streaming(client, people):
+    response = client.get('/export/export_people?parallel=2&sort=age')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+class FailingCursor:
+    """Cursor stand-in that dies after two documents"""
+
+    def __init__(self):
+        self.closed = False
+
+    def __iter__(self):
+        yield {'_id': 0}
+        yield {'_id': 1}
+        raise RuntimeError("cursor killed")
+
+    def close(self):
+        self.closed = True
+
+
+def test_a_mid_stream_failure_becomes_the_last_line_and_closes_the_cursor(app_module):
+    cursor = FailingCursor()
+    with app_module.app.test_request_context('/export/export_people'):
+        body = [json.loads(line) for line in app_module.ndjson_lines(cursor)]
+    assert body == [{'_id': 0}, {'_id': 1}, {"success": False, "error": "cursor killed"}]
+    assert cursor.closed
@@ -0,0 +1,159 @@
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from index_advisor import IndexAdvisor, normalize_filter, query_shape, suggest_indexes
+
+COLLSCAN = {'stage': 'COLLSCAN'}
+IXSCAN = {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'age_1'}}
+NO_CACHE = {'Cache-Control': 'no-cache'}
+
+
+class ExplainStub:
+    """db_instance stand-in whose explain command answers with a fixed winning plan"""
+
+    def __init__(self, mongo, winning_plan):
+        self.mongo = mongo
+        self.winning_plan = winning_plan
+        self.explained = []
+        self.db = SimpleNamespace(command=self.command)
+
+    def command(self, name, command, **kwargs):
+        assert name == 'explain'
+        self.explained.append(command)
+        return {'queryPlanner': {'winningPlan': self.winning_plan}}
+
+    def get_collection(self, name):
+        return self.mongo.get_collection(name)
+
+
+def settle(advisor):
+    """Wait for the advisor's background explains; its single worker runs them in order"""
+    advisor._executor.submit(lambda: None).result()
+
+
+@pytest.fixture
+def advised(app_module, db, monkeypatch):
+    """Enable the advisor for /query, backed by a stubbed explain; returns a plan setter"""
+    db['advised'].delete_many({})
+    db['advised'].insert_many([{'age': age, 'name': f'user{age}'} for age in range(5)])
+    stub = ExplainStub(app_module.db_instance, COLLSCAN)
+    advisor = IndexAdvisor(stub, max_shapes=50, reexplain_seconds=900)
+    monkeypatch.setattr(app_module, 'index_advisor', advisor)
+    monkeypatch.setattr(Config, 'INDEX_ADVISOR_ENABLED', True)
+    monkeypatch.setattr(Config, 'QUERY_UNINDEXED_MIN_DOCS', 1)
+    yield SimpleNamespace(advisor=advisor, stub=stub)
+    advisor._executor.shutdown(wait=True)
+
+
+def test_plan_for_summarizes_the_explain(advised):
+    plan = advised.advisor.plan_for('advised', {'age': 3}, [])
+    assert plan == {"collection_scan": True, "in_memory_sort": False,
+                    "indexes_used": [], "winning_plan_stages": ['COLLSCAN']}
+    advised.stub.winning_plan = IXSCAN
+    plan = advised.advisor.plan_for('advised', {'name': 'user1'}, [])
+    assert plan["indexes_used"] == ['age_1'] and not plan["collection_scan"]
+
+
+def test_query_warns_about_a_collection_scan(client, advised, monkeypatch):
+    monkeypatch.setattr(Config, 'QUERY_UNINDEXED_ACTION', 'warn')
+    response = client.get('/query/advised?age=3', headers=NO_CACHE)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['data'][0]['age'] == 3
+    assert 'collection scan' in body['warnings'][0]
+
+
+def test_query_rejects_a_collection_scan(client, advised, monkeypatch):
+    monkeypatch.setattr(Config, 'QUERY_UNINDEXED_ACTION', 'reject')
+    response = client.get('/query/advised?age=3', headers=NO_CACHE)
+    assert response.status_code == 400
+    assert '/admin/index-advice' in response.get_json()['error']
+
+
+def test_indexed_queries_pass_without_a_warning(client, advised, monkeypatch):
+    monkeypatch.setattr(Config, 'QUERY_UNINDEXED_ACTION', 'reject')
+    advised.stub.winning_plan = IXSCAN
+    response = client.get('/query/advised?age=3', headers=NO_CACHE)
+    assert response.status_code == 200
+    assert 'warnings' not in response.get_json()
+
+
+def test_filter_shapes_drop_values_and_classify_predicates():
+    shape = normalize_filter({'status': 'active', 'age': {'$gte': 18}, 'name': {'$regex': '^Ann'},
+                              'email': {'$regex': 'example', '$options': 'i'}, 'deleted': {'$ne': True}})
+    assert shape == ((('age', 'range'), ('deleted', 'negation'), ('email', 'regex'),
+                      ('name', 'prefix'), ('status', 'eq')), ())
+    assert normalize_filter({'status': 'a', 'age': {'$lt': 1}}) == normalize_filter({'age': {'$gt': 99}, 'status': 'b'})
+    assert normalize_filter({'$and': [{'a': 1}, {'b': {'$in': [1, 2]}}]}) == ((('a', 'eq'), ('b', 'eq')), ())
+
+
+def test_query_shape_separates_collections_and_sorts():
+    shape = query_shape('users', {'age': 30}, [('name', 1)])
+    assert shape == query_shape('users', {'age': 41}, [('name', 1)])
+    assert shape != query_shape('users', {'age': 30}, [('name', -1)])
+    assert shape != query_shape('orders', {'age': 30}, [('name', 1)])
+    assert query_shape('users', {}, [('score', {'$meta': 'textScore'})])[2] == (('score', 'textScore'),)
+
+
+def test_suggestions_put_equality_before_sort_before_range():
+    shape = normalize_filter({'age': {'$gt': 21}, 'status': 'active'})
+    suggestions, notes = suggest_indexes(shape, [('created', -1)])
+    assert suggestions == [[['status', 1], ['created', -1], ['age', 1]]]
+    assert notes == []
+
+
+def test_suggestions_cover_every_or_branch_and_note_unusable_regexes():
+    shape = normalize_filter({'tenant': 't1', '$or': [{'email': 'a@b.c'}, {'phone': '555'}]})
+    suggestions, _ = suggest_indexes(shape, [])
+    assert sorted(suggestions) == [[['tenant', 1], ['email', 1]], [['tenant', 1], ['phone', 1]]]
+    _, notes = suggest_indexes(normalize_filter({'name': {'$regex': 'ann'}}), [])
+    assert notes and notes[0].startswith('name:')
+
+
+def test_check_only_flags_large_unindexed_collections(advised, monkeypatch):
+    advisor = advised.advisor
+    monkeypatch.setattr(Config, 'QUERY_UNINDEXED_ACTION', 'off')
+    assert advisor.check('advised', {'age': 3}, []) is None
+    monkeypatch.setattr(Config, 'QUERY_UNINDEXED_ACTION', 'warn')
+    assert advisor.check('advised', {}, []) is None
+    assert 'age: eq' in advisor.check('advised', {'age': 3}, [])
+    monkeypatch.setattr(Config, 'QUERY_UNINDEXED_MIN_DOCS', 1000)
+    assert advisor.check('advised', {'age': 3}, []) is None
+
+
+def test_record_samples_a_plan_once_per_shape(advised):
+    advisor = advised.advisor
+    for age in range(3):
+        advisor.record('advised', {'age': age}, [('name', 1)], elapsed_ms=10.0, returned=1)
+        settle(advisor)
+    assert len(advised.stub.explained) == 1
+    (entry,) = advisor.advice()
+    assert entry["executions"] == 3 and entry["total_ms"] == 30.0
+    assert entry["collection_scans"] == 3
+    assert entry["suggested_indexes"] == [[['age', 1], ['name', 1]]]
+
+
+def test_indexed_shapes_are_only_listed_with_all(advised):
+    advised.stub.winning_plan = IXSCAN
+    advised.advisor.record('advised', {'age': 1}, [], elapsed_ms=1.0, returned=1)
+    settle(advised.advisor)
+    assert advised.advisor.advice() == []
+    (entry,) = advised.advisor.advice(include_all=True)
+    assert entry["indexes_used"] == ['age_1'] and 'suggested_indexes' not in entry
+
+
+def test_admin_index_advice_ranks_shapes_by_total_time(client, advised, monkeypatch):
+    monkeypatch.setattr(Config, 'QUERY_UNINDEXED_ACTION', 'warn')
+    advisor = advised.advisor
+    advisor.record('advised', {'age': 1}, [], elapsed_ms=5.0, returned=1)
+    advisor.record('advised', {'name': 'x'}, [], elapsed_ms=50.0, returned=0)
+    advisor.record('other', {'name': 'x'}, [], elapsed_ms=500.0, returned=0)
+    settle(advisor)
+
+    body = client.get('/admin/index-advice?collection=advised').get_json()
+    assert body["success"] and body["enabled"] and body["unindexed_action"] == 'warn'
+    assert [entry["filter_shape"] for entry in body["advice"]] == ['{name: eq}', '{age: eq}']
+    assert body["advice"][0]["suggested_indexes"] == [[['name', 1]]]
+    assert client.get('/admin/index-advice?limit=1').get_json()["advice"][0]["collection"] == 'other'
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+
+COLLECTION = 'keyset_mixed'
+NO_CACHE = {'Cache-Control': 'no-cache'}
+
+# Sort values spanning null, missing and several BSON types
+AGES = [30, None, 'n/a', 25, None, 41.5, True, datetime(2020, 1, 1), 30, 'abc', 18, None]
+
+
+@pytest.fixture
+def mixed_collection(db):
+    db[COLLECTION].drop()
+    docs = []
+    for i, age in enumerate(AGES):
+        doc = {'_id': i, 'name': f'person-{i}'}
+        if i != 4:  # doc 4 has no age at all
+            doc['age'] = age
+        docs.append(doc)
+    db[COLLECTION].insert_many(docs)
+    yield db[COLLECTION]
+    db[COLLECTION].drop()
+
+
+def expected_order(collection, direction):
+    return [doc['_id'] for doc in collection.find().sort([('age', direction), ('_id', 1)])]
+
+
+def walk(client, sort, cursor_param, cursor_key, limit=3):
+    ids, token = [], None
+    for _ in range(len(AGES) + 1):
+        url = f'/query/{COLLECTION}?paginate=keyset&sort={sort}&limit={limit}'
+        if token:
+            url += f'&{cursor_param}={token}'
+        response = client.get(url, headers=NO_CACHE)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        page = [doc['_id'] for doc in body['data']]
+        ids = page + ids if cursor_param == 'before' else ids + page
+        token = body['pagination'][cursor_key]
+        if not token or not page:
+            return ids, body
+    raise AssertionError("pagination did not terminate")
+
+
+@pytest.mark.parametrize('sort,direction', [('age', 1), ('-age', -1)])
+def test_keyset_pages_through_null_missing_and_mixed_types(client, mixed_collection, sort, direction):
+    ids, _ = walk(client, sort, 'after', 'next_cursor')
+    assert ids == expected_order(mixed_collection, direction)
+
+
+@pytest.mark.parametrize('sort,direction', [('age', 1), ('-age', -1)])
+def test_keyset_walks_back_with_before(client, mixed_collection, sort, direction):
+    expected = expected_order(mixed_collection, direction)
+    _, last_page = walk(client, sort, 'after', 'next_cursor')
+    # Start from the last page and follow prev_cursor back to the first document
+    first_of_last = last_page['data'][0]['_id']
+    token = last_page['pagination']['prev_cursor']
+    ids, _ = walk_back(client, sort, token)
+    assert ids + expected[expected.index(first_of_last):] == expected
+
+
+def walk_back(client, sort, token, limit=3):
+    ids = []
+    while token:
+        response = client.get(f'/query/{COLLECTION}?sort={sort}&limit={limit}&before={token}', headers=NO_CACHE)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        ids = [doc['_id'] for doc in body['data']] + ids
+        token = body['pagination']['prev_cursor']
+    return ids, body
+
+
+def test_keyset_rejects_non_scalar_sort_values(client, app_module, mixed_collection):
+    token = app_module.encode_page_token({'_id': 1, 'age': [1, 2]}, [('age', 1), ('_id', 1)])
+    response = client.get(f'/query/{COLLECTION}?sort=age&after={token}', headers=NO_CACHE)
+    assert response.status_code == 400
+    assert 'scalar' in response.get_json()['error']
+
+
+def test_keyset_exclusion_projection_hides_search_shadows(client, app_module, db):
+    shadow = app_module.Config.SEARCH_SHADOW_PREFIX
+    db['keyset_shadows'].drop()
+    db['keyset_shadows'].insert_many([{'_id': i, 'name': f'n{i}', 'secret': i, shadow: {'name': [f'n{i}']}}
+                                      for i in range(4)])
+    response = client.get('/query/keyset_shadows?paginate=keyset&sort=name&fields=-secret&limit=2',
+                          headers=NO_CACHE)
+    assert response.status_code == 200
+    for doc in response.get_json()['data']:
+        assert shadow not in doc and 'secret' not in doc
+    db['keyset_shadows'].drop()
@@ -0,0 +1,150 @@
+"""ModelClient and AsyncModelClient against a local stub of the model API"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+
+from config import Config
+from llm_client import AsyncModelClient, ModelClient
+from cache import MemoryBackend
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            behaviour = server.script.pop(0) if server.script else 'ok'
+        if behaviour == 'drop':
+            # Close the keep-alive connection without answering
+            self.close_connection = True
+            return
+        if behaviour == 'truncate':
+            # Promise a body, send part of it and hang up
+            self.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 64\r\n\r\n{"par')
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        if behaviour == 'slow':
+            time.sleep(server.slow_seconds)
+        body = json.dumps({"answer": server.requests}).encode()
+        try:
+            self.send_response(503 if behaviour == '503' else 200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out and hung up first
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.connections = set()
+    server.script = []
+    server.slow_seconds = 0.5
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/generate"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(Config, 'LLM_MAX_RETRIES', 2)
+    monkeypatch.setattr(Config, 'LLM_BACKOFF_BASE', 0)
+    monkeypatch.setattr(Config, 'LLM_CONNECT_TIMEOUT', 1.0)
+    monkeypatch.setattr(Config, 'LLM_READ_TIMEOUT', 0.2)
+    monkeypatch.setattr(Config, 'LLM_CACHE_TTL', 0)
+
+
+def test_sequential_calls_reuse_one_pooled_connection(stub_server):
+    client = ModelClient()
+    for i in range(3):
+        result, cached = client.generate(stub_server.url, 'model', {"prompt": i})
+        assert not cached and result["answer"] == i + 1
+    assert stub_server.requests == 3
+    assert len(stub_server.connections) == 1
+
+
+@pytest.mark.parametrize('failure', ['drop', 'truncate', '503'])
+def test_transient_failures_are_retried(stub_server, failure):
+    stub_server.script = [failure]
+    result, _ = ModelClient().generate(stub_server.url, 'model', {"prompt": failure})
+    assert result == {"answer": 2}
+    assert stub_server.requests == 2
+
+
+def test_read_timeout_is_retried_then_raised(stub_server):
+    stub_server.script = ['slow', 'slow', 'slow']
+    with pytest.raises(requests.exceptions.Timeout):
+        ModelClient().generate(stub_server.url, 'model', {"prompt": "slow"})
+    assert stub_server.requests == Config.LLM_MAX_RETRIES + 1
+
+
+def test_responses_are_cached(stub_server, monkeypatch):
+    monkeypatch.setattr(Config, 'LLM_CACHE_TTL', 60)
+    client = ModelClient()
+    first, _ = client.generate(stub_server.url, 'model', {"prompt": "same"})
+    second, cached = client.generate(stub_server.url, 'model', {"prompt": "same"})
+    assert cached and second == first
+    assert stub_server.requests == 1
+
+
+def run_async(coroutine_fn):
+    async def main():
+        client = AsyncModelClient(MemoryBackend(16))
+        try:
+            return await coroutine_fn(client)
+        finally:
+            await client.close()
+    return asyncio.run(main())
+
+
+def test_async_calls_reuse_one_pooled_connection(stub_server):
+    async def calls(client):
+        return [(await client.generate(stub_server.url, 'model', {"prompt": i}))[0] for i in range(3)]
+
+    assert [result["answer"] for result in run_async(calls)] == [1, 2, 3]
+    assert len(stub_server.connections) == 1
+
+
+def test_async_dropped_connections_are_retried(stub_server):
+    stub_server.script = ['drop', 'truncate']
+
+    async def call(client):
+        return await client.generate(stub_server.url, 'model', {"prompt": "drop"})
+
+    result, _ = run_async(call)
+    assert result == {"answer": 3}
+    assert stub_server.requests == 3
+
+
+def test_async_read_timeout_is_retried_then_raised(stub_server):
+    stub_server.script = ['slow', 'slow', 'slow']
+
+    async def call(client):
+        return await client.generate(stub_server.url, 'model', {"prompt": "slow"})
+
+    with pytest.raises(httpx.TimeoutException):
+        run_async(call)
+    assert stub_server.requests == Config.LLM_MAX_RETRIES + 1
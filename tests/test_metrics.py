@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from metrics import (
+    OTHER_COLLECTION, Counter, Histogram, MetricsRegistry, begin_request, end_request, phase
+)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', 'Latency', ('route',), buckets=[0.1, 1])
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, '/q')
+    assert list(histogram.samples()) == [
+        'latency_seconds_bucket{route="/q",le="0.1"} 1',
+        'latency_seconds_bucket{route="/q",le="1"} 3',
+        'latency_seconds_bucket{route="/q",le="+Inf"} 4',
+        'latency_seconds_sum{route="/q"} 4.25',
+        'latency_seconds_count{route="/q"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter('hits_total', 'Hits', ('collection',))
+    counter.inc('we"ird\\name\n')
+    counter.inc('we"ird\\name\n', amount=2)
+    assert list(counter.samples()) == ['hits_total{collection="we\\"ird\\\\name\\n"} 3']
+
+
+def test_collection_labels_are_capped():
+    registry = MetricsRegistry(max_collections=2)
+    assert [registry.collection_label(name) for name in ('a', 'b', 'c', 'a', '')] == ['a', 'b', OTHER_COLLECTION, 'a', '']
+
+
+def test_render_writes_help_and_type_and_skips_unknown_gauges():
+    registry = MetricsRegistry(max_collections=10)
+    text = registry.render([('pool_open', 'gauge', 'Open connections', 3), ('pool_max', 'gauge', 'Max', None)])
+    assert '# TYPE http_requests_total counter\n' in text
+    assert text.endswith('# HELP pool_open Open connections\n# TYPE pool_open gauge\npool_open 3\n')
+    assert 'pool_max' not in text
+
+
+def test_phases_leave_out_time_already_counted_as_io():
+    stats = begin_request('GET', '/query/x')
+    try:
+        with phase('parse'):
+            time.sleep(0.02)
+            stats.add_command(0.015)  # what the command listener reports meanwhile
+    finally:
+        end_request()
+    assert stats.commands == 1 and stats.phases['mongo'] == pytest.approx(0.015)
+    assert 0.0 <= stats.phases['parse'] < 0.02
+
+
+def test_metrics_endpoint_counts_requests_documents_and_pool_state(client, db):
+    db['metered'].delete_many({})
+    db['metered'].insert_many([{'n': i} for i in range(3)])
+    # The request is accounted when the server closes the response body
+    client.get('/query/metered', headers={'Cache-Control': 'no-cache'}).close()
+
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/query/<collection_name>",collection="metered",status="200"} 1' in text
+    assert 'http_response_documents_total{route="/query/<collection_name>",collection="metered"} 3' in text
+    assert 'http_request_phase_seconds_count{route="/query/<collection_name>",collection="metered",phase="parse"} 1' in text
+    assert '\nmongodb_pool_max_size ' in text and '\nresult_cache_hits_total ' in text
@@ -0,0 +1,109 @@
+import gzip
+
+import pytest
+
+import negotiation
+from config import Config
+from negotiation import (
+    ValidatorIndex, compress, compress_chunks, etag_matches, negotiate_encoding, representation_tag
+)
+
+
+@pytest.fixture
+def all_codings(monkeypatch):
+    monkeypatch.setattr(negotiation, '_ENCODING_OFFERS', ['zstd', 'br', 'gzip'])
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip, br, zstd', 'zstd'),
+    ('gzip, br', 'br'),
+    ('gzip;q=1, br;q=0.5', 'gzip'),
+    ('deflate', None),
+    ('*', 'zstd'),
+    ('br;q=0, *;q=0.1', 'zstd'),
+    ('', None),
+])
+def test_equally_rated_codings_follow_the_configured_order(all_codings, accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_gzip_round_trips_whole_and_streamed_bodies():
+    body = b'{"n": 1}\n' * 500
+    assert gzip.decompress(compress(body, 'gzip')) == body
+    chunks = ['{"n": 1}\n'] * 500
+    assert gzip.decompress(b''.join(compress_chunks(iter(chunks), 'gzip'))) == body
+
+
+@pytest.mark.parametrize('encoding, module', [('br', 'brotli'), ('zstd', 'zstandard')])
+def test_optional_codings_round_trip(encoding, module):
+    library = pytest.importorskip(module)
+    body = b'{"n": 1}\n' * 500
+    compressed = compress(body, encoding)
+    if encoding == 'br':
+        assert library.decompress(compressed) == body
+    else:
+        assert library.ZstdDecompressor().decompressobj().decompress(compressed) == body
+
+
+def test_etags_compare_weakly_and_differ_per_coding():
+    assert representation_tag('abc', 'gzip') == 'abc-gzip' and representation_tag('abc', None) == 'abc'
+    assert etag_matches('W/"abc", "def"', 'abc')
+    assert etag_matches('*', 'abc')
+    assert not etag_matches('"abc"', 'abc-gzip') and not etag_matches(None, 'abc')
+
+
+def test_validators_are_dropped_when_their_collection_changes():
+    index = ValidatorIndex(max_entries=10)
+    index.remember('q', 'people', index.marker('people'), 'tag', ttl=60)
+    index.remember('c', '', index.marker(''), 'catalog', ttl=60)
+    assert index.lookup('q') == 'tag'
+    index.changed('orders')
+    assert index.lookup('q') == 'tag' and index.lookup('c') is None
+    index.changed('people')
+    assert index.lookup('q') is None
+
+
+@pytest.fixture
+def tagged(db):
+    db['tagged'].delete_many({})
+    db['tagged'].insert_many([{'_id': i, 'text': 'x' * 100} for i in range(30)])
+    return db['tagged']
+
+
+def test_query_responses_are_tagged_and_revalidated(client, tagged):
+    first = client.get('/query/tagged')
+    tag = first.headers['ETag']
+    assert first.status_code == 200 and tag
+    again = client.get('/query/tagged', headers={'If-None-Match': tag})
+    assert again.status_code == 304 and again.get_data() == b''
+
+
+def test_unchanged_collections_answer_304_without_running_the_query(client, app_module, tagged, monkeypatch):
+    tag = client.get('/query/tagged?limit=5').headers['ETag']
+    calls = []
+    monkeypatch.setattr(app_module, 'open_query_cursor', lambda *args: calls.append(args))
+    early = app_module.validators.counters['not_modified_early']
+    assert client.get('/query/tagged?limit=5', headers={'If-None-Match': tag}).status_code == 304
+    assert calls == [] and app_module.validators.counters['not_modified_early'] == early + 1
+
+
+def test_a_write_invalidates_the_early_304(client, app_module, tagged):
+    tag = client.get('/query/tagged?limit=3').headers['ETag']
+    app_module.on_collection_change('tagged')
+    tagged.delete_one({'_id': 0})
+    response = client.get('/query/tagged?limit=3', headers={'If-None-Match': tag})
+    assert response.status_code == 200 and response.headers['ETag'] != tag
+
+
+def test_large_bodies_are_gzipped_for_clients_that_accept_it(client, tagged, monkeypatch):
+    monkeypatch.setattr(negotiation, '_ENCODING_OFFERS', ['gzip'])
+    monkeypatch.setattr(Config, 'COMPRESSION_MIN_BYTES', 1024)
+    plain = client.get('/query/tagged', headers={'Cache-Control': 'no-cache'})
+    compressed = client.get('/query/tagged', headers={'Accept-Encoding': 'gzip', 'Cache-Control': 'no-cache'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    assert compressed.headers['ETag'] == plain.headers['ETag'].rstrip('"') + '-gzip"'
+    small = client.get('/query/tagged?limit=1&fields=_id', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
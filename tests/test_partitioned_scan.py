@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from config import Config
+from partitioned_scan import (
+    PartitionedScanner, partition_boundaries, partition_filters, partition_safe, usable_boundaries
+)
+
+
+@pytest.fixture
+def numbers(db, monkeypatch):
+    monkeypatch.setattr(Config, 'EXPORT_BATCH_SIZE', 7)
+    monkeypatch.setattr(Config, 'SCAN_QUEUE_BATCHES', 2)
+    collection = db['scan_numbers']
+    collection.delete_many({})
+    collection.insert_many([{'_id': i, 'even': i % 2 == 0} for i in range(100)])
+    collection.insert_many([{'_id': 'a', 'even': True}, {'_id': 'b', 'even': False}])
+    return collection
+
+
+@pytest.fixture
+def scanner():
+    scanner = PartitionedScanner(max_workers=4)
+    yield scanner
+    scanner._executor.shutdown(wait=True)
+
+
+def test_partitions_match_every_document_exactly_once(numbers):
+    filters = partition_filters([25, 50, 75])
+    assert len(filters) == 5  # four ranges and one for _ids of other types
+    counts = [numbers.count_documents(condition) for condition in filters]
+    assert counts == [25, 25, 25, 25, 2]
+    assert partition_filters([]) == [{}]
+
+
+def test_sampled_boundaries_are_ascending_and_of_one_type(numbers):
+    boundaries = partition_boundaries(numbers, {'_id': {'$type': 'number'}}, 4, method='sample')
+    assert 1 <= len(boundaries) <= 3 and boundaries == sorted(boundaries)
+    assert partition_boundaries(numbers, {}, 1) == []
+    assert usable_boundaries([5, 'x']) == []
+    with pytest.raises(ValueError):
+        partition_boundaries(numbers, {}, 4, method='splitVector')
+
+
+def test_only_per_document_stages_can_be_partitioned():
+    assert partition_safe([{'$match': {}}, {'$project': {'a': 1}}, {'$unwind': '$a'}])
+    assert not partition_safe([{'$match': {}}, {'$group': {'_id': None}}])
+    assert not partition_safe([{'$sort': {'a': 1}}])
+
+
+def test_ordered_scans_return_documents_in_id_order(numbers, scanner, monkeypatch):
+    monkeypatch.setattr(Config, 'SCAN_BOUNDARY_METHOD', 'sample')
+    ids = [doc['_id'] for doc in scanner.find(numbers, {'even': True}, None, partitions=4, ordered=True)]
+    assert ids == list(range(0, 100, 2)) + ['a']
+
+
+def test_unordered_scans_return_every_match_once(numbers, scanner):
+    ids = [doc['_id'] for doc in scanner.find(numbers, {}, {'_id': 1}, partitions=4)]
+    assert len(ids) == 102 and set(ids) == set(range(100)) | {'a', 'b'}
+
+
+def test_partitioned_aggregates_match_the_range_first(numbers, scanner):
+    documents = scanner.aggregate(numbers, [{'$match': {'even': False}}, {'$project': {'even': 0}}],
+                                  partitions=3, ordered=True)
+    assert list(documents) == [{'_id': i} for i in range(1, 100, 2)] + [{'_id': 'b'}]
+    with pytest.raises(ValueError, match='cannot be split'):
+        scanner.aggregate(numbers, [{'$group': {'_id': None}}], partitions=3)
+
+
+def test_closing_a_scan_early_releases_the_workers(numbers, scanner):
+    documents = scanner.find(numbers, {}, None, partitions=4)
+    assert next(documents)
+    documents.close()
+    # Blocked producers notice the closed stream and the pool takes new work again
+    assert scanner._executor.submit(lambda: 'free').result(timeout=5) == 'free'
+
+
+def test_parallel_export_streams_the_whole_collection(client, numbers):
+    response = client.get('/export/scan_numbers?parallel=3&ordered=true')
+    ids = [json.loads(line)['_id'] for line in response.get_data(as_text=True).splitlines()]
+    assert ids == list(range(100)) + ['a', 'b']
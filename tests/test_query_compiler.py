@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+from werkzeug.datastructures import MultiDict
+
+from config import Config
+from query_compiler import QueryCompiler, compile_filter_params, parse_value
+
+TYPES = {'zip': ['str'], 'age': ['int'], 'active': ['bool'], 'score': ['float', 'str']}
+
+
+class Hints:
+    """Schema profiler stand-in that counts lookups"""
+
+    def __init__(self, types):
+        self.types = types
+        self.lookups = 0
+
+    def field_types(self, collection_name):
+        self.lookups += 1
+        return self.types
+
+
+@pytest.fixture(autouse=True)
+def type_hints(monkeypatch):
+    monkeypatch.setattr(Config, 'QUERY_TYPE_HINTS', True)
+
+
+@pytest.mark.parametrize('raw, parsed', [
+    ('573a1390f29313caabcd4135', ObjectId('573a1390f29313caabcd4135')),
+    ('-12', -12),
+    ('7.5', 7.5),
+    ('TRUE', True),
+    ('2012-03-01T00:00:00Z', datetime(2012, 3, 1, tzinfo=timezone.utc)),
+    ('Drama', 'Drama'),
+])
+def test_parse_value_guesses_types_without_hints(raw, parsed):
+    assert parse_value(raw) == parsed
+
+
+def test_profiled_types_decide_the_coercion():
+    compiled = compile_filter_params((('zip', '02134'), ('age', '30'), ('active', 'false'), ('score', 'n/a')), TYPES)
+    assert compiled == {'zip': '02134', 'age': 30, 'active': False, 'score': 'n/a'}
+
+
+def test_values_that_fit_no_profiled_type_are_rejected():
+    with pytest.raises(ValueError, match="Invalid value 'old' for field 'age'"):
+        compile_filter_params((('age', 'old'),), TYPES)
+
+
+def test_operators_on_one_field_are_merged():
+    params = (('age', '40'), ('age__gte', '18'), ('age__lte', '65'), ('tag__in', 'a, b'), ('name__regex', '^ann'))
+    assert compile_filter_params(params, TYPES) == {
+        'age': {'$eq': 40, '$gte': 18, '$lte': 65},
+        'tag': {'$in': ['a', 'b']},
+        'name': {'$regex': '^ann', '$options': 'i'},
+    }
+    assert compile_filter_params((('a__bogus', '1'),), {}) == {'a__bogus': 1}
+
+
+def test_compiled_filters_are_memoized_per_normalized_parameters():
+    hints = Hints(TYPES)
+    compiler = QueryCompiler(hints, cache_size=2, hints_ttl=3600)
+    first = compiler.compile('people', MultiDict([('age', '30'), ('zip', '02134'), ('limit', '5')]))
+    again = compiler.compile('people', MultiDict([('zip', '02134'), ('age', '30')]))
+    assert again is first
+    assert compiler.stats() == {"plans": 1, "max_plans": 2, "hits": 1, "misses": 1}
+    assert hints.lookups == 1
+
+    compiler.compile('people', MultiDict([('age', '1')]))
+    compiler.compile('people', MultiDict([('age', '2')]))
+    assert compiler.stats()["plans"] == 2
+
+
+def test_changed_type_hints_drop_the_collections_plans():
+    hints = Hints({'zip': ['str']})
+    compiler = QueryCompiler(hints, cache_size=10, hints_ttl=0)
+    assert compiler.compile('people', MultiDict([('zip', '02134')])) == {'zip': '02134'}
+    hints.types = {'zip': ['int']}
+    assert compiler.compile('people', MultiDict([('zip', '02134')])) == {'zip': 2134}
+
+
+def test_hints_are_fresh_once_loaded():
+    compiler = QueryCompiler(Hints(TYPES), cache_size=10, hints_ttl=3600)
+    assert not compiler.hints_fresh('people')
+    compiler.field_types('people')
+    assert compiler.hints_fresh('people')
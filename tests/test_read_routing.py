@@ -0,0 +1,117 @@
+import pytest
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary
+
+from config import Config
+from read_routing import ROUTES, ReadRouter, overrides_from
+
+ROUTE_SETTINGS = {
+    "aggregate": {"mode": "secondary", "tags": [{"workload": "analytics"}, {}],
+                  "max_staleness_seconds": 120, "read_concern": "majority"},
+    "export": {"mode": "nearest", "read_concern": "local"},
+    "query": {"mode": "primaryPreferred"},
+    "collections": {"mode": "primary", "read_concern": "linearizable"},
+}
+DEFAULTS = {"mode": "secondaryPreferred", "read_concern": "available"}
+
+
+@pytest.fixture
+def router():
+    return ReadRouter(ROUTE_SETTINGS, DEFAULTS)
+
+
+def test_configured_routes_get_their_read_preference_and_concern(router):
+    aggregate = router.route('aggregate')
+    assert aggregate.read_preference == Secondary(tag_sets=[{"workload": "analytics"}, {}], max_staleness=120)
+    assert aggregate.read_concern == ReadConcern('majority')
+
+    export = router.route('export')
+    assert export.read_preference == Nearest()
+    assert export.read_concern == ReadConcern('local')
+
+    query = router.route('query')
+    assert query.read_preference == PrimaryPreferred()
+    assert query.read_concern is None
+
+    collections = router.route('collections')
+    assert collections.read_preference == Primary()
+    assert collections.read_concern == ReadConcern('linearizable')
+
+
+@pytest.mark.parametrize('name', sorted(set(ROUTES) - set(ROUTE_SETTINGS)))
+def test_unlisted_routes_fall_back_to_the_defaults(router, name):
+    route = router.route(name)
+    assert route.read_preference.mongos_mode == 'secondaryPreferred'
+    assert route.read_concern == ReadConcern('available')
+
+
+def test_without_settings_reads_keep_the_client_defaults():
+    route = ReadRouter({}, {}).route('query')
+    assert route.read_preference is None and route.read_concern is None
+    assert route.options() == {}
+
+
+def test_invalid_route_settings_fall_back_to_the_defaults():
+    router = ReadRouter({"schema": {"mode": "secondary", "max_staleness_seconds": 10}}, DEFAULTS)
+    assert router.route('schema').read_preference.mongos_mode == 'secondaryPreferred'
+
+
+def test_invalid_defaults_keep_the_client_settings():
+    router = ReadRouter({}, {"mode": "sometimes"})
+    assert router.route('query').options() == {}
+
+
+def test_override_mode_drops_the_route_tags_and_staleness(router):
+    route = router.route('aggregate', {"mode": "nearest"})
+    assert route.read_preference == Nearest()
+    assert route.read_concern == ReadConcern('majority')
+
+
+def test_override_tags_are_parsed_from_json(router):
+    route = router.route('query', {"mode": "secondary", "tags": '[{"dc": "east"}]'})
+    assert route.read_preference == Secondary(tag_sets=[{"dc": "east"}])
+
+
+@pytest.mark.parametrize('overrides', [
+    {"mode": "sometimes"},
+    {"read_concern": "snapshot-ish"},
+    {"mode": "secondary", "max_staleness_seconds": "30"},
+    {"mode": "secondary", "read_concern": "linearizable"},
+    {"mode": "primary", "tags": '[{"dc": "east"}]'},
+    {"mode": "secondary", "tags": "not json"},
+])
+def test_invalid_overrides_raise_value_error(router, overrides):
+    with pytest.raises(ValueError):
+        router.route('query', overrides)
+
+
+def test_overrides_from_request_parameters(monkeypatch):
+    params = {"read_preference": "secondary", "read_concern": "majority", "limit": "5", "max_staleness_seconds": ""}
+    monkeypatch.setattr(Config, 'READ_ROUTING_OVERRIDES', True)
+    assert overrides_from(params) == {"mode": "secondary", "read_concern": "majority"}
+    monkeypatch.setattr(Config, 'READ_ROUTING_OVERRIDES', False)
+    assert overrides_from(params) == {}
+
+
+def test_route_options_reach_the_collection(app_module, router):
+    collection = app_module.db_instance.get_collection('routed', router.route('aggregate'))
+    assert collection.read_preference == router.route('aggregate').read_preference
+    assert collection.read_concern == ReadConcern('majority')
+
+
+def test_query_rejects_invalid_read_preference_with_400(client):
+    response = client.get('/query/routed?read_preference=sometimes', headers={'Cache-Control': 'no-cache'})
+    assert response.status_code == 400
+    assert 'read_preference' in response.get_json()['error']
+
+
+def test_query_cache_keeps_read_route_overrides_apart(client, db, monkeypatch):
+    monkeypatch.setattr(Config, 'READ_ROUTING_OVERRIDES', True)
+    db['routed_cache'].delete_many({})
+    db['routed_cache'].insert_one({'n': 1})
+    assert client.get('/query/routed_cache').get_json()['pagination']['count'] == 1
+
+    db['routed_cache'].insert_one({'n': 2})  # not through the API, so the cached entry stays
+    assert client.get('/query/routed_cache').get_json()['pagination']['count'] == 1
+    overridden = client.get('/query/routed_cache?read_preference=secondary').get_json()
+    assert overridden['pagination']['count'] == 2
@@ -0,0 +1,79 @@
+import pytest
+
+import cache
+from cache import DATABASE_SCOPE, MemoryBackend, ResultCache
+from config import Config
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_memory_backend_expires_entries_after_their_ttl(clock):
+    backend = MemoryBackend(max_entries=10)
+    backend.set('a', 1, ttl=5)
+    clock.now += 4.9
+    assert backend.get('a') == 1
+    clock.now += 0.2
+    assert backend.get('a') is None and backend.size() == 0
+
+
+def test_memory_backend_evicts_the_least_recently_used(clock):
+    backend = MemoryBackend(max_entries=2)
+    backend.set('a', 1, ttl=60)
+    backend.set('b', 2, ttl=60)
+    backend.get('a')
+    backend.set('c', 3, ttl=60)
+    assert (backend.get('a'), backend.get('b'), backend.get('c')) == (1, None, 3)
+    assert backend.evictions == 1
+
+
+def test_keys_ignore_part_order_and_invalidation_is_per_collection():
+    results = ResultCache(MemoryBackend(10), {'query': 60, 'collections': 60})
+    assert ResultCache.make_key('query', 'users', a=1, b=2) == ResultCache.make_key('query', 'users', b=2, a=1)
+    users = ResultCache.make_key('query', 'users', a=1)
+    orders = ResultCache.make_key('query', 'orders', a=1)
+    catalog = ResultCache.make_key('collections', DATABASE_SCOPE)
+    for key in (users, orders):
+        results.set('query', key, {'key': key})
+    results.set('collections', catalog, ['users', 'orders'])
+
+    results.invalidate('users')
+    assert results.get('query', users) is None
+    assert results.get('query', orders) == {'key': orders}
+    assert results.get('collections', catalog) is None  # embeds per-collection counts
+    assert results.stats()['invalidations'] == 1
+
+
+def test_endpoints_without_a_ttl_are_not_cached():
+    results = ResultCache(MemoryBackend(10), {'query': 0})
+    results.set('query', 'k', {'x': 1})
+    assert results.get('query', 'k') is None
+
+
+def test_query_results_are_cached_until_a_bulk_write(client, db, monkeypatch):
+    monkeypatch.setattr(Config, 'BULK_WRITES_ENABLED', True)
+    db['cached_people'].delete_many({})
+    db['cached_people'].insert_one({'_id': 1, 'name': 'a'})
+    assert client.get('/query/cached_people').get_json()['pagination']['count'] == 1
+
+    db['cached_people'].insert_one({'_id': 2, 'name': 'b'})  # behind the API's back
+    assert client.get('/query/cached_people').get_json()['pagination']['count'] == 1
+    assert client.get('/query/cached_people', headers={'Cache-Control': 'no-cache'}).get_json()['pagination']['count'] == 2
+
+    response = client.post('/collection/cached_people/bulk', data='{"op": "insert", "document": {"_id": 3}}\n',
+                           content_type='application/x-ndjson')
+    assert response.status_code == 200
+    response.get_data()  # the stream runs the writes
+    assert client.get('/query/cached_people').get_json()['pagination']['count'] == 3
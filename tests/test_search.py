@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from search import SEARCH_WORD_PATTERN, SearchEngine, normalize_search_term, shadow_field
+
+
+class RecordingCollection:
+    """Collection stand-in that keeps the update pipeline instead of running it"""
+
+    def __init__(self):
+        self.pipelines = []
+
+    def update_many(self, filter_dict, pipeline):
+        self.pipelines.append(pipeline)
+        return SimpleNamespace(modified_count=0)
+
+    def create_index(self, keys):
+        return f"{keys[0][0]}_1"
+
+
+def test_search_terms_collapse_inner_whitespace_and_lowercase():
+    assert normalize_search_term("  New \t York\n City ") == "new york city"
+    assert normalize_search_term("") == ""
+
+
+def test_prefix_filter_uses_the_normalized_term():
+    search_filter = SearchEngine._prefix_filter("Ned   Stark", ['name'])
+    assert search_filter == {'$or': [{shadow_field('name'): {'$regex': '^ned\\ stark'}}]}
+
+
+def test_shadows_are_written_with_the_same_normalization():
+    collection = RecordingCollection()
+    engine = SearchEngine(SimpleNamespace(get_collection=lambda name: collection), index_ttl=60)
+    engine.build_prefix_shadows('people', ['name'])
+
+    (stage,) = collection.pipelines[0]
+    written = stage['$set'][shadow_field('name')]['$cond'][1]
+    words = written['$toLower']['$reduce']['input']['$regexFindAll']
+    assert words == {'input': '$name', 'regex': SEARCH_WORD_PATTERN}
@@ -0,0 +1,95 @@
+import json
+import re
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import bson
+import pytest
+from bson import Binary, Decimal128, ObjectId, Regex, Timestamp
+
+import serialization
+from serialization import BSON_MIMETYPE, JSON_MIMETYPE, MSGPACK_MIMETYPE, dumps, dumps_as
+
+OID = ObjectId('573a1390f29313caabcd4135')
+WHEN = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+UUID = uuid.UUID('12345678-1234-5678-1234-567812345678')
+
+DOCUMENT = {
+    '_id': OID,
+    'created': WHEN,
+    'price': Decimal128('19.990000000000000001'),
+    'ratio': Decimal('0.1'),
+    'token': Binary(UUID.bytes, 4),
+    'blob': b'\x00\x01',
+    'ts': Timestamp(1700000000, 3),
+    'pattern': Regex('^ab', 'i'),
+    'compiled': re.compile('^cd'),
+    'tags': ('a', 'b'),
+    'nested': [{'ref': OID}],
+}
+
+EXPECTED = {
+    '_id': '573a1390f29313caabcd4135',
+    'created': '2024-05-01T12:30:00+00:00',
+    'price': '19.990000000000000001',
+    'ratio': '0.1',
+    'token': '12345678-1234-5678-1234-567812345678',
+    'blob': 'AAE=',
+    'ts': {'t': 1700000000, 'i': 3},
+    'pattern': '^ab',
+    'compiled': '^cd',
+    'tags': ['a', 'b'],
+    'nested': [{'ref': '573a1390f29313caabcd4135'}],
+}
+
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(serialization, 'orjson', None)
+    return request.param
+
+
+def test_bson_values_encode_in_one_pass(encoder):
+    assert json.loads(dumps(DOCUMENT)) == EXPECTED
+
+
+def test_integers_beyond_64_bits_fall_back_to_the_stdlib_encoder(encoder):
+    assert json.loads(dumps({'big': 2 ** 70})) == {'big': 2 ** 70}
+
+
+def test_unknown_types_still_raise():
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+
+def test_bson_bodies_keep_native_types():
+    body, mimetype = dumps_as({'_id': OID, 'created': WHEN, 'ratio': Decimal('0.1')}, BSON_MIMETYPE)
+    assert mimetype == BSON_MIMETYPE
+    decoded = bson.decode(body)
+    assert decoded['_id'] == OID and decoded['ratio'] == Decimal128('0.1')
+    # A top-level list cannot be a BSON document
+    assert dumps_as([1, 2], BSON_MIMETYPE)[1] == JSON_MIMETYPE
+
+
+def test_msgpack_bodies_decode_to_the_json_values():
+    msgpack = pytest.importorskip('msgpack')
+    body, mimetype = dumps_as({'_id': OID, 'n': 1}, MSGPACK_MIMETYPE)
+    assert mimetype == MSGPACK_MIMETYPE
+    assert msgpack.unpackb(body) == {'_id': str(OID), 'n': 1}
+
+
+def test_jsonify_encodes_raw_documents(app_module):
+    with app_module.app.app_context():
+        response = app_module.jsonify({'data': [DOCUMENT]})
+    assert response.get_json()['data'] == [EXPECTED]
+
+
+def test_query_returns_raw_documents_as_json(client, db):
+    db['serialized'].delete_many({})
+    db['serialized'].insert_one({'_id': OID, 'created': WHEN.replace(tzinfo=None), 'price': Decimal128('1.10')})
+    body = client.get('/query/serialized', headers={'Cache-Control': 'no-cache'}).get_json()
+    assert body['data'] == [{'_id': str(OID), 'created': '2024-05-01T12:30:00', 'price': '1.10'}]
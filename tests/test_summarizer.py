@@ -0,0 +1,99 @@
+import pytest
+
+import summarizer
+from config import Config
+from summarizer import build_prompt, build_summary, select_fields, stats_pipeline
+
+DISCOVERY = {
+    'examples': [{'_id': 1, 'age': 31, 'city': 'Oslo'}],
+    'fields': [
+        {'_id': '_id', 'present': 4, 'types': ['int']},
+        {'_id': 'age', 'present': 4, 'types': ['int', 'double']},
+        {'_id': 'city', 'present': 3, 'types': ['string']},
+        {'_id': 'joined', 'present': 2, 'types': ['date']},
+        {'_id': 'tags', 'present': 1, 'types': ['array']},
+    ],
+    'sampled': [{'n': 4}]
+}
+STATS = {
+    'f0': [{'_id': None, 'min': 19, 'max': 64, 'avg': 37.25, 'n': 4}],
+    'f1': [{'_id': 'Oslo', 'n': 2}, {'_id': 'Bergen', 'n': 1}],
+}
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(Config, 'ANALYZE_MAX_FIELDS', 30)
+    monkeypatch.setattr(Config, 'ANALYZE_STATS_SAMPLE', 1000)
+    monkeypatch.setattr(Config, 'ANALYZE_TOKEN_BUDGET', 3000)
+
+
+def test_field_selection_skips_ids_and_is_capped(monkeypatch):
+    assert [field['name'] for field in select_fields(DISCOVERY['fields'])] == ['age', 'city', 'joined', 'tags']
+    monkeypatch.setattr(Config, 'ANALYZE_MAX_FIELDS', 2)
+    assert [field['name'] for field in select_fields(DISCOVERY['fields'])] == ['age', 'city']
+
+
+def test_statistics_run_over_a_bounded_sample_with_one_facet_per_useful_field():
+    pipeline = stats_pipeline(select_fields(DISCOVERY['fields']))
+    assert pipeline[0] == {'$sample': {'size': 1000}}
+    facets = pipeline[1]['$facet']
+    assert sorted(facets) == ['f0', 'f1', 'f2']  # arrays have no statistics
+    assert '$avg' in facets['f0'][1]['$group']['avg']
+    assert facets['f1'][-1] == {'$limit': Config.ANALYZE_TOP_VALUES}
+    assert stats_pipeline([{'name': 'tags', 'types': ['array']}]) is None
+
+
+def test_summary_combines_presence_ranges_and_top_values():
+    summary = build_summary('people', 1200, DISCOVERY, STATS)
+    age, city, joined, _ = summary['fields']
+    assert summary['estimated_count'] == 1200 and summary['sampled'] == 4
+    assert age['presence'] == 1.0 and age['stats'] == {'min': 19, 'max': 64, 'avg': 37.25}
+    assert city['presence'] == 0.75 and city['top_values'] == [['Oslo', 2], ['Bergen', 1]]
+    assert 'stats' not in joined and 'top_values' not in joined
+
+
+def test_prompt_describes_the_summary():
+    prompt = build_prompt(build_summary('people', 1200, DISCOVERY, STATS), "Find trends.")
+    assert "about 1200 records" in prompt and "random sample of 4 documents" in prompt
+    assert "- age (double/int, present in 100%): min 19, max 64, avg 37.25" in prompt
+    assert "- city (string, present in 75%): top values Oslo (2), Bergen (1)" in prompt
+    assert prompt.endswith("Find trends. Please provide insights based on this data.")
+
+
+def test_prompt_drops_examples_then_fields_to_fit_the_token_budget(monkeypatch):
+    summary = build_summary('people', 1200, DISCOVERY, STATS)
+    full = build_prompt(summary, "Goals.")
+    monkeypatch.setattr(Config, 'ANALYZE_TOKEN_BUDGET', (len(full) - 5) // summarizer.CHARS_PER_TOKEN)
+    trimmed = build_prompt(summary, "Goals.")
+    assert len(trimmed) <= Config.ANALYZE_TOKEN_BUDGET * summarizer.CHARS_PER_TOKEN
+    assert "Example rows:" not in trimmed and "- age" in trimmed
+    monkeypatch.setattr(Config, 'ANALYZE_TOKEN_BUDGET', 40)
+    assert len(build_prompt(summary, "Goals.")) <= 160
+
+
+class CannedCollection:
+    """Collection stand-in answering the discovery and statistics pipelines in order"""
+
+    name = 'people'
+
+    def __init__(self, count, *results):
+        self.count = count
+        self.results = list(results)
+        self.pipelines = []
+
+    def estimated_document_count(self):
+        return self.count
+
+    def aggregate(self, pipeline, **options):
+        self.pipelines.append(pipeline)
+        return iter([self.results.pop(0)])
+
+
+def test_summaries_take_two_sampled_aggregations_and_skip_empty_collections():
+    collection = CannedCollection(1200, DISCOVERY, STATS)
+    summary = summarizer.summarize_collection(collection)
+    assert [pipeline[0] for pipeline in collection.pipelines] == [
+        {'$sample': {'size': Config.ANALYZE_DISCOVERY_SAMPLE}}, {'$sample': {'size': 1000}}]
+    assert summary == build_summary('people', 1200, DISCOVERY, STATS)
+    assert summarizer.summarize_collection(CannedCollection(0)) is None
@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import Config
+from views import ViewBusy, ViewManager, ViewNotFound, view_target
+
+
+class SourceProxy:
+    """Source collection that records pipelines; $merge is not run because mongomock lacks it"""
+
+    def __init__(self, collection, mongo):
+        self.collection = collection
+        self.mongo = mongo
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def aggregate(self, pipeline, **options):
+        self.mongo.pipelines.append(pipeline)
+        if self.mongo.failure:
+            raise self.mongo.failure
+        if '$merge' in pipeline[-1]:
+            return iter(())
+        return self.collection.aggregate(pipeline, **options)
+
+
+class RecordingMongo:
+    def __init__(self, db):
+        self.db = db
+        self.pipelines = []
+        self.failure = None
+
+    def get_collection(self, name):
+        collection = self.db[name]
+        return SourceProxy(collection, self) if name == 'view_orders' else collection
+
+
+@pytest.fixture
+def views(db):
+    for name in ('view_orders', Config.VIEWS_COLLECTION, view_target('daily')):
+        db[name].drop()
+    db['view_orders'].insert_many([{'_id': i, 'day': i % 2, 'amount': 10, 'seq': i} for i in range(1, 5)])
+    mongo = RecordingMongo(db)
+    refreshed = []
+    return mongo, ViewManager(mongo, on_refresh=refreshed.append), refreshed
+
+
+DAILY = {'name': 'daily', 'source': 'view_orders', 'refresh_seconds': 60,
+         'pipeline': [{'$group': {'_id': '$day', 'total': {'$sum': '$amount'}}}]}
+
+
+@pytest.mark.parametrize('body, message', [
+    ({**DAILY, 'name': 'bad name'}, 'name must be'),
+    ({**DAILY, 'source': 'system.users'}, 'source must be'),
+    ({**DAILY, 'refresh_seconds': 1}, 'refresh_seconds must be at least'),
+    ({**DAILY, 'when_matched': 'accumulate'}, 'requires accumulate_fields'),
+    ({**DAILY, 'pipeline': [{'$out': 'elsewhere'}]}, '$out is not allowed'),
+])
+def test_invalid_definitions_are_rejected(views, body, message):
+    with pytest.raises(ValueError, match=message.replace('$', r'\$')):
+        views[1].register(body)
+
+
+def test_full_refresh_materializes_the_pipeline(views, db):
+    _, manager, refreshed = views
+    manager.register(DAILY)
+    run = manager.refresh('daily')
+    assert run['mode'] == 'full' and run['documents'] == 2
+    assert sorted((doc['_id'], doc['total']) for doc in db[view_target('daily')].find()) == [(0, 20), (1, 20)]
+    assert refreshed == [view_target('daily')]
+    status = manager.status(manager.get('daily'))
+    assert status['refreshed_at'] is not None and not status['stale'] and status['failures'] == 0
+
+
+def test_incremental_refreshes_read_only_above_the_watermark(views, db):
+    mongo, manager, _ = views
+    manager.register({**DAILY, 'watermark_field': 'seq', 'when_matched': 'accumulate', 'accumulate_fields': ['total']})
+    assert manager.refresh('daily')['watermark'] == 4
+    assert mongo.pipelines[-1][0] == {'$match': {'seq': {'$lte': 4}}} and '$out' in mongo.pipelines[-1][-1]
+
+    skipped = manager.refresh('daily')
+    assert (skipped['mode'], skipped['reason'], skipped['watermark']) == ('skipped', 'no new documents', 4)
+    db['view_orders'].insert_one({'_id': 5, 'day': 1, 'amount': 10, 'seq': 5})
+    run = manager.refresh('daily')
+    assert run['mode'] == 'incremental' and run['watermark'] == 5
+    assert mongo.pipelines[-1][0] == {'$match': {'seq': {'$lte': 5, '$gt': 4}}}
+    merge = mongo.pipelines[-1][-1]['$merge']
+    assert merge['into'] == view_target('daily') and merge['whenNotMatched'] == 'insert'
+    assert merge['whenMatched'][0]['$replaceWith']['$mergeObjects'][2]['total']['$add']
+
+
+def test_failed_refreshes_keep_refreshed_at_and_back_off(views):
+    mongo, manager, refreshed = views
+    manager.register(DAILY)
+    manager.refresh('daily')
+    refreshed_at = manager.get('daily')['refreshed_at']
+
+    mongo.failure = RuntimeError("source unavailable")
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            manager.refresh('daily', full=True)
+    definition = manager.get('daily')
+    assert definition['refreshed_at'] == refreshed_at
+    assert definition['failures'] == 2 and definition['last_error'] == "source unavailable"
+    assert definition['last_attempt_at'] >= refreshed_at and definition['lease_until'] is None
+    assert refreshed == [view_target('daily')]
+
+    # Two failures: retried after twice the refresh interval since the last attempt
+    stale = {**definition, 'refreshed_at': datetime.utcnow() - timedelta(hours=1)}
+    assert not ViewManager._due({**stale, 'last_attempt_at': datetime.utcnow() - timedelta(seconds=100)})
+    assert ViewManager._due({**stale, 'last_attempt_at': datetime.utcnow() - timedelta(seconds=121)})
+
+
+def test_a_held_lease_makes_other_refreshes_busy(views, db):
+    _, manager, _ = views
+    manager.register(DAILY)
+    db[Config.VIEWS_COLLECTION].update_one({'_id': 'daily'},
+                                           {'$set': {'lease_until': datetime.utcnow() + timedelta(minutes=5)}})
+    with pytest.raises(ViewBusy):
+        manager.refresh('daily')
+    db[Config.VIEWS_COLLECTION].update_one({'_id': 'daily'},
+                                           {'$set': {'lease_until': datetime.utcnow() - timedelta(seconds=1)}})
+    assert manager.refresh('daily')['mode'] == 'full'
+    with pytest.raises(ViewNotFound):
+        manager.refresh('missing')
+
+
+def test_changing_the_pipeline_resets_materialized_state(views):
+    _, manager, _ = views
+    manager.register({**DAILY, 'watermark_field': 'seq'})
+    manager.refresh('daily')
+    assert manager.register({**DAILY, 'watermark_field': 'seq', 'refresh_seconds': 120})['watermark'] == 4
+    changed = manager.register({**DAILY, 'watermark_field': 'seq', 'pipeline': []})
+    assert changed['watermark'] is None and changed['refreshed_at'] is None
@@ -0,0 +1,351 @@
+# views.py
+"""
+Materialized aggregation views.
+
+A view is a named, policy-checked pipeline over a source collection whose
+output is stored in a target collection (VIEWS_TARGET_PREFIX + name) and
+read through /views/<name> with the regular /query parameters.
+
+Refreshes run on a background scheduler, every refresh_seconds per view:
+
+  full         the whole pipeline, written with $out (the target is
+               swapped atomically and keeps its indexes)
+  incremental  with a watermark_field, only source documents whose
+               watermark is above the last run's and at most the current
+               maximum are aggregated and $merged into the target
+
+How merged documents combine with existing ones is when_matched:
+'replace' (right for per-document pipelines, or groups that never span
+refreshes), 'merge', 'keepExisting', or 'accumulate', which adds the
+accumulate_fields of the new document to the stored ones ($sum/count
+rollups). Documents whose watermark arrives late (at or below the last
+watermark) are only picked up by a full refresh.
+
+refreshed_at only moves on success, so a view whose refreshes fail turns
+stale; failed attempts are retried after refresh_seconds, doubling per
+consecutive failure up to 8x.
+
+Definitions live in VIEWS_COLLECTION. A refresh holds a lease on its
+definition, so several workers can run the scheduler without refreshing
+the same view at once.
+"""
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from aggregation_policy import apply_policy, leading_index_fields, lookup_requirements
+from config import Config
+from database import db_instance
+
+WHEN_MATCHED = ('replace', 'merge', 'keepExisting', 'accumulate')
+VIEW_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class ViewNotFound(LookupError):
+    """Raised for a view name that is not registered"""
+
+
+class ViewBusy(RuntimeError):
+    """Raised when another worker is refreshing the view"""
+
+
+def view_target(name):
+    return f"{Config.VIEWS_TARGET_PREFIX}{name}"
+
+
+def accumulate_stage(fields):
+    """$merge whenMatched pipeline adding the new document's fields to the stored ones"""
+    sums = {field: {'$add': [{'$ifNull': [f'${field}', 0]}, {'$ifNull': [f'$$new.{field}', 0]}]}
+            for field in fields}
+    return [{'$replaceWith': {'$mergeObjects': ['$$ROOT', '$$new', sums]}}]
+
+
+def validate_definition(body):
+    """Normalized view definition from a registration request; raises ValueError"""
+    name = body.get('name')
+    if not isinstance(name, str) or not VIEW_NAME.match(name):
+        raise ValueError("name must be 1-64 letters, digits, '_' or '-'")
+    source = body.get('source')
+    if not isinstance(source, str) or not source or source.startswith('system.') or source == Config.VIEWS_COLLECTION:
+        raise ValueError("source must be the name of a collection")
+
+    watermark_field = body.get('watermark_field')
+    if watermark_field is not None and (not isinstance(watermark_field, str) or not watermark_field
+                                        or watermark_field.startswith('$')):
+        raise ValueError("watermark_field must be a field name")
+
+    merge_on = body.get('merge_on', ['_id'])
+    if isinstance(merge_on, str):
+        merge_on = [merge_on]
+    if not isinstance(merge_on, list) or not merge_on or not all(isinstance(f, str) and f for f in merge_on):
+        raise ValueError("merge_on must be a field name or a list of field names")
+
+    when_matched = body.get('when_matched', 'replace')
+    if when_matched not in WHEN_MATCHED:
+        raise ValueError(f"when_matched must be one of: {', '.join(WHEN_MATCHED)}")
+    accumulate_fields = body.get('accumulate_fields') or []
+    if when_matched == 'accumulate':
+        if not accumulate_fields or not all(isinstance(f, str) and f and '.' not in f and not f.startswith('$')
+                                            for f in accumulate_fields):
+            raise ValueError("when_matched=accumulate requires accumulate_fields, a list of top-level field names")
+
+    try:
+        refresh_seconds = int(body.get('refresh_seconds', Config.VIEWS_REFRESH_SECONDS))
+    except (TypeError, ValueError):
+        raise ValueError("refresh_seconds must be an integer")
+    if refresh_seconds < Config.VIEWS_MIN_REFRESH_SECONDS:
+        raise ValueError(f"refresh_seconds must be at least {Config.VIEWS_MIN_REFRESH_SECONDS}")
+
+    return {
+        "_id": name,
+        "source": source,
+        "target": view_target(name),
+        "pipeline": body.get('pipeline', []),
+        "watermark_field": watermark_field,
+        "merge_on": merge_on,
+        "when_matched": when_matched,
+        "accumulate_fields": accumulate_fields,
+        "refresh_seconds": refresh_seconds
+    }
+
+
+class ViewManager:
+    """Registers materialized views and keeps them refreshed"""
+
+    def __init__(self, mongo, on_refresh=None):
+        self.mongo = mongo
+        self.on_refresh = on_refresh
+        self._definitions = {}  # name -> definition, reloaded every scheduler tick
+        self._lock = threading.Lock()
+        self._scheduler = None
+
+    def register(self, body):
+        """Create or replace a view definition; the next scheduler tick builds it"""
+        definition = validate_definition(body)
+        # Reject pipelines the aggregate endpoint would reject
+        self._guard(definition)
+        existing = self._views().find_one({"_id": definition["_id"]}) or {}
+        changed = any(existing.get(key) != definition[key]
+                      for key in ("source", "pipeline", "watermark_field", "merge_on", "when_matched",
+                                  "accumulate_fields"))
+        definition.update({
+            "created_at": existing.get("created_at", datetime.utcnow()),
+            "updated_at": datetime.utcnow(),
+            # A changed pipeline invalidates everything materialized so far
+            "watermark": None if changed else existing.get("watermark"),
+            "refreshed_at": None if changed else existing.get("refreshed_at"),
+            "last_attempt_at": existing.get("last_attempt_at"),
+            "failures": 0 if changed else existing.get("failures", 0),
+            "last_run": existing.get("last_run"),
+            "last_error": existing.get("last_error"),
+            "lease_until": existing.get("lease_until")
+        })
+        self._views().replace_one({"_id": definition["_id"]}, definition, upsert=True)
+        self._remember(definition)
+        return definition
+
+    def get(self, name):
+        with self._lock:
+            definition = self._definitions.get(name)
+        if definition is None:
+            definition = self._views().find_one({"_id": name})
+            if definition is None:
+                raise ViewNotFound(f"View '{name}' does not exist")
+            self._remember(definition)
+        return definition
+
+    def definitions(self):
+        definitions = list(self._views().find().sort("_id", 1))
+        with self._lock:
+            self._definitions = {definition["_id"]: definition for definition in definitions}
+        return definitions
+
+    def delete(self, name, drop_target=False):
+        definition = self.get(name)
+        self._views().delete_one({"_id": name})
+        with self._lock:
+            self._definitions.pop(name, None)
+        if drop_target:
+            self.mongo.get_collection(definition["target"]).drop()
+            if self.on_refresh:
+                self.on_refresh(definition["target"])
+
+    def refresh(self, name, full=False):
+        """Refresh a view now; raises ViewBusy while another worker holds its lease"""
+        definition = self._acquire_lease(name)
+        if definition is None:
+            raise ViewBusy(f"View '{name}' is being refreshed")
+        started = time.perf_counter()
+        try:
+            run = self._run(definition, full)
+        except Exception as e:
+            # The materialized data is as old as before; only the attempt is recorded
+            self._views().update_one({"_id": name}, {"$set": {"last_error": str(e), "lease_until": None,
+                                                             "last_attempt_at": datetime.utcnow()},
+                                                    "$inc": {"failures": 1}})
+            with self._lock:
+                self._definitions.pop(name, None)
+            raise
+        run["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        now = datetime.utcnow()
+        update = {"last_run": run, "last_error": None, "lease_until": None, "refreshed_at": now,
+                  "last_attempt_at": now, "failures": 0}
+        if "watermark" in run:
+            update["watermark"] = run["watermark"]
+        self._views().update_one({"_id": name}, {"$set": update})
+        with self._lock:
+            self._definitions.pop(name, None)
+        if run["mode"] != "skipped" and self.on_refresh:
+            self.on_refresh(definition["target"])
+        return run
+
+    def status(self, definition):
+        """Public description of a definition and its freshness"""
+        refreshed_at = definition.get("refreshed_at")
+        stale = refreshed_at is None or \
+            (datetime.utcnow() - refreshed_at).total_seconds() > 2 * definition["refresh_seconds"]
+        return {
+            "name": definition["_id"],
+            "source": definition["source"],
+            "target": definition["target"],
+            "pipeline": definition["pipeline"],
+            "watermark_field": definition.get("watermark_field"),
+            "watermark": definition.get("watermark"),
+            "merge_on": definition.get("merge_on"),
+            "when_matched": definition.get("when_matched"),
+            "accumulate_fields": definition.get("accumulate_fields"),
+            "refresh_seconds": definition["refresh_seconds"],
+            "refreshed_at": refreshed_at.isoformat() if refreshed_at else None,
+            "stale": stale,
+            "last_attempt_at": definition["last_attempt_at"].isoformat() if definition.get("last_attempt_at") else None,
+            "failures": definition.get("failures", 0),
+            "last_run": definition.get("last_run"),
+            "last_error": definition.get("last_error")
+        }
+
+    def start_scheduler(self):
+        """Refresh due views on a daemon thread every VIEWS_SCHEDULER_TICK seconds"""
+        if self._scheduler is not None:
+            return self._scheduler
+
+        def run():
+            while True:
+                try:
+                    for definition in self.definitions():
+                        if self._due(definition):
+                            self._refresh_quietly(definition["_id"])
+                except Exception as e:
+                    print(f"⚠️  View scheduler error: {str(e)}")
+                time.sleep(Config.VIEWS_SCHEDULER_TICK)
+
+        self._scheduler = threading.Thread(target=run, name="view-scheduler", daemon=True)
+        self._scheduler.start()
+        return self._scheduler
+
+    def _refresh_quietly(self, name):
+        try:
+            run = self.refresh(name)
+            if run["mode"] != "skipped":
+                print(f"🔁 Refreshed view {name} ({run['mode']}) in {run['duration_ms']}ms")
+        except ViewBusy:
+            pass
+        except Exception as e:
+            print(f"❌ View {name} refresh failed: {str(e)}")
+
+    @staticmethod
+    def _due(definition):
+        """Due once refresh_seconds passed since the last success; failed attempts back off"""
+        now = datetime.utcnow()
+        refreshed_at = definition.get("refreshed_at")
+        if refreshed_at is not None and (now - refreshed_at).total_seconds() < definition["refresh_seconds"]:
+            return False
+        failures = definition.get("failures", 0)
+        last_attempt_at = definition.get("last_attempt_at")
+        if not failures or last_attempt_at is None:
+            return True
+        # Retry after the refresh interval, doubling per consecutive failure up to 8x
+        backoff = definition["refresh_seconds"] * 2 ** min(failures - 1, 3)
+        return (now - last_attempt_at).total_seconds() >= backoff
+
+    def _run(self, definition, full):
+        source = self.mongo.get_collection(definition["source"])
+        stages = self._guard(definition)
+        watermark_field = definition.get("watermark_field")
+        previous = definition.get("watermark")
+        run = {}
+
+        if watermark_field:
+            # Fix the upper bound first so documents written during the run wait for the next one
+            newest = source.find_one({watermark_field: {'$ne': None}}, {watermark_field: 1},
+                                     sort=[(watermark_field, -1)])
+            high = newest.get(watermark_field) if newest else None
+            if high is None:
+                return {"mode": "skipped", "reason": "source has no watermark values"}
+            incremental = not full and previous is not None
+            if incremental and high <= previous:
+                return {"mode": "skipped", "reason": "no new documents", "watermark": previous}
+            window = {'$lte': high}
+            if incremental:
+                window['$gt'] = previous
+            stages.insert(0, {'$match': {watermark_field: window}})
+            run["watermark"] = high
+        else:
+            incremental = False
+
+        target = definition["target"]
+        if incremental:
+            when_matched = definition["when_matched"]
+            if when_matched == 'accumulate':
+                when_matched = accumulate_stage(definition["accumulate_fields"])
+            stages.append({'$merge': {'into': target, 'on': definition["merge_on"],
+                                      'whenMatched': when_matched, 'whenNotMatched': 'insert'}})
+        else:
+            stages.append({'$out': target})
+
+        options = {'allowDiskUse': Config.AGGREGATE_ALLOW_DISK_USE}
+        if Config.VIEWS_MAX_TIME_MS:
+            options['maxTimeMS'] = Config.VIEWS_MAX_TIME_MS
+        source.aggregate(stages, **options)
+
+        # $merge on fields other than _id needs a unique index on them
+        if definition["merge_on"] != ['_id']:
+            self.mongo.get_collection(target).create_index(
+                [(field, 1) for field in definition["merge_on"]], unique=True)
+        run.update({"mode": "incremental" if incremental else "full",
+                    "documents": self.mongo.get_collection(target).estimated_document_count()})
+        return run
+
+    def _guard(self, definition):
+        """The view's pipeline after the aggregation policy checks, without an output cap"""
+        pipeline = definition["pipeline"]
+        joined = {name for name, _ in lookup_requirements(pipeline)} if isinstance(pipeline, list) else set()
+        indexed_fields = {
+            name: leading_index_fields(self.mongo.get_collection(name).index_information())
+            for name in joined
+        }
+        guarded, _, _ = apply_policy(pipeline, indexed_fields, cap_output=False)
+        return guarded
+
+    def _acquire_lease(self, name):
+        """The definition, once this worker holds its refresh lease; None while another one does"""
+        now = datetime.utcnow()
+        definition = self._views().find_one_and_update(
+            {"_id": name, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"lease_until": now + timedelta(seconds=Config.VIEWS_LEASE_SECONDS)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if definition is None and self._views().count_documents({"_id": name}, limit=1) == 0:
+            raise ViewNotFound(f"View '{name}' does not exist")
+        return definition
+
+    def _remember(self, definition):
+        with self._lock:
+            self._definitions[definition["_id"]] = definition
+
+    def _views(self):
+        return self.mongo.get_collection(Config.VIEWS_COLLECTION)
+
+
+# Create global view manager instance
+view_manager = ViewManager(db_instance)